@@ -1,40 +1,264 @@
 #!/usr/bin/python
+#
+# Serial -> Websocket relay
+#
+# Lines received on the serial port (ie Arduino JSON samples on /dev/ttyACM0) are sent to websocket clients.
+#
+# One reader per serial port (SerialHub) fans each line out to every connected client through a per client
+# bounded queue & sender task, so clients all receive whole lines & a slow client never stalls the port
+# or the other viewers: when its queue is full the oldest queued line is dropped (coalesced to the most
+# recent lines), a client that keeps falling behind (max_dropped consecutive drops) is disconnected.
+#
+# The port is read without blocking the event loop: the serial fd is registered with loop.add_reader(),
+# the callback reads whatever bytes are available in one call into a bytearray & splits complete
+# lines on b'\n', no per character work & no polling. A partial line is held up to max_line bytes (64 KiB),
+# beyond that (ie wrong baud rate, line noise, no newline) the oldest bytes are discarded & logged.
+#
+# Several ports can be relayed, clients select one by path (ws://host:5678/ttyUSB0), default the first.
+#
+# Each port's samples also feed rolling window statistics (weather_rolling.py, default 1m,1h,3h):
+# the aggregates are sent alongside the raw lines as a JSON line {"type": "stats", "ts":, "windows": {...}},
+# at most once per --stats-interval seconds, & to each client on connect.
+#
+# Start cmd: python serialToWebsocket.py [/dev/ttyACM0 ...] [--windows 1m,1h,3h] [--no-stats]
+#
 
-import serial
+import os
+import json
 import asyncio
-import datetime
-import random
+import logging
+import argparse
 import websockets
 
-ser = serial.Serial(
-port='/dev/ttyACM0',\
-baudrate=115200,\
-parity=serial.PARITY_NONE,\
-stopbits=serial.STOPBITS_ONE,\
-bytesize=serial.EIGHTBITS,\
-timeout=0)
+import weather_rolling
 
-print("connected to: " + ser.portstr)
 
+class SerialLineReader:
+    """Read newline framed lines from a serial port (or any fd, ie a pty) on the asyncio event loop.
 
-async def tx(websocket, path):
-    ###now = datetime.datetime.utcnow().isoformat() + "Z"
-    line = []
-    while True:
-        for i in ser.read():
-            c = chr(i)
-            line.append(c)
-            if c == '\n':
-                print(''.join(line))
-                await websocket.send(''.join(line))
-                line = []
-                break
+    Lines are queued for readline(), or passed straight to on_line(line) if given (None once the port closes).
+    """
 
-start_server = websockets.serve(tx, "127.0.0.1", 5678)
+    def __init__(self, port, loop=None, max_queue=1024, chunk_size=4096, on_line=None, max_line=65536):
+        self.port = port
+        self.on_line = on_line
+        self.fd = port if isinstance(port, int) else port.fileno()
+        self.loop = loop or asyncio.get_event_loop()
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.max_line = max_line
+        ### bytes discarded from lines longer than max_line
+        self.discarded = 0
+        self.lines = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.closed = False
 
-asyncio.get_event_loop().run_until_complete(start_server)
-asyncio.get_event_loop().run_forever()
+    def start(self):
+        os.set_blocking(self.fd, False)
+        self.loop.add_reader(self.fd, self._on_readable)
+        return self
 
+    def stop(self):
+        if not self.closed:
+            self.loop.remove_reader(self.fd)
+            self.closed = True
 
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, self.chunk_size)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            ### port closed / device unplugged
+            self.stop()
+            self._put(None)
+            return
 
-ser.close()
+        buf = self.buffer
+        buf += data
+        end = buf.rfind(b'\n')
+        if end >= 0:
+            for line in buf[:end].split(b'\n'):
+                self._put(line.rstrip(b'\r').decode('utf-8', 'replace'))
+            del buf[:end + 1]
+        if len(buf) > self.max_line:
+            ### no line ending in sight, keep the latest max_line bytes
+            n = len(buf) - self.max_line
+            del buf[:n]
+            self.discarded += n
+            logging.warning("serial %s: no newline in %d bytes, discarded %d (total %d)",
+                            self.fd, self.max_line, n, self.discarded)
+
+    def _put(self, line):
+        if self.on_line is not None:
+            self.on_line(line)
+            return
+        try:
+            self.lines.put_nowait(line)
+        except asyncio.QueueFull:
+            ### consumer too slow, drop oldest
+            self.lines.get_nowait()
+            self.lines.put_nowait(line)
+            self.dropped += 1
+
+    ### Next complete line (without line ending), None once the port is closed
+    async def readline(self):
+        if self.closed and self.lines.empty():
+            return None
+        return await self.lines.get()
+
+
+class HubClient:
+
+    def __init__(self, websocket, max_queue):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.sent = 0
+        self.dropped = 0
+        self.lagging = 0
+
+
+class SerialHub:
+    """Single reader of a serial port, fans lines (& rolling stats, if given) out to all registered websocket clients."""
+
+    def __init__(self, reader, max_queue=256, max_dropped=1024, echo=False, stats=None, stats_interval=1.0):
+        self.reader = reader
+        self.max_queue = max_queue
+        self.max_dropped = max_dropped
+        self.echo = echo
+        self.clients = set()
+        self.stats = stats
+        self.stats_interval = stats_interval
+        self._stats_handle = None
+
+    ### lines are fanned out from the reader callback, no intermediate queue on the port
+    def start(self):
+        self.reader.on_line = self._on_line
+        self.reader.start()
+        return self
+
+    def stop(self):
+        self.reader.stop()
+        self._on_line(None)
+
+    def _on_line(self, line):
+        if line is None:
+            ### port closed, end client sessions
+            if self._stats_handle is not None:
+                self._stats_handle.cancel()
+                self._stats_handle = None
+            for client in list(self.clients):
+                self._put(client, None)
+            self.clients.clear()
+            return
+        if self.echo:
+            print(line)
+        self.publish(line + '\n')
+        if self.stats is not None and self.stats.add_line(line) and self._stats_handle is None:
+            ### coalesce bursts of samples into one stats message per interval
+            self._stats_handle = asyncio.get_event_loop().call_later(self.stats_interval, self._publish_stats)
+
+    def stats_message(self):
+        return json.dumps(self.stats.snapshot()) + '\n'
+
+    def _publish_stats(self):
+        self._stats_handle = None
+        if self.clients:
+            self.publish(self.stats_message())
+
+    def publish(self, message):
+        for client in list(self.clients):
+            self._put(client, message)
+
+    def _put(self, client, message):
+        q = client.queue
+        if q.full():
+            q.get_nowait()
+            client.dropped += 1
+            client.lagging += 1
+            if client.lagging > self.max_dropped:
+                ### persistently slow, discard backlog & disconnect
+                self.clients.discard(client)
+                while not q.empty():
+                    q.get_nowait()
+                asyncio.ensure_future(client.websocket.close())
+                message = None
+        q.put_nowait(message)
+
+    ### Websocket session: register, send queued lines until the client or port goes away
+    async def serve(self, websocket):
+        client = HubClient(websocket, self.max_queue)
+        if self.reader.closed:
+            return
+        self.clients.add(client)
+        if self.stats is not None and self.stats.count:
+            self._put(client, self.stats_message())
+        ### wake the sender when the client disconnects while idle
+        closed = asyncio.ensure_future(websocket.wait_closed())
+        closed.add_done_callback(lambda _: self._put(client, None))
+        try:
+            while True:
+                message = await client.queue.get()
+                if message is None:
+                    break
+                await websocket.send(message)
+                client.sent += 1
+                client.lagging = 0
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(client)
+            closed.cancel()
+        if client.dropped:
+            print("client %s: sent %d, dropped %d" % (websocket.remote_address, client.sent, client.dropped))
+
+
+def open_port(device):
+    import serial
+    ser = serial.Serial(
+        port=device,
+        baudrate=115200,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        bytesize=serial.EIGHTBITS,
+        timeout=0)
+    print("connected to: " + ser.portstr)
+    return ser
+
+
+async def main(devices, windows=None, stats_interval=1.0):
+    ports = [open_port(device) for device in devices]
+    hubs = {}
+    for device, ser in zip(devices, ports):
+        stats = weather_rolling.RollingStats(windows) if windows else None
+        hubs[os.path.basename(device)] = SerialHub(SerialLineReader(ser), echo=len(devices) == 1,
+                                                   stats=stats, stats_interval=stats_interval).start()
+    default = hubs[os.path.basename(devices[0])]
+
+    async def tx(websocket, path=None):
+        ###now = datetime.datetime.utcnow().isoformat() + "Z"
+        if path is None:
+            path = websocket.request.path if hasattr(websocket, 'request') else websocket.path
+        await hubs.get(path.strip('/'), default).serve(websocket)
+
+    try:
+        async with websockets.serve(tx, "127.0.0.1", 5678):
+            await asyncio.Future()
+    finally:
+        for hub in hubs.values():
+            hub.stop()
+        for ser in ports:
+            ser.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Relay serial port lines to websocket clients")
+    parser.add_argument('devices', nargs='*', default=['/dev/ttyACM0'])
+    parser.add_argument('--windows', default="1m,1h,3h", help="rolling stats windows, ie 1m,1h,3h")
+    parser.add_argument('--stats-interval', type=float, default=1.0, help="seconds between stats messages")
+    parser.add_argument('--no-stats', action='store_true', help="relay raw lines only")
+    args = parser.parse_args()
+    windows = None if args.no_stats else weather_rolling.parse_windows(args.windows)
+    asyncio.run(main(args.devices, windows, args.stats_interval))
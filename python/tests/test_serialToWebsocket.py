@@ -0,0 +1,110 @@
+#
+# serialToWebsocket.py with a pty pair standing in for the serial port: line framing across reads
+# (lines split mid chunk, several lines per chunk, \r\n), partial line capped at max_line, None once the writer closes,
+# relay to a websocket client
+#
+
+import os
+import sys
+import tty
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+websockets = pytest.importorskip("websockets")
+
+import serialToWebsocket
+
+
+def open_pty():
+    master, slave = os.openpty()
+    ### raw: no canonical line buffering, echo or \r -> \n translation, bytes pass through as from a serial port
+    tty.setraw(slave)
+    return master, slave
+
+
+async def read_lines(reader, n, timeout=2.0):
+    return [await asyncio.wait_for(reader.readline(), timeout) for _ in range(n)]
+
+
+def test_line_framing():
+    async def run():
+        master, slave = open_pty()
+        reader = serialToWebsocket.SerialLineReader(slave).start()
+        try:
+            os.write(master, b'{"ts":1,"p":1013')
+            await asyncio.sleep(0.05)
+            assert reader.lines.empty()
+            os.write(master, b'25}\r\n{"ts":2}\n{"ts"')
+            assert await read_lines(reader, 2) == ['{"ts":1,"p":101325}', '{"ts":2}']
+            os.write(master, b':3}\r\n\r\n')
+            assert await read_lines(reader, 2) == ['{"ts":3}', '']
+        finally:
+            reader.stop()
+            os.close(master)
+            os.close(slave)
+
+    asyncio.run(run())
+
+
+def test_long_line_capped():
+    async def run():
+        master, slave = open_pty()
+        reader = serialToWebsocket.SerialLineReader(slave, max_line=1024).start()
+        try:
+            ### noise without a newline, ie wrong baud rate
+            for _ in range(10):
+                os.write(master, b'\xff' * 500)
+                await asyncio.sleep(0.01)
+            os.write(master, b'x' * 100 + b'{"ts":1}\n{"ts":2}\n')
+            lines = await read_lines(reader, 2)
+            assert len(reader.buffer) == 0
+            assert lines[1] == '{"ts":2}'
+            ### the end of the noise is kept, ending in the first complete line
+            assert lines[0].endswith('x' * 100 + '{"ts":1}')
+            assert lines[0].count('\ufffd') <= 1024
+            assert reader.discarded >= 5000 - 1024
+        finally:
+            reader.stop()
+            os.close(master)
+            os.close(slave)
+
+    asyncio.run(run())
+
+
+def test_readline_none_after_close():
+    async def run():
+        rfd, wfd = os.pipe()
+        reader = serialToWebsocket.SerialLineReader(rfd).start()
+        os.write(wfd, b'last\npartial')
+        os.close(wfd)
+        assert await read_lines(reader, 2) == ['last', None]
+        assert reader.closed
+        assert await reader.readline() is None
+        os.close(rfd)
+
+    asyncio.run(run())
+
+
+def test_hub_relays_lines():
+    async def run():
+        master, slave = open_pty()
+        hub = serialToWebsocket.SerialHub(serialToWebsocket.SerialLineReader(slave)).start()
+        try:
+            async with websockets.serve(hub.serve, "127.0.0.1", 0) as server:
+                port = server.sockets[0].getsockname()[1]
+                async with websockets.connect("ws://127.0.0.1:%d/" % port) as ws:
+                    while not hub.clients:
+                        await asyncio.sleep(0.01)
+                    os.write(master, b'{"ts":1,"tempC":19.5}\r\n{"ts":2,')
+                    os.write(master, b'"tempC":19.6}\n')
+                    got = [await asyncio.wait_for(ws.recv(), 2.0) for _ in range(2)]
+                    assert got == ['{"ts":1,"tempC":19.5}\n', '{"ts":2,"tempC":19.6}\n']
+        finally:
+            hub.stop()
+            os.close(master)
+            os.close(slave)
+
+    asyncio.run(run())
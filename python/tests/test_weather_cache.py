@@ -0,0 +1,104 @@
+#
+# weather_cache.py: a day is parsed once & read back memory-mapped with the stored types, rebuilt when the
+# source mtime or size changes or a rebuild was interrupted, .TXT & .BIN logs of a day cached apart
+#
+
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_codec
+import weather_cache
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def write_day(path, n, t=18.5):
+    with open(path, 'w') as f:
+        for i in range(n):
+            f.write(json.dumps([{'ts': START + i * 30, 't': t, 'h': 50, 'sr': '06:15:00'}]) + '\n')
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    calls = []
+    read = weather_cache.weather_log.read_columns
+
+    def counted(filepath, *args, **kwargs):
+        calls.append(filepath)
+        return read(filepath, *args, **kwargs)
+    monkeypatch.setattr(weather_cache.weather_log, 'read_columns', counted)
+    return calls
+
+
+def test_read_types(tmp_path, parses):
+    path = str(tmp_path / '20200901.TXT')
+    write_day(path, 10)
+    cols = weather_cache.read_columns(path)
+    assert os.path.isfile(os.path.join(str(tmp_path), '.cache', '20200901', 'meta.json'))
+    assert cols['ts'].dtype == np.int64
+    assert cols['t'].dtype == np.float32
+    assert isinstance(cols['t'], np.memmap)
+    np.testing.assert_array_equal(cols['ts'], START + np.arange(10) * 30)
+    assert list(cols['sr']) == ['06:15:00'] * 10
+    assert set(weather_cache.read_columns(path, ['t', 'x'])) == {'t'}
+    assert len(parses) == 1
+
+
+def test_invalidation(tmp_path, parses):
+    path = str(tmp_path / '20200901.TXT')
+    write_day(path, 10)
+    weather_cache.read_columns(path)
+    assert weather_cache.is_fresh(path)
+    weather_cache.read_columns(path)
+    assert len(parses) == 1
+
+    ### same size, new mtime
+    st = os.stat(path)
+    write_day(path, 10, t=19.5)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert not weather_cache.is_fresh(path)
+    assert weather_cache.read_columns(path)['t'][0] == 19.5
+    assert len(parses) == 2
+
+    ### new size, mtime put back
+    st = os.stat(path)
+    write_day(path, 11, t=19.5)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert len(weather_cache.read_columns(path)['ts']) == 11
+    assert len(parses) == 3
+
+    ### interrupted rebuild: no meta.json, never read as fresh
+    os.remove(os.path.join(weather_cache.cache_path(path), 'meta.json'))
+    assert not weather_cache.is_fresh(path)
+    weather_cache.read_columns(path)
+    assert len(parses) == 4
+
+    ### older cache layout
+    meta = os.path.join(weather_cache.cache_path(path), 'meta.json')
+    with open(meta) as f:
+        m = json.load(f)
+    m['version'] = weather_cache.CACHE_VERSION - 1
+    with open(meta, 'w') as f:
+        json.dump(m, f)
+    weather_cache.read_columns(path)
+    assert len(parses) == 5
+
+
+def test_bin_beside_txt(tmp_path):
+    txt = str(tmp_path / '20200901.TXT')
+    write_day(txt, 10)
+    bin_ = str(tmp_path / ('20200901' + weather_codec.EXT))
+    with open(bin_, 'wb') as f:
+        f.write(weather_codec.encode({'ts': START + np.arange(5), 't': np.full(5, 1.0)}))
+    assert weather_cache.cache_path(txt) != weather_cache.cache_path(bin_)
+    assert len(weather_cache.read_columns(txt)['ts']) == 10
+    assert len(weather_cache.read_columns(bin_)['ts']) == 5
+    assert weather_cache.is_fresh(txt) and weather_cache.is_fresh(bin_)
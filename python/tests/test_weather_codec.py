@@ -0,0 +1,132 @@
+#
+# weather_codec.py: absolute & delta blocks round trip, missing values as sentinels, fallback to absolute
+# records, blocks split at 65535 records, truncated tail (power loss mid write), record sizes match the C structs
+#
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_codec
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def columns(n=100, seed=1):
+    rng = np.random.default_rng(seed)
+    return {
+        'ts': START + np.arange(n) * 30,
+        't': np.round(rng.normal(15, 5, n), 2),
+        'h': np.round(rng.uniform(30, 99, n), 2),
+        'l': rng.integers(0, 1024, n).astype(float),
+        'p': 101325 + rng.integers(-300, 300, n).astype(float),
+        'w': rng.integers(0, 360, n).astype(float),
+    }
+
+
+def assert_columns(got, expected):
+    assert got['ts'].dtype == np.int64
+    np.testing.assert_array_equal(got['ts'], expected['ts'])
+    for name in weather_codec.COLUMNS[1:]:
+        np.testing.assert_allclose(got[name], expected[name], atol=1e-9, err_msg=name)
+
+
+def test_record_sizes():
+    assert weather_codec.HEADER.itemsize == 14
+    assert weather_codec.RECORD.itemsize == 16
+    assert weather_codec.DELTA_RECORD.itemsize == 12
+
+
+@pytest.mark.parametrize('delta', [False, True])
+def test_round_trip(delta):
+    cols = columns()
+    buf = weather_codec.encode(cols, delta=delta)
+    record = weather_codec.DELTA_RECORD if delta else weather_codec.RECORD
+    assert len(buf) == weather_codec.HEADER.itemsize + 100 * record.itemsize
+    assert weather_codec.is_encoded(buf)
+    h, _ = next(weather_codec.iter_blocks(buf))
+    assert bool(h['flags'] & weather_codec.FLAG_DELTA) == delta
+    assert_columns(weather_codec.decode(buf), cols)
+
+
+@pytest.mark.parametrize('delta', [False, True])
+def test_missing_values(delta):
+    cols = columns(10)
+    cols['t'][2] = np.nan
+    cols['h'][3] = np.nan
+    cols['p'][0] = np.nan
+    cols['p'][5] = np.nan
+    ### out of field range -> sentinel -> NaN
+    cols['l'][4] = 70000
+    del cols['w']
+    out = weather_codec.decode(weather_codec.encode(cols, delta=delta))
+    cols['l'][4] = np.nan
+    cols['w'] = np.full(10, np.nan)
+    assert_columns(out, cols)
+
+
+def test_delta_falls_back_to_absolute():
+    for change in ('backwards', 'gap', 'pressure'):
+        cols = columns(10)
+        if change == 'backwards':
+            cols['ts'][5] = cols['ts'][4] - 1
+        elif change == 'gap':
+            cols['ts'][5:] += 70000
+        else:
+            cols['p'][5] += 40000
+        buf = weather_codec.encode(cols, delta=True)
+        h, _ = next(weather_codec.iter_blocks(buf))
+        assert not h['flags'] & weather_codec.FLAG_DELTA, change
+        assert_columns(weather_codec.decode(buf), cols)
+
+
+def test_blocks_split():
+    cols = columns(weather_codec.MAX_BLOCK + 10)
+    buf = weather_codec.encode(cols)
+    assert [len(rec) for _, rec in weather_codec.iter_blocks(buf)] == [weather_codec.MAX_BLOCK, 10]
+    assert_columns(weather_codec.decode(buf), cols)
+
+
+@pytest.mark.parametrize('delta', [False, True])
+def test_truncated_tail(delta):
+    cols = columns(20)
+    buf = weather_codec.encode(columns(5, seed=2), delta=delta) + weather_codec.encode(cols, delta=delta)
+    record = weather_codec.DELTA_RECORD if delta else weather_codec.RECORD
+    ### last block cut in the middle of its 8th record
+    cut = buf[:len(buf) - 12 * record.itemsize - 5]
+    out = weather_codec.decode(cut)
+    assert len(out['ts']) == 5 + 7
+    np.testing.assert_array_equal(out['ts'][5:], cols['ts'][:7])
+    np.testing.assert_allclose(out['t'][5:], cols['t'][:7])
+    ### second block header only
+    first = len(weather_codec.encode(columns(5, seed=2), delta=delta))
+    assert len(weather_codec.decode(cut[:first + weather_codec.HEADER.itemsize])['ts']) == 5
+    ### second block header cut short
+    assert len(weather_codec.decode(cut[:first + 5])['ts']) == 5
+
+
+def test_bad_header():
+    buf = bytearray(weather_codec.encode(columns(5)))
+    buf[0:2] = b'XX'
+    assert not weather_codec.is_encoded(bytes(buf))
+    with pytest.raises(ValueError):
+        weather_codec.decode(bytes(buf))
+
+
+def test_empty():
+    out = weather_codec.decode(b'')
+    assert set(out) == set(weather_codec.COLUMNS)
+    assert all(len(v) == 0 for v in out.values())
+
+
+def test_read_log_file(tmp_path):
+    cols = columns()
+    path = tmp_path / ('20200901' + weather_codec.EXT)
+    path.write_bytes(weather_codec.encode(cols))
+    assert_columns(weather_codec.read_columns(str(path)), cols)
@@ -0,0 +1,107 @@
+#
+# weather_decimate.py: minmax & lttb keep the endpoints, extremes & line breaks with bounded index counts,
+# a Series keeps its datetime index, plotted lines are re-decimated to the visible range on set_xlim
+#
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_decimate
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def series(m=100000, seed=1):
+    rng = np.random.default_rng(seed)
+    y = np.cumsum(rng.normal(0, 1, m))
+    return np.arange(m, dtype=np.float64) * 30, y
+
+
+def test_minmax_envelope():
+    x, y = series()
+    y[1234] = 1e6
+    y[5678] = -1e6
+    y[40000:40010] = np.nan
+    n = 500
+    idx = weather_decimate.minmax_indices(x, y, n)
+    assert np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+    ### first, last, min, max per bin & the first NaN of the gap
+    assert len(idx) <= 4 * n + 1
+    assert {1234, 5678, 40000} <= set(idx.tolist())
+    ### every bin's min & max survive
+    b = np.minimum((x / x[-1] * n).astype(int), n - 1)
+    for k in (0, 137, n - 1):
+        sel = idx[b[idx] == k]
+        seg = y[b == k]
+        assert np.nanmin(y[sel]) == np.nanmin(seg)
+        assert np.nanmax(y[sel]) == np.nanmax(seg)
+
+
+def test_short_series_unchanged():
+    x, y = series(1000)
+    np.testing.assert_array_equal(weather_decimate.minmax_indices(x, y, 500), np.arange(1000))
+    np.testing.assert_array_equal(weather_decimate.lttb_indices(x, y, 2000), np.arange(1000))
+
+
+def test_lttb_count():
+    x, y = series()
+    y[10:20] = np.nan
+    idx = weather_decimate.lttb_indices(x, y, 1000)
+    assert len(idx) == 1000
+    assert np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+    assert not np.isnan(y[idx]).any()
+
+
+def test_decimate_series_keeps_index():
+    x, y = series(50000)
+    s = pd.Series(y, index=pd.to_datetime(START + x, unit='s'))
+    out = weather_decimate.decimate_series(s, 200)
+    assert len(out) <= 4 * 200 + 1
+    assert out.index[0] == s.index[0] and out.index[-1] == s.index[-1]
+    pd.testing.assert_series_equal(out, s.loc[out.index])
+    assert len(weather_decimate.decimate_series(s, 200, 'lttb')) == 200
+
+
+def test_plot_redecimates_on_xlim():
+    mpl = pytest.importorskip("matplotlib")
+    mpl.use('Agg')
+    import matplotlib.pyplot as plt
+    weather_decimate.install()
+
+    x, y = series(200000)
+    fig, ax = plt.subplots(figsize=(8, 2), dpi=100)
+    try:
+        n = weather_decimate.axes_pixel_width(ax)
+        line, = ax.plot(x, y)
+        assert len(line.get_xdata()) <= 4 * n + 1
+        assert line.get_xdata()[0] == x[0] and line.get_xdata()[-1] == x[-1]
+
+        ### zoom to 300 samples: shown raw, one sample beyond each edge
+        ax.set_xlim(x[1000], x[1299])
+        np.testing.assert_array_equal(line.get_xdata(), x[999:1301])
+        np.testing.assert_array_equal(line.get_ydata(), y[999:1301])
+
+        ### zoom to a range longer than the axes: decimated over that range only
+        ax.set_xlim(x[50000], x[150000])
+        shown = line.get_xdata()
+        assert len(shown) <= 4 * n + 1
+        assert shown[0] == x[49999] and shown[-1] == x[150001]
+
+        ax.set_xlim(x[0], x[-1])
+        assert len(line.get_xdata()) <= 4 * n + 1
+
+        ### opt out per call
+        full, = ax.plot(x, y, decimate=False)
+        assert len(full.get_xdata()) == len(x)
+    finally:
+        plt.close(fig)
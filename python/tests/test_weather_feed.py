@@ -0,0 +1,92 @@
+#
+# weather_feed.py over aiohttp's test server: series buckets match the samples, requested ranges are clamped
+# to the source's samples & the tiles built per request are bounded
+#
+
+import os
+import sys
+import json
+import asyncio
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestClient, TestServer
+
+import weather_feed
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def write_day(path, day, ts):
+    with open(os.path.join(path, day + '.TXT'), 'w') as f:
+        for t in ts:
+            f.write(json.dumps({'ts': int(t), 't': float(t % 3600 // 60), 'p': 101325}) + '\n')
+
+
+def run(sources, requests):
+    async def go():
+        app = weather_feed.make_app(sources)
+        async with TestClient(TestServer(app)) as client:
+            out = []
+            for url in requests:
+                r = await client.get(url)
+                out.append((r.status, await r.json() if r.status == 200 else await r.text()))
+            return app['feed'], out
+    return asyncio.run(go())
+
+
+@pytest.fixture
+def station(tmp_path):
+    path = str(tmp_path)
+    write_day(path, '20200901', START + np.arange(0, 86400, 60))
+    write_day(path, '20200902', START + 86400 + np.arange(0, 86400, 60))
+    return {'station': weather_feed.Source(path)}
+
+
+def test_series_hourly(station):
+    _, [(status, rows)] = run(station, ['/series/station?start=%d&end=%d&points=48' % (START, START + 2 * 86400)])
+    assert status == 200
+    assert len(rows) == 48
+    assert rows[0]['ts'] == START
+    ### t is the minute of the hour, mean 29.5
+    assert all(r['t'] == 29.5 and r['p'] == 101325 for r in rows)
+
+
+def test_range_clamped_to_samples(station):
+    feed, [(status, rows), (tiles_status, tiles)] = run(station, [
+        '/series/station?start=0&end=1000000000000000&points=1',
+        '/tiles/station?start=0&end=1000000000000000&points=1000',
+    ])
+    assert status == 200
+    assert [r['ts'] for r in rows] == [START, START + 86400]
+    assert len(feed.tiles) == 1
+    assert tiles_status == 200
+    assert tiles['start'] == START
+    assert tiles['end'] == START + 2 * 86400 - 60 + 1
+    assert len(tiles['tiles']) <= weather_feed.MAX_REQUEST_TILES
+
+
+def test_out_of_range(station):
+    _, out = run(station, [
+        '/series/station?start=0&end=1000',
+        '/series/station?start=%d&end=%d' % (START + 10, START),
+        '/series/station?start=x',
+    ])
+    assert [status for status, _ in out] == [404, 400, 400]
+
+
+def test_too_many_tiles(tmp_path):
+    ### samples 30 years apart: more daily tiles than one request may build
+    path = os.path.join(str(tmp_path), 'log.json')
+    with open(path, 'w') as f:
+        f.write(json.dumps({'ts': START, 't': 1.0}) + '\n')
+        f.write(json.dumps({'ts': START + 30 * 365 * 86400, 't': 2.0}) + '\n')
+    feed, [(status, _)] = run({'log': weather_feed.Source(path)}, ['/series/log?points=1'])
+    assert status == 400
+    assert not feed.tiles
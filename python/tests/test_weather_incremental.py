@@ -0,0 +1,96 @@
+#
+# weather_incremental.py: aggregates folded in over several runs match one resample of all samples,
+# late / out of order samples appended to a log are counted, prepare() applies to new samples only
+#
+
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_index
+import weather_resample
+import weather_incremental
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def write_log(path, day, ts, mode='w'):
+    with open(os.path.join(path, day + '.TXT'), mode) as f:
+        for t in ts:
+            f.write(json.dumps([{'ts': int(t), 't': float(15 + (t % 3600) / 600.0), 'p': int(101000 + t % 7)}]) + '\n')
+
+
+def test_incremental_matches_full_resample(tmp_path):
+    path = str(tmp_path)
+    statefile = os.path.join(path, 'state.npz')
+    day1 = START + np.arange(0, 86400, 60)
+    day2 = START + 86400 + np.arange(0, 43200, 60)
+    write_log(path, '20200901', day1)
+    write_log(path, '20200902', day2)
+
+    state = weather_incremental.IncrementalState(statefile, ['t', 'p'])
+    assert state.update_from_index(weather_index.DayIndex(path)) == len(day1) + len(day2)
+    state.save()
+
+    ### new samples in the open day, plus one late sample (before the last run's last ts)
+    more = START + 86400 + np.arange(43200, 86400, 60)
+    write_log(path, '20200902', np.r_[more[:10], START + 100, more[10:]], mode='a')
+    state = weather_incremental.IncrementalState(statefile, ['t', 'p'])
+    assert state.update_from_index(weather_index.DayIndex(path)) == len(more)
+    assert state.late == 1
+    state.save()
+
+    ### nothing new, the late sample is not counted again
+    state = weather_incremental.IncrementalState(statefile, ['t', 'p'])
+    assert state.update_from_index(weather_index.DayIndex(path)) == 0
+    assert state.late == 1
+
+    ts = np.r_[day1, day2, more]
+    df = pd.DataFrame({'ts': ts, 't': 15 + (ts % 3600) / 600.0, 'p': 101000.0 + ts % 7})
+    full = weather_resample.resample(df, ['t', 'p'], ['1H', '3H', '1D'], ['mean', 'min', 'max'])
+    for (w, stat), expected in full.items():
+        got = state.frame(w, stat)
+        ### cache stores metrics as float32
+        np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(), rtol=1e-6, err_msg=f"{w} {stat}")
+
+
+def test_prepare_new_samples_only(tmp_path):
+    path = str(tmp_path)
+    write_log(path, '20200901', START + np.arange(0, 3600, 60))
+    calls = []
+
+    def prepare(df):
+        calls.append(len(df))
+        df = df.copy()
+        df['t2'] = df['t'] * 2
+        return df
+
+    state = weather_incremental.IncrementalState(os.path.join(path, 'state.npz'), ['t', 't2'], ['1H'], prepare=prepare)
+    state.update_from_index(weather_index.DayIndex(path))
+    write_log(path, '20200901', START + np.arange(3600, 7200, 60), mode='a')
+    state.update_from_index(weather_index.DayIndex(path))
+    assert calls == [60, 60]
+    mean = state.frame('1H', 'mean')
+    np.testing.assert_allclose(mean['t2'], mean['t'] * 2, rtol=1e-6)
+
+
+def test_empty_state_reloads(tmp_path):
+    path = str(tmp_path)
+    statefile = os.path.join(path, 'state.npz')
+    write_log(path, '20200901', START + np.arange(0, 3600, 60))
+    ### first run limited to a start after every sample: nothing folded in
+    state = weather_incremental.IncrementalState(statefile, ['t'])
+    assert state.update_from_index(weather_index.DayIndex(path), start=START + 86400) == 0
+    state.save()
+
+    state = weather_incremental.IncrementalState(statefile, ['t'])
+    assert state.last_ts is None
+    assert state.frame('1H', 'mean').empty
+    assert state.update_from_index(weather_index.DayIndex(path)) == 60
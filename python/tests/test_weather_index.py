@@ -0,0 +1,115 @@
+#
+# weather_index.py: daily logs indexed by date, one file per date (.BIN preferred over .TXT),
+# date range selection & loads limited to the requested ts range: only the files covering the range
+# (& a day's margin) are opened, rows are sought in sorted days & masked in out of order ones
+#
+
+import os
+import sys
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_codec
+import weather_index
+import weather_loader
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def write_txt(path, day, ts):
+    with open(os.path.join(path, day + '.TXT'), 'w') as f:
+        for t in ts:
+            f.write(json.dumps({'ts': int(t), 't': 15.5, 'p': 101325}) + '\n')
+
+
+def write_bin(path, day, ts):
+    ts = np.asarray(ts)
+    cols = {'ts': ts, 't': np.full(len(ts), 15.5), 'p': np.full(len(ts), 101325.0)}
+    with open(os.path.join(path, day + weather_codec.EXT), 'wb') as f:
+        f.write(weather_codec.encode(cols))
+
+
+def test_one_file_per_date(tmp_path):
+    path = str(tmp_path)
+    day1 = START + np.arange(0, 86400, 600)
+    day2 = day1 + 86400
+    day3 = day2 + 86400
+    write_txt(path, '20200901', day1)
+    ### migration: same day as text & binary
+    write_txt(path, '20200902', day2)
+    write_bin(path, '20200902', day2)
+    write_bin(path, '20200903', day3)
+    open(os.path.join(path, 'notes.txt'), 'w').close()
+    open(os.path.join(path, '20200904.json'), 'w').close()
+
+    index = weather_index.DayIndex(path)
+    assert index.dates == [date(2020, 9, 1), date(2020, 9, 2), date(2020, 9, 3)]
+    assert [os.path.basename(f) for f in index.files] == ['20200901.TXT', '20200902.BIN', '20200903.BIN']
+
+    df, df_stat = index.load(stat_columns=['t'], processes=1)
+    assert len(df) == 3 * len(day1)
+    assert df['ts'].is_unique
+    assert list(df_stat['date']) == ['20200901', '20200902', '20200903']
+
+    ### text preferred when listed first
+    index = weather_index.DayIndex(path, ('.TXT', weather_codec.EXT))
+    assert [os.path.basename(f) for f in index.files] == ['20200901.TXT', '20200902.TXT', '20200903.BIN']
+    assert len(weather_index.DayIndex(path, '.TXT')) == 2
+
+
+def test_select_and_load_range(tmp_path):
+    path = str(tmp_path)
+    for i, day in enumerate(['20200901', '20200902', '20200903', '20200904']):
+        write_txt(path, day, START + i * 86400 + np.arange(0, 86400, 3600))
+    index = weather_index.DayIndex(path)
+
+    assert [os.path.basename(f) for f in index.select(date(2020, 9, 2), date(2020, 9, 3))] == ['20200902.TXT', '20200903.TXT']
+    assert len(index.select(START + 2 * 86400)) == 2
+    assert len(index.select()) == 4
+
+    start = datetime(2020, 9, 2, 12, tzinfo=timezone.utc)
+    df, _ = index.load(start, START + 3 * 86400 - 1, processes=1)
+    assert df['ts'].min() == weather_index.to_ts(start)
+    assert df['ts'].max() == START + 3 * 86400 - 3600
+    assert len(df) == 36
+    ### naive datetimes are UTC
+    assert weather_index.to_ts(datetime(2020, 9, 1)) == START
+
+
+def test_range_files_and_margin(tmp_path, monkeypatch):
+    path = str(tmp_path)
+    for i in range(10):
+        day = (date(2020, 9, 1) + timedelta(days=i)).strftime('%Y%m%d')
+        ### station local date: each file runs 2 hours into the next UTC day
+        write_txt(path, day, START + i * 86400 + np.arange(7200, 86400 + 7200, 3600))
+    index = weather_index.DayIndex(path)
+
+    opened = []
+    load_days = weather_loader.load_days
+
+    def spy(files, **kwargs):
+        opened.extend(os.path.basename(f) for f in files)
+        return load_days(files, **kwargs)
+    monkeypatch.setattr(weather_loader, 'load_days', spy)
+
+    start, end = START + 5 * 86400, START + 6 * 86400 - 1
+    df, df_stat = index.load(start, end, stat_columns=['t'], processes=1)
+    assert opened == ['20200905.TXT', '20200906.TXT', '20200907.TXT']
+    ### 00:00 & 01:00 from the previous file, the rest of the day from its own
+    np.testing.assert_array_equal(df['ts'], start + np.arange(0, 86400, 3600))
+    assert list(df_stat['date']) == ['20200906']
+
+
+def test_out_of_order_day(tmp_path):
+    path = str(tmp_path)
+    ts = START + np.arange(0, 86400, 3600)
+    ### clock reset mid day
+    write_txt(path, '20200901', np.r_[ts[12:], ts[:12]])
+    df, _ = weather_index.DayIndex(path).load(START + 6 * 3600, START + 18 * 3600, processes=1)
+    assert sorted(df['ts']) == list(ts[6:19])
@@ -0,0 +1,225 @@
+#
+# weather_ingest.py against a fake MQTT broker (MQTT 3.1.1, QoS 0 only): wildcard station fan-in,
+# reconnect with backoff after a dropped connection & after a refused connect
+#
+
+import os
+import sys
+import json
+import socket
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_codec
+import weather_ingest
+
+
+def _remaining_length(n):
+    out = bytearray()
+    while True:
+        b, n = n % 128, n // 128
+        out.append(b | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def publish_packet(topic, payload):
+    topic = topic.encode()
+    body = len(topic).to_bytes(2, 'big') + topic + payload
+    return b'\x30' + _remaining_length(len(body)) + body
+
+
+class FakeBroker:
+    """Accepts clients, acknowledges CONNECT / SUBSCRIBE / PINGREQ & publishes on request."""
+
+    def __init__(self):
+        self.connects = 0
+        self.subscriptions = []
+        self.writers = []
+        self.subscribed = asyncio.Event()
+        self.server = None
+
+    async def start(self, port=0):
+        self.server = await asyncio.start_server(self._client, '127.0.0.1', port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.drop()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _client(self, reader, writer):
+        self.writers.append(writer)
+        try:
+            while True:
+                header = (await reader.readexactly(1))[0]
+                n, shift = 0, 0
+                while True:
+                    b = (await reader.readexactly(1))[0]
+                    n += (b & 0x7f) << shift
+                    shift += 7
+                    if not b & 0x80:
+                        break
+                body = await reader.readexactly(n)
+                kind = header >> 4
+                if kind == 1:
+                    self.connects += 1
+                    writer.write(b'\x20\x02\x00\x00')
+                elif kind == 8:
+                    i, topics = 2, []
+                    while i < len(body):
+                        size = int.from_bytes(body[i:i + 2], 'big')
+                        topics.append(body[i + 2:i + 2 + size].decode())
+                        i += 2 + size + 1
+                    self.subscriptions.append(topics)
+                    writer.write(b'\x90' + _remaining_length(2 + len(topics)) + body[:2] + b'\x00' * len(topics))
+                    self.subscribed.set()
+                elif kind == 12:
+                    writer.write(b'\xd0\x00')
+                elif kind == 14:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            if writer in self.writers:
+                self.writers.remove(writer)
+
+    def publish(self, topic, payload):
+        for writer in self.writers:
+            writer.write(publish_packet(topic, payload))
+
+    ### close every client connection (broker restart / network drop)
+    def drop(self):
+        for writer in list(self.writers):
+            writer.close()
+        self.writers = []
+
+
+class ListSink:
+
+    def __init__(self):
+        self.docs = []
+        self.received = asyncio.Event()
+
+    async def write(self, docs):
+        self.docs.extend(docs)
+        self.received.set()
+
+    async def close(self):
+        pass
+
+
+def _free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+async def _wait(event, timeout=5):
+    await asyncio.wait_for(event.wait(), timeout)
+    event.clear()
+
+
+async def _start(broker_port, patterns):
+    sink = ListSink()
+    ingest = weather_ingest.Ingest([sink], patterns=patterns, workers=1)
+    ingest.start()
+    task = asyncio.ensure_future(weather_ingest.subscribe(ingest, '127.0.0.1', broker_port, patterns,
+                                                          min_delay=0.05, max_delay=0.2))
+    return sink, ingest, task
+
+
+async def _finish(ingest, task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await ingest.stop()
+
+
+def test_station_fan_in():
+    async def run():
+        broker = FakeBroker()
+        port = await broker.start()
+        sink, ingest, task = await _start(port, ['weather/+/out'])
+        await _wait(broker.subscribed)
+        assert broker.subscriptions == [['weather/+/out']]
+
+        broker.publish('weather/garden/out', json.dumps({'ts': 1, 't': 20.5}).encode())
+        broker.publish('weather/roof/out', json.dumps([{'ts': 2, 'h': 60}, {'ts': 3, 'h': 61}]).encode())
+        broker.publish('weather/roof/out', weather_codec.encode({'ts': [4], 't': [19.25], 'p': [101325]}))
+        broker.publish('weather/roof/out', b'{not json')
+        while len(sink.docs) < 4:
+            await _wait(sink.received)
+
+        stations = sorted((d['station'], d['ts']) for d in sink.docs)
+        assert stations == [('garden', 1), ('roof', 2), ('roof', 3), ('roof', 4)]
+        assert [d['t'] for d in sink.docs if d['ts'] == 4] == [19.25]
+        assert ingest.stations['roof'].errors == 1
+        await _finish(ingest, task)
+        await broker.stop()
+
+    asyncio.run(run())
+
+
+def test_reconnect_after_drop():
+    async def run():
+        broker = FakeBroker()
+        port = await broker.start()
+        sink, ingest, task = await _start(port, ['weather/+/out'])
+        await _wait(broker.subscribed)
+
+        broker.drop()
+        ### client reconnects & subscribes again
+        await _wait(broker.subscribed)
+        assert broker.connects == 2
+        assert not task.done()
+
+        broker.publish('weather/garden/out', json.dumps({'ts': 5, 't': 18.0}).encode())
+        await _wait(sink.received)
+        assert [(d['station'], d['ts']) for d in sink.docs] == [('garden', 5)]
+        await _finish(ingest, task)
+        await broker.stop()
+
+    asyncio.run(run())
+
+
+def test_retry_refused_connect():
+    async def run():
+        port = _free_port()
+        sink, ingest, task = await _start(port, ['weather/+/out'])
+        ### nothing listening yet, connect attempts fail & are retried
+        await asyncio.sleep(0.5)
+        assert not task.done()
+
+        broker = FakeBroker()
+        await broker.start(port)
+        await _wait(broker.subscribed)
+        assert broker.connects == 1
+        await _finish(ingest, task)
+        await broker.stop()
+
+    asyncio.run(run())
+
+
+def test_scalar_payload_keeps_batch():
+    async def run():
+        sink = ListSink()
+        ingest = weather_ingest.Ingest([sink], patterns=['weather/+/out'], workers=1)
+        ingest.submit('weather/garden/out', json.dumps({'ts': 1, 't': 20.5}).encode())
+        for payload in (b'null', b'123', b'"x"'):
+            ingest.submit('weather/roof/out', payload)
+        ingest.submit('weather/shed/out', json.dumps([{'ts': 2, 'h': 60}]).encode())
+        ### one worker, all five messages decoded as one batch
+        ingest.start()
+        await _wait(sink.received)
+
+        assert sorted((d['station'], d['ts']) for d in sink.docs) == [('garden', 1), ('shed', 2)]
+        assert ingest.stations['roof'].errors == 3
+        assert all(st.queued == 0 for st in ingest.stations.values())
+        await ingest.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,83 @@
+#
+# weather_loader.py load_days: a process pool loads the same frame & per day stats as one process,
+# days with different columns combine into aligned columns (NaN where a day has no such metric)
+#
+
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_stats
+import weather_loader
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def write_day(path, day, ts, fields):
+    filepath = os.path.join(path, day + '.TXT')
+    with open(filepath, 'w') as f:
+        for t in ts:
+            rec = {'ts': int(t)}
+            rec.update({k: float((t // 60) % 97) + i for i, k in enumerate(fields)})
+            f.write(json.dumps([rec]) + '\n')
+    return filepath
+
+
+def days(path):
+    return [
+        write_day(path, '20200901', START + np.arange(0, 86400, 300), ['t', 'p']),
+        write_day(path, '20200902', START + 86400 + np.arange(0, 86400, 300), ['t', 'p', 'h']),
+        write_day(path, '20200903', START + 2 * 86400 + np.arange(0, 43200, 300), ['p']),
+    ]
+
+
+def test_pool_matches_one_process(tmp_path):
+    files = days(str(tmp_path))
+    labels = {'t': 'temperature', 'p': 'pressure'}
+    df, df_stat = weather_loader.load_days(files, stat_columns=labels, processes=1)
+    df2, df_stat2 = weather_loader.load_days(files, stat_columns=labels, processes=3)
+    pd.testing.assert_frame_equal(df, df2)
+    pd.testing.assert_frame_equal(df_stat, df_stat2)
+
+    assert len(df) == 288 + 288 + 144
+    assert np.all(np.diff(df['ts'].to_numpy()) > 0)
+    assert list(df.columns) == ['ts', 't', 'p', 'h']
+    ### metrics missing from a day are NaN
+    assert df['h'].iloc[:288].isna().all() and df['h'].iloc[288:576].notna().all()
+    assert df['t'].iloc[576:].isna().all()
+
+    ### stats per file date, only metrics the day has
+    assert list(zip(df_stat['data'], df_stat['date'])) == [
+        ('temperature', '20200901'), ('pressure', '20200901'),
+        ('temperature', '20200902'), ('pressure', '20200902'),
+        ('pressure', '20200903')]
+    day2 = df.iloc[288:576]
+    want = weather_stats.daily_stats(day2, labels, day=np.repeat('20200902', len(day2)))
+    pd.testing.assert_frame_equal(df_stat.iloc[2:4].reset_index(drop=True), want)
+
+
+def test_columns_filter(tmp_path):
+    files = days(str(tmp_path))
+    df, df_stat = weather_loader.load_days(files, columns=['p'], processes=1)
+    assert list(df.columns) == ['ts', 'p']
+    assert df['p'].dtype == np.float32
+    assert df_stat.empty and list(df_stat.columns) == weather_stats.STAT_COLUMNS
+
+
+def test_combine():
+    a = {'ts': np.array([1, 2]), 't': np.array([1.0, 2.0], dtype=np.float32)}
+    b = {'ts': np.array([3]), 't': np.array([3.0]), 'h': np.array([50.0])}
+    out = weather_loader.combine([a, b])
+    np.testing.assert_array_equal(out['ts'], [1, 2, 3])
+    assert out['t'].dtype == np.float64
+    np.testing.assert_array_equal(out['t'], [1, 2, 3])
+    np.testing.assert_array_equal(out['h'], [np.nan, np.nan, 50])
+    assert set(weather_loader.combine([a, b], {'ts', 'h'})) == {'ts', 'h'}
+    assert len(weather_loader.combine([])['ts']) == 0
@@ -0,0 +1,60 @@
+#
+# weather_log.py read_columns: SD card JSON lines into aligned typed columns, records with a bad ts
+# (not a number, NaN, out of range) or truncated lines in the middle of a file are skipped whole
+#
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_log
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+LINES = [
+    '[{"ts":%d,"tempC":18.6,"tempF":65.0,"h":47,"LDR":60,"p":102163}]' % START,
+    '[{"ts":"x","tempC":99,"h":99,"LDR":99,"p":99,"w":99}]',
+    '[{"ts":%d,"tempC":18.7,"tempF":65.0,"h":48,"LDR":61,"p":102164}]' % (START + 30),
+    '[{"ts":NaN,"tempC":99,"h":99}]',
+    '[{"ts":1e30,"tempC":99,"h":99}]',
+    '[{"ts":true,"tempC":99}]',
+    '[{"tempC":99,"h":99}]',
+    '[{"ts":%d,"tempC":18.8,"tempF":65.0,"h":49,"LDR":62,"p":102' % (START + 45),
+    '[{"ts":%d,"tempC":18.9,"tempF":65.0,"h":50,"p":102165,"w":3}]' % (START + 60),
+]
+
+
+def test_bad_ts_mid_file(tmp_path):
+    path = tmp_path / '20200901.TXT'
+    path.write_text('\n'.join(LINES) + '\n')
+
+    cols = weather_log.read_columns(str(path))
+    assert cols['ts'].dtype == np.int64
+    np.testing.assert_array_equal(cols['ts'], [START, START + 30, START + 60])
+    assert {len(v) for v in cols.values()} == {3}
+    np.testing.assert_array_equal(cols['t'], [18.6, 18.7, 18.9])
+    np.testing.assert_array_equal(cols['h'], [47, 48, 50])
+    np.testing.assert_array_equal(cols['l'], [60, 61, np.nan])
+    ### first seen on the last record, padded back
+    np.testing.assert_array_equal(cols['w'], [np.nan, np.nan, 3])
+
+    cols = weather_log.read_columns(str(path), columns=['t', 'p'])
+    assert set(cols) == {'ts', 't', 'p'}
+    np.testing.assert_array_equal(cols['p'], [102163, 102164, 102165])
+
+
+def test_append_rejects_bad_ts():
+    buf = weather_log.ColumnBuffer()
+    assert buf.append({'ts': START, 't': 1.0})
+    for ts in ('x', None, float('nan'), float('inf'), 2 ** 63, [START], False):
+        assert not buf.append({'ts': ts, 't': 2.0, 'new': 1.0})
+    assert buf.append({'ts': str(START + 1), 't': 3.0})
+    cols = buf.arrays()
+    np.testing.assert_array_equal(cols['ts'], [START, START + 1])
+    np.testing.assert_array_equal(cols['t'], [1.0, 3.0])
+    assert 'new' not in cols
@@ -0,0 +1,146 @@
+#
+# weather_mongo_query.py against mongomock: server side buckets match pandas resampling of the
+# same samples, raw reads (mongomock & BSON batches) round trip into typed columns (non numeric values NaN, bad ts skipped)
+#
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import bson
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip("mongomock")
+
+import weather_mongo_query
+
+
+COLUMNS = ['p', 'tempC', 'h', 'LDR']
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def samples(days=2, interval=30, seed=1):
+    rng = np.random.default_rng(seed)
+    ts = START + np.arange(days * 86400 // interval) * interval
+    return pd.DataFrame({
+        'ts': ts,
+        'p': 101325 + rng.normal(0, 50, len(ts)).round(),
+        'tempC': (15 + rng.normal(0, 3, len(ts))).round(1),
+        'h': rng.integers(40, 90, len(ts)).astype(float),
+        'LDR': rng.integers(0, 1024, len(ts)).astype(float),
+    })
+
+
+def collection(df):
+    coll = mongomock.MongoClient().weather.sensorData
+    coll.insert_many([{k: (int(v) if k == 'ts' else float(v)) for k, v in row.items()} for row in df.to_dict('records')])
+    return coll
+
+
+def test_resample_matches_pandas():
+    df = samples()
+    coll = collection(df)
+    end = int(df.ts.iloc[-1])
+    r = weather_mongo_query.resample(coll, START, end, COLUMNS, ['1H', '3H', '1D'], ['mean', 'min', 'max'])
+
+    indexed = df.set_index(pd.to_datetime(df.ts, unit='s'))[COLUMNS]
+    for window, rule in (('1H', '1h'), ('3H', '3h'), ('1D', '1D')):
+        for stat in ('mean', 'min', 'max'):
+            expected = getattr(indexed.resample(rule), stat)()
+            got = r[window, stat]
+            assert len(got) == len(expected), (window, stat)
+            np.testing.assert_allclose(got[COLUMNS].to_numpy(), expected.to_numpy(), rtol=1e-9, err_msg=f"{window} {stat}")
+
+
+def test_bucket_partials_range_and_station():
+    df = samples(days=1)
+    coll = collection(df)
+    coll.update_many({'ts': {'$lt': START + 3600}}, {'$set': {'station': 'roof'}})
+
+    p = weather_mongo_query.bucket_partials(coll, ['p'], '1H', START, START + 3 * 3600 - 1)
+    assert list(p['bucket']) == [START, START + 3600, START + 7200]
+    assert list(p['p']['count']) == [120, 120, 120]
+
+    p = weather_mongo_query.bucket_partials(coll, ['p'], '1H', station='roof')
+    assert list(p['bucket']) == [START]
+    assert p['p']['sum'][0] == pytest.approx(df.p.iloc[:120].sum())
+
+
+def test_non_numeric_values_skipped():
+    df = samples(days=1)
+    coll = collection(df)
+    ### one bad sample each: string, boolean & null, read as NaN as by read_columns
+    bad = {START + 30: 'err', START + 3630: True, START + 7230: None}
+    for ts, value in bad.items():
+        coll.update_one({'ts': ts}, {'$set': {'p': value}})
+        df.loc[df.ts == ts, 'p'] = np.nan
+
+    r = weather_mongo_query.resample(coll, None, None, ['p'], ['1H'], ['mean', 'min', 'max'])
+    indexed = df.set_index(pd.to_datetime(df.ts, unit='s'))[['p']].resample('1h')
+    for stat in ('mean', 'min', 'max'):
+        np.testing.assert_allclose(r['1H', stat]['p'].to_numpy(), getattr(indexed, stat)()['p'].to_numpy(), rtol=1e-9)
+    p = weather_mongo_query.bucket_partials(coll, ['p'], '1H')
+    assert list(p['p']['count'][:4]) == [119, 119, 119, 120]
+    np.testing.assert_array_equal(p['p']['count'], weather_mongo_query.read_frame(coll, columns=['p']).set_index('ts')['p']
+                                  .groupby(lambda t: t - t % 3600).count().to_numpy())
+
+
+def test_read_columns_round_trip():
+    coll = mongomock.MongoClient().weather.sensorData
+    coll.insert_many([
+        {'ts': START + 60, 'tempC': 20.5, 'h': 60, 'p': 101000},
+        {'ts': START, 'tempC': 19.5, 'h': 'n/a', 'p': None},
+        {'ts': float(START + 120), 'tempC': True, 'h': 61.5},
+        {'tempC': 18.0},
+        {'ts': 'bad', 'tempC': 18.0},
+    ])
+    out = weather_mongo_query.read_columns(coll, columns=('tempC', 'h', 'p'))
+    assert out['ts'].dtype == np.int64
+    assert list(out['ts']) == [START, START + 60, START + 120]
+    np.testing.assert_array_equal(out['tempC'], [19.5, 20.5, np.nan])
+    np.testing.assert_array_equal(out['h'], [np.nan, 60.0, 61.5])
+    np.testing.assert_array_equal(out['p'], [np.nan, 101000.0, np.nan])
+
+    df = weather_mongo_query.read_frame(coll, START + 60, START + 120, ['tempC'])
+    assert list(df.columns) == ['ts', 'tempC']
+    assert list(df.ts) == [START + 60, START + 120]
+
+
+class RawBatches:
+    """Stub collection: find_raw_batches() yields the matching documents as concatenated BSON batches."""
+
+    def __init__(self, docs, batch_size=2):
+        self.docs = docs
+        self.batch_size = batch_size
+        self.calls = []
+
+    def find_raw_batches(self, match, projection, sort=None, batch_size=None):
+        self.calls.append((match, projection, sort))
+        for i in range(0, len(self.docs), self.batch_size):
+            yield b''.join(bson.encode(d) for d in self.docs[i:i + self.batch_size])
+
+
+def test_read_columns_raw_batches():
+    coll = RawBatches([
+        {'ts': START, 'tempC': 19.5, 'h': 'n/a'},
+        {'ts': START + 60, 'tempC': 20.5, 'h': 60, 'p': 101000},
+        {'ts': None, 'tempC': 18.0},
+        {'ts': float(START + 120), 'tempC': bson.Int64(21), 'h': 61.5, 'p': False},
+        {'ts': bson.Int64(START + 180), 'p': 101010.5},
+    ])
+    out = weather_mongo_query.read_columns(coll, START, START + 180, columns=('tempC', 'h', 'p'))
+    match, projection, sort = coll.calls[0]
+    assert match == {'ts': {'$gte': START, '$lte': START + 180}}
+    assert projection == {'tempC': 1, 'h': 1, 'p': 1, 'ts': 1, '_id': 0}
+    assert sort == [('ts', 1)]
+
+    assert out['ts'].dtype == np.int64
+    assert list(out['ts']) == [START, START + 60, START + 120, START + 180]
+    np.testing.assert_array_equal(out['tempC'], [19.5, 20.5, 21.0, np.nan])
+    np.testing.assert_array_equal(out['h'], [np.nan, 60.0, 61.5, np.nan])
+    np.testing.assert_array_equal(out['p'], [np.nan, 101000.0, np.nan, 101010.5])
@@ -0,0 +1,33 @@
+#
+# weather_mongo_schema.py: prepare() adds the TTL date only for a usable ts, never raises
+#
+
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("pymongo")
+
+import weather_mongo_schema
+
+
+def test_prepare_adds_dt():
+    doc = weather_mongo_schema.prepare({'ts': 1598918400, 'tempC': 19.5})
+    assert doc['dt'] == datetime(2020, 9, 1, tzinfo=timezone.utc)
+    assert weather_mongo_schema.prepare({'ts': 1598918400.5})['dt'].microsecond == 500000
+
+
+@pytest.mark.parametrize('ts', ['1598918400', None, True, 1e300, -1e300, float('nan'), float('inf'), 10 ** 30, [1]])
+def test_prepare_bad_ts_stores_doc(ts):
+    doc = weather_mongo_schema.prepare({'ts': ts, 'tempC': 19.5})
+    assert 'dt' not in doc
+    assert doc['tempC'] == 19.5
+
+
+def test_prepare_keeps_existing_dt():
+    dt = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    assert weather_mongo_schema.prepare({'ts': 1598918400, 'dt': dt})['dt'] is dt
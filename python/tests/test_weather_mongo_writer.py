@@ -0,0 +1,131 @@
+#
+# weather_mongo_writer.py BulkWriter: batching by size & interval into mongomock, retry of failed
+# inserts, partial bulk write errors, drop accounting when the queue is full or inserts keep failing
+#
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip("mongomock")
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+import weather_mongo_writer
+from weather_mongo_writer import BulkWriter
+
+
+class StubCollection:
+    """insert_many() raises the queued errors in turn, then records batches."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.batches = []
+        self.calls = 0
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(list(docs))
+
+        class Result:
+            inserted_ids = list(range(len(docs)))
+        return Result()
+
+
+def docs(n, start=0):
+    return [{'ts': 1598918400 + i, 'tempC': 19.5} for i in range(start, start + n)]
+
+
+def test_batches_into_collection():
+    coll = mongomock.MongoClient().weather.sensorData
+    writer = BulkWriter(coll, batch_size=100, flush_interval=10, prepare=lambda d: dict(d, station='roof')).start()
+    assert writer.put(docs(250)) == 250
+    assert writer.put(docs(1, 250)[0]) == 1
+    ### full batches are written without waiting for the flush interval
+    deadline = time.monotonic() + 5
+    while coll.count_documents({}) < 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert coll.count_documents({}) >= 200
+    writer.close()
+    assert coll.count_documents({}) == 251
+    assert coll.count_documents({'station': 'roof'}) == 251
+    assert writer.stats() == {'inserted': 251, 'dropped': 0, 'errors': 0, 'queued': 0}
+
+
+def test_flush_interval():
+    coll = StubCollection()
+    writer = BulkWriter(coll, batch_size=1000, flush_interval=0.1).start()
+    writer.put(docs(3))
+    deadline = time.monotonic() + 5
+    while not coll.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [len(b) for b in coll.batches] == [3]
+    writer.close()
+
+
+def test_retry_then_drop(monkeypatch):
+    monkeypatch.setattr(weather_mongo_writer.time, 'sleep', lambda s: None)
+    coll = StubCollection([AutoReconnect('down')])
+    writer = BulkWriter(coll, retries=3).start()
+    writer.put(docs(5))
+    writer.close()
+    assert coll.calls == 2
+    assert writer.stats()['inserted'] == 5
+
+    coll = StubCollection([AutoReconnect('down')] * 3)
+    writer = BulkWriter(coll, retries=3).start()
+    writer.put(docs(5))
+    writer.close()
+    assert coll.calls == 3
+    assert writer.stats() == {'inserted': 0, 'dropped': 5, 'errors': 0, 'queued': 0}
+
+
+def test_bulk_write_errors_counted():
+    error = BulkWriteError({'nInserted': 3, 'writeErrors': [{'index': 1, 'code': 11000}, {'index': 4, 'code': 11000}]})
+    coll = StubCollection([error])
+    writer = BulkWriter(coll).start()
+    writer.put(docs(5))
+    writer.close()
+    ### unordered insert: not retried, written documents & failures counted
+    assert coll.calls == 1
+    assert writer.stats() == {'inserted': 3, 'dropped': 0, 'errors': 2, 'queued': 0}
+
+
+def test_full_queue_blocks_once_per_call():
+    ### not started: nothing drains the queue
+    writer = BulkWriter(StubCollection(), max_queue=10, put_timeout=0.2)
+    t = time.monotonic()
+    assert writer.put(docs(50)) == 10
+    assert time.monotonic() - t < 1.0
+    assert writer.stats() == {'inserted': 0, 'dropped': 40, 'errors': 0, 'queued': 10}
+
+
+def test_prepare_error_queues_doc():
+    def prepare(doc):
+        if doc['ts'] % 2:
+            raise ValueError('bad')
+        return dict(doc, dt=True)
+
+    coll = StubCollection()
+    writer = BulkWriter(coll, prepare=prepare).start()
+    assert writer.put(docs(4)) == 4
+    writer.close()
+    assert [('dt' in d) for d in coll.batches[0]] == [True, False, True, False]
+
+
+def test_counters_from_many_threads():
+    writer = BulkWriter(StubCollection(), max_queue=1, put_timeout=0)
+    threads = [threading.Thread(target=writer.put, args=(docs(1000),)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = writer.stats()
+    assert stats['queued'] == 1
+    assert stats['dropped'] == 4000 - 1
@@ -0,0 +1,95 @@
+#
+# weather_outliers.py OutlierFilter: exclusive bounds, single sample spikes (not level steps), masks
+# independent of chunk size, Hampel check on quantized readings, the STATION configuration weather.py runs
+#
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_outliers
+from weather_outliers import OutlierFilter
+
+
+def temperature(n=5000, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.round(15 + 5 * np.sin(np.arange(n) / 500.0) + rng.normal(0, 0.2, n), 1)
+
+
+def test_bounds():
+    x = np.array([95999.0, 96000, 96001, np.nan, 108999, 109000])
+    keep, counts = OutlierFilter(bounds={'p': (96000, 109000)}).filter_column('p', x)
+    np.testing.assert_array_equal(keep, [False, False, True, False, True, False])
+    assert counts['missing'] == 1 and counts['bounds'] == 3
+    ### open ended
+    keep, _ = OutlierFilter(bounds={'t': (None, 50)}).filter_column('t', np.array([-40.0, 50, 49.9]))
+    np.testing.assert_array_equal(keep, [True, False, True])
+
+
+def test_spike_not_step():
+    x = temperature(200)
+    x[50] = 97435.39
+    ### sustained level change: every sample differs from one neighbour only
+    x[120:] += 10
+    keep, counts = OutlierFilter(spike={'t': 5.0}).filter_column('t', x)
+    assert np.flatnonzero(~keep).tolist() == [50]
+    assert counts['spike'] == 1
+    ### first & last samples have one neighbour, never a spike
+    x[0] = x[-1] = 1000
+    keep, _ = OutlierFilter(spike={'t': 5.0}).filter_column('t', x)
+    assert keep[0] and keep[-1]
+
+
+@pytest.mark.parametrize('check', [{'spike': {'t': 2.0}}, {'zscore': 3.0, 'window': 31},
+                                   {'spike': {'t': 2.0}, 'zscore': 3.0, 'window': 31}])
+def test_chunk_size_invariant(check):
+    x = temperature()
+    x[np.arange(100, 5000, 377)] += 8
+    ### adjacent spikes
+    x[np.arange(101, 5000, 1001)] += 8
+    x[np.arange(60, 5000, 911)] = np.nan
+    whole, counts = OutlierFilter(chunk_size=10 ** 6, **check).filter_column('t', x)
+    for chunk_size in (1, 7, 1000):
+        keep, c = OutlierFilter(chunk_size=chunk_size, **check).filter_column('t', x)
+        np.testing.assert_array_equal(keep, whole, err_msg=str(chunk_size))
+        assert c == counts
+    assert counts['spike'] + counts['zscore'] >= 10
+
+
+def test_zscore_trailing_window():
+    x = temperature(400)
+    x[300] += 6
+    keep, _ = OutlierFilter(zscore=4.0, window=61).filter_column('t', x)
+    ### brute force: z of each sample against its trailing window (population std)
+    expect = np.ones(len(x), dtype=bool)
+    for i in range(1, len(x)):
+        win = x[max(i - 60, 0):i + 1]
+        expect[i] = abs(x[i] - win.mean()) / win.std() <= 4.0
+    np.testing.assert_array_equal(keep, expect)
+    assert not keep[300]
+
+
+def test_hampel_quantized():
+    ### steady sensor read at 0.1 C: MAD of the raw readings is 0
+    x = np.full(1000, 21.3)
+    x[::7] = 21.4
+    x[500] = 23.0
+    keep, counts = OutlierFilter(mad=3.5, window=61).filter_column('t', x)
+    assert np.flatnonzero(~keep).tolist() == [500]
+    assert counts['mad'] == 1
+
+
+def test_station():
+    t = temperature()
+    t[[10, 2000, 4000]] = [97435.39, -20, 60]
+    p = np.full(len(t), 101325.0)
+    p[[5, 6]] = [0, 150000]
+    f = OutlierFilter(**weather_outliers.STATION)
+    masks, counts = f.apply({'t': t, 'p': p})
+    assert np.flatnonzero(~masks['t']).tolist() == [10, 2000, 4000]
+    assert counts['t']['bounds'] == 2 and counts['t']['spike'] == 1
+    assert np.flatnonzero(~masks['p']).tolist() == [5, 6]
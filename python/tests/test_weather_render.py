@@ -0,0 +1,83 @@
+#
+# weather_render.py render mode, run as a script would be: charts written with manifest, a run whose inputs
+# (files, extra values) are unchanged exits before building figures, a changed input or a failed run rebuilds
+#
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+pytest.importorskip("matplotlib")
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = '''
+import sys
+sys.path.insert(0, %r)
+import weather_render
+weather_render.setup()
+import matplotlib.pyplot as plt
+
+data = sys.argv[1]
+if weather_render.unchanged([data], [sys.argv[2]]):
+    sys.exit(0)
+print("building")
+values = [float(v) for v in open(data).read().split()]
+fig, ax = plt.subplots()
+ax.plot(values)
+ax.set_title('Values')
+if sys.argv[3] == 'fail':
+    raise RuntimeError('failed')
+plt.show()
+'''
+
+
+def run(tmp_path, extra='a', mode='ok'):
+    env = dict(os.environ, WEATHER_RENDER=str(tmp_path / 'charts'), MPLBACKEND='Agg')
+    p = subprocess.run([sys.executable, str(tmp_path / 'charts_script.py'), str(tmp_path / 'data.txt'), extra, mode],
+                       env=env, capture_output=True, text=True, timeout=120)
+    return p.stdout, p.stderr
+
+
+def test_unchanged_inputs_skip_build(tmp_path):
+    (tmp_path / 'charts_script.py').write_text(SCRIPT % PYTHON_DIR)
+    (tmp_path / 'data.txt').write_text('1 2 3')
+
+    out, err = run(tmp_path)
+    assert 'building' in out
+    assert 'charts: 1 rendered' in err
+    manifest = json.loads((tmp_path / 'charts' / 'manifest.json').read_text())
+    assert list(manifest) == ['charts_script-01-values']
+
+    out, err = run(tmp_path)
+    assert 'building' not in out
+    assert 'inputs unchanged, 1 charts current' in err
+
+    ### extra value changed: figure rebuilt, same content so not re-rendered
+    out, err = run(tmp_path, extra='b')
+    assert 'building' in out
+    assert 'charts: 0 rendered, 1 unchanged' in err
+
+    ### input file changed
+    (tmp_path / 'data.txt').write_text('1 2 3 4')
+    os.utime(tmp_path / 'data.txt', ns=(0, 10 ** 9))
+    out, err = run(tmp_path, extra='b')
+    assert 'charts: 1 rendered' in err
+
+    ### rendered file removed
+    for f in (tmp_path / 'charts').glob('*.png'):
+        f.unlink()
+    out, err = run(tmp_path, extra='b')
+    assert 'building' in out
+
+
+def test_failed_run_not_recorded(tmp_path):
+    (tmp_path / 'charts_script.py').write_text(SCRIPT % PYTHON_DIR)
+    (tmp_path / 'data.txt').write_text('1 2 3')
+    out, err = run(tmp_path, mode='fail')
+    assert 'RuntimeError' in err
+    out, err = run(tmp_path)
+    assert 'building' in out
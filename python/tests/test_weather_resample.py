@@ -0,0 +1,79 @@
+#
+# weather_resample.py against pandas DataFrame.resample(): mean, std, min, max for hourly, 3 hourly & daily
+# windows with missing values, empty buckets & unsorted rows; merged partials equal one pass over all rows
+#
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_resample
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+RULES = {'1H': 'h', '3H': '3h', '1D': 'D'}
+
+
+def frame(seed=1):
+    rng = np.random.default_rng(seed)
+    ts = START + np.sort(rng.choice(4 * 86400, 5000, replace=False))
+    ### no samples for 5 hours
+    ts = ts[(ts < START + 30000) | (ts >= START + 48000)]
+    df = pd.DataFrame({'ts': ts, 't': rng.normal(15, 5, len(ts)), 'p': rng.normal(101325, 300, len(ts))})
+    df.loc[rng.choice(len(df), 300, replace=False), 't'] = np.nan
+    return df
+
+
+def expected(df, columns, window, stat):
+    s = df.set_index(pd.to_datetime(df['ts'], unit='s'))[columns]
+    s.index.name = None
+    return getattr(s.resample(RULES[window]), stat)()
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_matches_pandas(shuffle):
+    df = frame()
+    src = df.sample(frac=1, random_state=3) if shuffle else df
+    stats = ['mean', 'std', 'min', 'max']
+    out = weather_resample.resample(src, ['t', 'p'], ['1D', '1H', '3H'], stats)
+    assert set(out) == {(w, s) for w in RULES for s in stats}
+    for (w, stat), got in out.items():
+        want = expected(df, ['t', 'p'], w, stat)
+        ### sum of squares std: relative error grows with mean / std (101325 / 300 for pressure)
+        pd.testing.assert_frame_equal(got, want, check_freq=False, rtol=1e-6, obj=f"{w} {stat}")
+    ### empty hours present as NaN rows
+    assert out['1H', 'mean'].loc['2020-09-01 09:00':'2020-09-01 12:00'].isna().all().all()
+
+
+def test_merge_equals_one_pass():
+    df = frame()
+    cols = lambda d: {c: d[c].to_numpy() for c in ('t', 'p')}
+    ### split mid bucket: the hour is in both halves
+    a, b = df.iloc[:2001], df.iloc[2001:]
+    merged = weather_resample.merge(weather_resample.partials(a['ts'], cols(a), '1H'),
+                                    weather_resample.partials(b['ts'], cols(b), '1H'))
+    full = weather_resample.partials(df['ts'], cols(df), '1H')
+    np.testing.assert_array_equal(merged['bucket'], full['bucket'])
+    for c in ('t', 'p'):
+        for k in weather_resample.PARTIALS:
+            np.testing.assert_allclose(merged[c][k], full[c][k], rtol=1e-12, err_msg=f"{c} {k}")
+
+
+def test_rollup_window():
+    p = weather_resample.partials(frame()['ts'], {}, '3H')
+    with pytest.raises(ValueError):
+        weather_resample.rollup(p, '1H')
+    with pytest.raises(ValueError):
+        weather_resample.rollup(p, 3600 * 4)
+
+
+def test_empty():
+    out = weather_resample.resample(pd.DataFrame({'ts': np.empty(0, dtype=np.int64), 't': []}), ['t'])
+    assert all(df.empty for df in out.values())
@@ -0,0 +1,99 @@
+#
+# weather_rolling.py RollingStats against a brute force window over the accepted samples, with out of order
+# samples & far future ts (rejected, or followed once several agree on the new time)
+#
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_rolling
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+WINDOWS = {'1m': 60, '1h': 3600}
+
+
+def brute(samples, now, seconds):
+    values = [v for ts, v in samples if ts > now - seconds]
+    if not values:
+        return {'n': 0, 'mean': None, 'std': None, 'min': None, 'max': None, 'pct': None}
+    n = len(values)
+    return {
+        'n': n,
+        'mean': float(np.mean(values)),
+        'std': float(np.std(values, ddof=1)) if n > 1 else None,
+        'min': min(values),
+        'max': max(values),
+        'pct': (values[-1] - values[0]) / abs(values[0]) if n > 1 and values[0] else None,
+    }
+
+
+def assert_stats(got, expected):
+    assert got['n'] == expected['n']
+    for k in ('mean', 'std', 'min', 'max', 'pct'):
+        if expected[k] is None:
+            assert got[k] is None, k
+        else:
+            assert got[k] == pytest.approx(expected[k], rel=1e-9, abs=1e-9), k
+
+
+def test_matches_brute_force():
+    rng = np.random.default_rng(3)
+    stats = weather_rolling.RollingStats(WINDOWS, columns=['t'])
+    accepted = []
+    clock = None
+    ts = START
+    for i in range(3000):
+        ts += int(rng.integers(1, 20))
+        t = ts
+        if i % 500 == 250:
+            ### corrupt ts, years ahead
+            t = ts + 10 * 365 * 86400
+        elif i % 97 == 0:
+            ### late sample joins the latest time
+            t = ts - 30
+        value = round(float(rng.normal(15, 5)), 2)
+        added = stats.add({'ts': t, 't': value})
+        if t > (clock or t) + stats.max_ahead:
+            assert not added
+            continue
+        assert added
+        clock = max(t, clock or t)
+        accepted.append((clock, value))
+        if i % 50 == 0:
+            snap = stats.snapshot()
+            assert snap['ts'] == clock
+            for name, seconds in WINDOWS.items():
+                assert_stats(snap['windows'][name]['t'], brute(accepted, clock, seconds))
+    assert stats.rejected == 6
+    assert stats.count == len(accepted)
+
+
+def test_resync_after_gap():
+    stats = weather_rolling.RollingStats(WINDOWS, columns=['t'], resync=3)
+    for i in range(10):
+        stats.add({'ts': START + i * 10, 't': 1.0})
+    ### station off for a day: the first samples after are rejected until 3 agree on the new time
+    later = START + 86400
+    assert not stats.add({'ts': later, 't': 2.0})
+    assert not stats.add({'ts': later + 10, 't': 2.0})
+    assert stats.add({'ts': later + 20, 't': 2.0})
+    assert stats.ts == later + 20
+    assert stats.rejected == 2
+    w = stats.snapshot()['windows']['1h']['t']
+    assert (w['n'], w['mean']) == (1, 2.0)
+
+    ### a lone far future sample between good ones does not count towards a resync
+    assert not stats.add({'ts': later + 10 ** 8, 't': 3.0})
+    assert stats.add({'ts': later + 30, 't': 2.0})
+    assert not stats.add({'ts': later + 10 ** 8 + 10, 't': 3.0})
+    assert stats.add({'ts': later + 40, 't': 2.0})
+    assert stats.ts == later + 40
+    assert stats.rejected == 4
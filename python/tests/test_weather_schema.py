@@ -0,0 +1,73 @@
+#
+# weather_schema.py: each station format detected from its field names & read into the same canonical
+# columns (weather_log.read_columns), registered schemas checked first, CSV only with a known header
+#
+
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_log
+import weather_schema
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+RECORDS = {
+    'sd_v1': {'ts': START, 'tempC': 18.5, 'tempF': 65.3, 'h': 47, 'LDR': 60, 'p': 102163, 'w': 0},
+    'station_v2': {'ts': START, 't': 18.5, 'h': 47, 'l': 60, 'p': 102163, 'sr': '06:15:00'},
+    'meteo_json': {'ts': START, 'temp': 18.5, 'humidity': 47, 'LDR': 60},
+}
+
+
+@pytest.mark.parametrize('name', sorted(RECORDS))
+def test_detect_and_read(tmp_path, name):
+    rec = RECORDS[name]
+    assert weather_schema.detect(rec.keys()) == name
+    path = tmp_path / '20200901.TXT'
+    path.write_text(''.join(json.dumps([dict(rec, ts=START + i)]) + '\n' for i in range(3)))
+    cols = weather_log.read_columns(str(path))
+    assert {'ts', 't', 'h', 'l'} <= set(cols)
+    np.testing.assert_array_equal(cols['t'], [18.5] * 3)
+    np.testing.assert_array_equal(cols['h'], [47] * 3)
+    np.testing.assert_array_equal(cols['l'], [60] * 3)
+    ### schema=None keeps source names
+    assert set(weather_log.read_columns(str(path), schema=None)) == set(rec)
+
+
+def test_csv(tmp_path):
+    path = tmp_path / 'SENSOR.TXT'
+    path.write_text('ts,tempC,tempH,humidity,LDR\n%d,18.5,65.3,47,60\n%d,18.6,65.5,48,61\n' % (START, START + 1))
+    assert weather_log.is_csv(str(path))
+    cols = weather_log.read_columns(str(path))
+    assert set(cols) == {'ts', 't', 'tf', 'h', 'l'}
+    np.testing.assert_array_equal(cols['h'], [47, 48])
+    ### not a known schema header / JSON first line
+    assert not weather_log.is_csv_header('ts,a,b')
+    assert not weather_log.is_csv_header('tempC,tempH,humidity,LDR')
+    assert not weather_log.is_csv_header('[{"ts":1,"tempC":1,"tempF":2}]')
+
+
+def test_unknown_keeps_names():
+    assert weather_schema.detect(['ts', 'x']) is None
+    assert weather_schema.rename_map('auto', ['ts', 'x']) == {}
+    assert weather_schema.rename_map(None, RECORDS['sd_v1']) == {}
+    assert weather_schema.rename_map('sd_v1')['tempC'] == 't'
+
+
+def test_register_checked_first(monkeypatch):
+    monkeypatch.setattr(weather_schema, 'SCHEMAS', dict(weather_schema.SCHEMAS))
+    weather_schema.register('garden', ('tempC', 'soil'), {'tempC': 't', 'soil': 'm'})
+    assert list(weather_schema.SCHEMAS)[0] == 'garden'
+    assert weather_schema.detect(['ts', 'tempC', 'tempF', 'soil']) == 'garden'
+    assert weather_schema.detect(RECORDS['sd_v1']) == 'sd_v1'
+    ### re-registering replaces & moves to the front
+    weather_schema.register('sd_v1', ('tempC', 'tempF'), {'tempC': 't'})
+    assert list(weather_schema.SCHEMAS)[:2] == ['sd_v1', 'garden']
+    assert weather_schema.rename_map('sd_v1') == {'tempC': 't'}
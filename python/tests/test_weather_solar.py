@@ -0,0 +1,83 @@
+#
+# weather_solar.py: a table extended before & after the days it covers equals one computed over the whole
+# range, interpolated positions against the exact equations, sunrise / sunset for the station, cache reload
+#
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_solar
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+### Bournemouth
+LAT, LON = 50.7192, -1.8808
+
+ARRAYS = ('el', 'az_sin', 'az_cos', 'sr', 'ss')
+
+
+def test_extension_matches_full():
+    t = weather_solar.SolarTable(LAT, LON)
+    t.position([START + 10 * 86400 + 3600])
+    assert (t.first_day, t.ndays) == (START // 86400 + 10, 1)
+    ### after, before, then both sides with a gap
+    t.position([START + 12 * 86400])
+    t.sun_times([START + 7 * 86400 + 5])
+    t.position([START, START + 20 * 86400 - 1])
+    t.position(START + np.arange(0, 20 * 86400, 977))
+
+    full = weather_solar.SolarTable(LAT, LON)
+    full.cover([START, START + 20 * 86400 - 1])
+    assert (t.first_day, t.ndays) == (full.first_day, full.ndays) == (START // 86400, 20)
+    assert len(t.el) == 20 * 86400 // t.step + 1
+    for name in ARRAYS:
+        np.testing.assert_array_equal(getattr(t, name), getattr(full, name), err_msg=name)
+
+
+def test_position_interpolated():
+    t = weather_solar.SolarTable(LAT, LON)
+    ts = START + np.arange(0, 3 * 86400, 37)
+    el, az = t.position(ts)
+    el0, az0 = weather_solar.position(ts, LAT, LON)
+    np.testing.assert_allclose(el, el0, atol=0.02)
+    ### azimuth compared as an angle, no jump at north
+    assert np.abs((az - az0 + 180) % 360 - 180).max() < 0.1
+    assert el.max() == pytest.approx(90 - LAT + 8.3, abs=0.5)
+
+
+def test_sun_times():
+    t = weather_solar.table(LAT, LON)
+    days = t.sun_times([START + 3600, START + 7200, START + 86400])
+    assert list(days.index) == [pd.Timestamp('2020-09-01'), pd.Timestamp('2020-09-02')]
+    ### 06:22 & 19:52 BST
+    assert abs(days['sr'].iloc[0] - pd.Timestamp('2020-09-01 05:22')) < pd.Timedelta(minutes=1)
+    assert abs(days['ss'].iloc[0] - pd.Timestamp('2020-09-01 18:52')) < pd.Timedelta(minutes=1)
+    ### elevation at sunrise: the upper limb on the horizon (declination taken at solar noon, ~0.1 deg)
+    sr = days['sr'].iloc[0].value // 10 ** 9
+    assert weather_solar.position([sr], LAT, LON)[0][0] == pytest.approx(90 - weather_solar.SUNRISE_ZENITH, abs=0.1)
+    ### polar night
+    sr, ss = weather_solar.sun_times([START // 86400 + 110], 80.0, 15.0)
+    assert np.isnan(sr).all() and np.isnan(ss).all()
+
+
+def test_cache_reload(tmp_path):
+    t = weather_solar.SolarTable(LAT, LON, cache_dir=str(tmp_path))
+    t.position([START, START + 3 * 86400])
+    assert os.path.isfile(t.filename())
+    again = weather_solar.SolarTable(LAT, LON, cache_dir=str(tmp_path))
+    assert (again.first_day, again.ndays) == (t.first_day, t.ndays)
+    for name in ARRAYS:
+        np.testing.assert_array_equal(getattr(again, name), getattr(t, name), err_msg=name)
+
+
+def test_normalize_light():
+    out = weather_solar.normalize_light([100, 100, 100], [30, 4.9, -10])
+    np.testing.assert_allclose(out, [200, np.nan, np.nan])
@@ -0,0 +1,67 @@
+#
+# weather_stats.py daily_stats against a per day loop (mean, std, min, max, last row's value), unsorted ts,
+# a missing last sample, labels & explicit day keys
+#
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_stats
+
+
+### 2020-09-01 00:00 UTC
+START = 1598918400
+
+
+def frame(days=3, seed=1):
+    rng = np.random.default_rng(seed)
+    ts = START + np.arange(0, days * 86400, 600)
+    df = pd.DataFrame({'ts': ts, 't': rng.normal(15, 5, len(ts)), 'p': rng.normal(101325, 300, len(ts))})
+    df.loc[rng.choice(len(df), 20, replace=False), 't'] = np.nan
+    return df
+
+
+def expected(df, columns, labels):
+    rows = []
+    for day, g in df.groupby(df['ts'] // 86400, sort=True):
+        g = g.sort_values('ts', kind='stable')
+        date = pd.to_datetime(day * 86400, unit='s').strftime('%Y%m%d')
+        for c, label in zip(columns, labels):
+            rows.append([label, date, g[c].mean(), g[c].std(), g[c].min(), g[c].max(), g[c].iloc[-1]])
+    return pd.DataFrame(rows, columns=weather_stats.STAT_COLUMNS)
+
+
+def test_matches_per_day_loop():
+    df = frame()
+    ### day 2's last sample missing: Close is NaN, not the previous value
+    df.loc[df['ts'] == START + 2 * 86400 - 600, 't'] = np.nan
+    got = weather_stats.daily_stats(df, {'t': 'temperature', 'p': 'pressure'})
+    want = expected(df, ['t', 'p'], ['temperature', 'pressure'])
+    pd.testing.assert_frame_equal(got, want, check_dtype=False)
+    assert np.isnan(got.loc[(got['date'] == '20200902') & (got['data'] == 'temperature'), 'last']).all()
+
+
+def test_unsorted_ts():
+    df = frame()
+    shuffled = df.sample(frac=1, random_state=2).reset_index(drop=True)
+    pd.testing.assert_frame_equal(weather_stats.daily_stats(shuffled, ['t', 'p']),
+                                  weather_stats.daily_stats(df, ['t', 'p']))
+
+
+def test_day_keys():
+    df = frame(2)
+    day = np.where(df['ts'] < START + 86400, '20200901', '20200902')
+    got = weather_stats.daily_stats(df, ['p'], day=day)
+    assert list(got['date']) == ['20200901', '20200902']
+    np.testing.assert_allclose(got['last'], [df['p'].iloc[143], df['p'].iloc[-1]])
+
+
+def test_empty():
+    got = weather_stats.daily_stats(pd.DataFrame({'ts': [], 't': []}), ['t'])
+    assert list(got.columns) == weather_stats.STAT_COLUMNS
+    assert got.empty
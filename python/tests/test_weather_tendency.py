@@ -0,0 +1,85 @@
+#
+# weather_tendency.py: rise / fall runs & run sums against a loop over the series, pct & pct_2d as pandas
+# pct_change() * sign(previous), updates in several parts equal one pass (runs carried across updates)
+#
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather_tendency
+
+
+def series():
+    rng = np.random.default_rng(1)
+    x = 101325 + np.cumsum(rng.choice([-30.0, 0.0, 20.0, 40.0], 300))
+    x[[40, 41, 200]] = np.nan
+    return pd.Series(x, index=pd.date_range('2020-09-01', periods=len(x), freq='3h'))
+
+
+def runs(x):
+    rise, fall, run_sum = [], [], []
+    r = f = 0
+    total = 0.0
+    prev = np.nan
+    for v in x:
+        d = v - prev
+        if d > 0:
+            total = total + d if r else d
+            r, f = r + 1, 0
+        elif d < 0:
+            total = total + d if f else d
+            r, f = 0, f + 1
+        else:
+            r = f = 0
+            total = 0.0
+        rise.append(r)
+        fall.append(f)
+        run_sum.append(total)
+        prev = v
+    return rise, fall, run_sum
+
+
+def test_runs_match_loop():
+    s = series()
+    df = weather_tendency.tendency(s)
+    assert list(df.columns) == weather_tendency.COLUMNS
+    assert df.index.equals(s.index)
+    rise, fall, run_sum = runs(s.to_numpy())
+    np.testing.assert_array_equal(df['rise'], rise)
+    np.testing.assert_array_equal(df['fall'], fall)
+    np.testing.assert_allclose(df['run_sum'], run_sum)
+    assert max(rise) >= 3 and max(fall) >= 3
+
+
+def test_pct_matches_pandas():
+    s = series()
+    df = weather_tendency.tendency(s)
+    sign = np.sign(s.shift())
+    pct = s.pct_change(fill_method=None) * sign
+    np.testing.assert_allclose(df['diff'], s.diff(), equal_nan=True)
+    np.testing.assert_allclose(df['pct'], pct, equal_nan=True)
+    ### pct_change of a zero pct is inf, as pandas
+    np.testing.assert_allclose(df['pct_2d'], pct.pct_change(fill_method=None) * sign, equal_nan=True)
+
+
+@pytest.mark.parametrize('cuts', [[1], [7, 8, 150], list(range(1, 300, 13))])
+def test_update_in_parts(cuts):
+    s = series()
+    whole = weather_tendency.tendency(s)
+    t = weather_tendency.Tendency()
+    parts = [t.update(s.iloc[i:j]) for i, j in zip([0] + cuts, cuts + [len(s)])]
+    pd.testing.assert_frame_equal(pd.concat(parts), whole, check_dtype=False)
+    assert t.update(np.empty(0)).empty
+
+
+def test_negative_values():
+    ### pct signed by the previous value: a rise from -10 to -5 is +50%
+    df = weather_tendency.tendency(np.array([-10.0, -5.0, 5.0]))
+    np.testing.assert_allclose(df['pct'], [np.nan, 0.5, 2.0], equal_nan=True)
+    assert list(df['rise']) == [0, 1, 2]
@@ -0,0 +1,134 @@
+#
+# wsBroadcast.py Broadcaster: one frame per client kind, a congested client skipped & sent the latest state
+# once it drains, disconnected after max_dropped skipped ticks; wsClientSync.py served to a browser (JSON)
+# & an arduino client (single byte binary frame)
+#
+
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+websockets = pytest.importorskip("websockets")
+
+import wsBroadcast
+from wsBroadcast import Broadcaster
+
+
+class StubTransport:
+
+    def __init__(self):
+        self.size = 0
+
+    def get_write_buffer_size(self):
+        return self.size
+
+
+class StubSocket:
+
+    def __init__(self, name):
+        self.remote_address = name
+        self.transport = StubTransport()
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    out = []
+    monkeypatch.setattr(wsBroadcast.websockets, 'broadcast',
+                        lambda group, frame: out.extend((ws.remote_address, frame) for ws in group))
+    return out
+
+
+async def ticks(hub, n):
+    for _ in range(n):
+        await asyncio.sleep(hub.interval * 2)
+
+
+def test_frames_per_kind(sent):
+    async def run():
+        hub = Broadcaster(interval=0.001)
+        hub.add(StubSocket('b'), 'browser')
+        hub.add(StubSocket('a'), 'arduino')
+        ### several publishes in one tick: one frame, the latest state
+        for value in range(5):
+            hub.publish('state', lambda v=value: {'browser': 'json %d' % v, 'arduino': bytes([v])})
+        hub.publish('users', lambda: {'browser': 'users'})
+        await ticks(hub, 3)
+    asyncio.run(run())
+    assert sorted(sent) == [('a', b'\x04'), ('b', 'json 4'), ('b', 'users')]
+
+
+def test_congested_client_catches_up(sent):
+    async def run():
+        hub = Broadcaster(interval=0.001, max_dropped=1000)
+        slow = StubSocket('slow')
+        hub.add(StubSocket('fast'), '*')
+        hub.add(slow, '*')
+        slow.transport.size = hub.high_water + 1
+        for value in range(3):
+            hub.publish('state', lambda v=value: {'*': v})
+            await ticks(hub, 1)
+        assert sent == [('fast', 0), ('fast', 1), ('fast', 2)]
+        assert hub.lagging[slow] > 0
+        slow.transport.size = 0
+        await ticks(hub, 3)
+        assert not hub.lagging
+        return slow
+    slow = asyncio.run(run())
+    assert sent[3:] == [('slow', 2)]
+    assert not slow.closed
+
+
+def test_congested_client_evicted(sent):
+    async def run():
+        hub = Broadcaster(interval=0.001, max_dropped=5)
+        slow = StubSocket('slow')
+        hub.add(slow, '*')
+        slow.transport.size = hub.high_water + 1
+        hub.publish('state', lambda: {'*': 1})
+        await ticks(hub, 20)
+        return hub, slow
+    hub, slow = asyncio.run(run())
+    assert slow.closed
+    assert len(hub) == 0
+    assert not hub.pending and not hub.lagging
+    assert sent == []
+
+
+def test_client_sync_json_and_byte():
+    import wsClientSync
+
+    async def recv_until(ws, match):
+        got = []
+        while True:
+            message = await asyncio.wait_for(ws.recv(), 5)
+            got.append(message)
+            if match(message):
+                return got
+
+    async def run():
+        async with websockets.serve(wsClientSync.counter, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            url = "ws://127.0.0.1:%d" % port
+            async with websockets.connect(url) as browser, \
+                    websockets.connect(url, user_agent_header='arduino-WebSocket-Client') as arduino:
+                while len(wsClientSync.USERS) < 2:
+                    await asyncio.sleep(0.01)
+                await browser.send(json.dumps({'action': 'set', 'value': 7}))
+                b = await recv_until(browser, lambda m: json.loads(m) == {'type': 'state', 'value': 7})
+                a = await recv_until(arduino, lambda m: isinstance(m, bytes))
+                return b, a
+
+    b, a = asyncio.run(run())
+    assert all(isinstance(m, str) for m in b)
+    ### arduino: the JSON state sent on connect, then the value as one byte, no users events
+    assert a[-1] == bytes([7])
+    assert [json.loads(m)['type'] for m in a[:-1]] == ['state']
@@ -11,14 +11,27 @@
 
 
 import os
-import json
+import sys
+
+### headless: WEATHER_RENDER=<dir> writes charts to files (weather_render.py) instead of plt.show() windows
+import weather_render
+weather_render.setup()
+### long series are decimated to the axes width before plotting (weather_decimate.py)
+import weather_decimate
+weather_decimate.install()
+
+import weather_index
+import weather_incremental
+import weather_outliers
+import weather_tendency
+import weather_solar
 
 import matplotlib as mpl
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from datetime import datetime as dt
 import numpy as np
 
@@ -30,69 +43,19 @@ sns.set(rc={'figure.figsize':(11, 4)})
 ndays = 180
 days_to_extract = ndays
 path = "../data/weather/"
-files = []
-
-### Data file path and file format ../data/weather/20200823.json
-for (path, dirs, f) in os.walk(path):
-    files = [ fi for fi in f if fi.endswith(".json") ]
-
-
-### DataFrame to store Daily Metrics - Average, Mix, Max, STD Deviation, Close
-df_stat = pd.DataFrame(columns = ['data', 'date', 'mean' , 'std', 'min' , 'max', 'last'])
-frames = []
-stats = []
-
-### Load JSON data, compute statistics dataframes
-def load_json_data(filepath, frames, df_stat):
-    with open(filepath) as f:
-        print f
-        d = json.load(f)
-        df = pd.DataFrame(d)
-        filename = os.path.basename(filepath)
-        a = os.path.splitext(filename)
-        date = a[0]
-        ### Compute Daily Stats - Mean, Min, Max, STD Deviation (freq: all data points)
-        ### Format {"ts":1597968061,"t":21.3,"h":87,"l":995,"p":99826,"t2":23.9,"a":-0.422764,"w":198,"el":-27.24617,"az":1.479747,"lat":50.7192,"lon":1.8808,"sr":"05:50:15","ss":"19:59:38","mn":2},
-        row1 = pd.DataFrame({'data': 'pressure','date': date,'mean': df.p.mean() ,'std': df.p.std(),'min': df.p.min(),'max': df.p.max(),'last': df.p.iloc[-1]},index=[0])
-        row2 = pd.DataFrame({'data': 't','date': date,'mean': df.t.mean() ,'std': df.t.std(),'min': df.t.min(),'max': df.t.max(),'last': df.t.iloc[-1]},index=[0])
-        row3 = pd.DataFrame({'data': 'humidity','date': date,'mean': df.h.mean() ,'std': df.h.std(),'min': df.h.min(),'max': df.h.max(),'last': df.h.iloc[-1]},index=[0])
-        row4 = pd.DataFrame({'data': 'light','date': date,'mean': df.l.mean() ,'std': df.l.std(),'min': df.l.min(),'max': df.l.max(),'last': df.l.iloc[-1]},index=[0])
-
-        df_stat = df_stat.append(row1,ignore_index=True,sort=True)
-        df_stat = df_stat.append(row2,ignore_index=True,sort=True)
-        df_stat = df_stat.append(row3,ignore_index=True,sort=True)
-        df_stat = df_stat.append(row4,ignore_index=True,sort=True)
-
-        frames.append(df)
-        return df_stat
-
-### process n days datafiles
-for f in files:
-    filename = path+f
-    bits = os.path.splitext(f)
-    datestr = bits[0]
-    dtm = datetime.strptime(datestr, '%Y%m%d')
-    if dtm >= datetime.now()-timedelta(days=days_to_extract):
-        df_stat = load_json_data(filename,frames,df_stat)
-
-
-df = pd.concat(frames)
-
-
-### convert timestamp to python datetime, index & sort
-df.sort_values(by='ts', ascending=True)
-df['datetime'] = pd.to_datetime(df['ts'],unit='s')
-df['dts'] = df['datetime'].dt.strftime('%d/%m/%Y %H:%M:%S')
-df = df.set_index('datetime')
-df.index
-
-# add temporal column indexes
-df['Year'] = df.index.year
-df['Month'] = df.index.month
-df['Day'] = df.index.day
-df['Weekday Name'] = df.index.weekday_name
-df['Hour'] = df.index.hour
 
+### Station location (WeatherStation.ino): Bournemouth 50.7192 N, 1.8808 W
+lat = 50.7192
+lon = -1.8808
+
+### Data file path and file format ../data/weather/20200823.TXT (raw SD card log), indexed by date
+index = weather_index.DayIndex(path)
+
+### render mode: charts are current if no log file changed this hour (charts cover the last ndays up to now)
+if weather_render.unchanged(index.files, [datetime.now(timezone.utc).strftime('%Y%m%d%H')]):
+    sys.exit(0)
+
+solar = weather_solar.table(lat, lon, cache_dir=os.path.join(path, ".cache"))
 
 
 ### Examples of slicing DataFrame
@@ -123,81 +86,53 @@ start_dt  = datetime.now() - timedelta(days=ndays)
 start_dt = start_dt.strftime("%Y-%m-%d %H:%M:%S")
 end_dt = end_dt.strftime("%Y-%m-%d %H:%M:%S")
 
-print df.keys();
-
-print "Min: "+str(df['t'].dropna().min());
-print "Max: "+str(df['t'].dropna().max());
-print "Std: "+str(df['t'].dropna().mean());
-
-### Max suggests erroneous sensor reading(s) cause data outliers
-### Min: 9.9
-### Max: 97435.39
-### Std: 16.817756016671893
+### Clean new samples before they are folded into the hourly / 3 hourly / daily aggregates
+def clean(df):
+    df = df.copy()
 
-## print dataframe to show outliers
-### print df['t'].nlargest(10);
+    print("Min: "+str(df['t'].dropna().min()));
+    print("Max: "+str(df['t'].dropna().max()));
+    print("Std: "+str(df['t'].dropna().mean()));
 
-### 2020-12-21 07:09:26    100377.30
-### 2020-12-03 08:40:26     99435.70
-### 2021-01-20 23:23:26     97435.39
-### 2020-11-09 23:42:59        19.10
-### 2020-11-09 23:58:59        19.10
+    ### Max suggests erroneous sensor reading(s) cause data outliers
+    ### Min: 9.9
+    ### Max: 97435.39
+    ### Std: 16.817756016671893
 
-### print using threshold
-### print df[df['t'] > 50]['t']
-### print df[df['h'] > 50]['h']
-### print df[df['p'] < 960]['t']
-### print df[df['p'] > 1090]['p']
+    ## print dataframe to show outliers
+    ### print df['t'].nlargest(10);
 
-### print df.keys();
-
-## remove outlier for defined range using threshold bounds
-df['t'] = df[df['t'] < 50]['t']
-df['h'] = df[df['h'] < 100]['h']
-df['p'] = df[df['p'] > 96000]['p']
-df['p'] = df[df['p'] < 109000]['p']
-
-print df['t'].nlargest(10);
-print df['h'].nlargest(10);
-print df['p'].nlargest(10);
-
-# adjust temp down for outdoor
-df['t'] = df['t'] - 10
-
-
-### print df['t'];
-### print "Max: "+str(df['t'].dropna().max());
+    ### 2020-12-21 07:09:26    100377.30
+    ### 2020-12-03 08:40:26     99435.70
+    ### 2021-01-20 23:23:26     97435.39
+    ### 2020-11-09 23:42:59        19.10
+    ### 2020-11-09 23:58:59        19.10
 
-## remove outliers by z score threshold
+    ### print using threshold
+    ### print df[df['t'] > 50]['t']
+    ### print df[df['h'] > 50]['h']
+    ### print df[df['p'] < 960]['t']
+    ### print df[df['p'] > 1090]['p']
 
-### from scipy import stats
+    ## remove outliers: per sensor threshold bounds & spike detector (see weather_outliers.STATION)
+    outliers = weather_outliers.OutlierFilter(**weather_outliers.STATION)
+    masks, rejected = outliers.apply({c: df[c].to_numpy() for c in ['t', 'h', 'p']})
+    for c, keep in masks.items():
+        df[c] = df[c].where(keep)
 
-### print df[(np.abs(stats.zscore(df['t'].dropna())) < 3)]
+    print(rejected);
+    print(df['t'].nlargest(10));
+    print(df['h'].nlargest(10));
+    print(df['p'].nlargest(10));
 
-### Traceback (most recent call last):
-### print df['t'].dropna().apply(lambda x: (x - x.mean()) / x.std())
-### AttributeError: 'float' object has no attribute 'mean'
+    # adjust temp down for outdoor
+    df['t'] = df['t'] - 10
 
-### print df['t'].dropna().apply(lambda x: (x - x.mean()) / x.std())
+    ### Light level normalized by solar elevation (daylight only, sun above 5 degrees)
+    if 'l' in df:
+        df['l_el'] = weather_solar.normalize_light(df['l'], solar.elevation(df['ts'].to_numpy()))
+    return df
 
-### Traceback (most recent call last):
-### print df['t'].dropna().apply(lambda x: (x - x.mean()) / x.std())
-### AttributeError: 'float' object has no attribute 'mean'
-
-### as function
-### def zsc(x):
-###    print x
-###    return (x - x.mean()) / x.std();
-### s = zsc(df['t']);
-### print(df[s < 3]);
-
-### Works ok
-### 2021-01-20 23:23:26    149.368557
-### 2021-01-20 23:23:59     -0.005854
-
-### print df[(np.abs(stats.zscore(df[0])) < 3)]
-
-### print df[(stats.zscore(df['t'].dropna()))]
 
 ### plot histogram showing distrubution of values
 
@@ -235,9 +170,26 @@ df['t'] = df['t'] - 10
 
 
 
-df_t = df.loc[start_dt:end_dt]['t'].resample('1D').mean().dropna()
-df_h = df.loc[start_dt:end_dt]['h'].resample('1D').mean().dropna()
-df_p = df.loc[start_dt:end_dt]['p'].resample('1D').mean().dropna()
+### Hourly / 3 hourly / daily mean, max, min from aggregates kept across runs (weather_incremental.py):
+### each run reads only log rows newer than the saved last ts, cleans & folds them into the open buckets
+### the first run (or a deleted state file) loads the last ndays of logs (columnar cache, process pool)
+### Format {"ts":1597968061,"t":21.3,"h":87,"l":995,"p":99826,"t2":23.9,"a":-0.422764,"w":198,"el":-27.24617,"az":1.479747,"lat":50.7192,"lon":1.8808,"sr":"05:50:15","ss":"19:59:38","mn":2},
+
+data_columns = ['p', 't', 'h', 'l', 'l_el']
+
+state = weather_incremental.IncrementalState(os.path.join(path, ".cache", "weather_py_state.npz"), data_columns, prepare=clean)
+new_samples = state.update_from_index(index, start=datetime.now(timezone.utc)-timedelta(days=days_to_extract))
+state.save()
+print("New samples: "+str(new_samples)+", late samples: "+str(state.late));
+
+### last ndays of buckets
+first_dt = (datetime.now(timezone.utc)-timedelta(days=days_to_extract)).strftime("%Y-%m-%d %H:%M:%S")
+resampled = {(w, stat): state.frame(w, stat).loc[first_dt:] for w in ['1H', '3H', '1D'] for stat in ['mean', 'max', 'min']}
+
+
+df_t = resampled['1D', 'mean'].loc[start_dt:end_dt]['t'].dropna()
+df_h = resampled['1D', 'mean'].loc[start_dt:end_dt]['h'].dropna()
+df_p = resampled['1D', 'mean'].loc[start_dt:end_dt]['p'].dropna()
 
 # Create 3 charts
 fig, ax = plt.subplots(3)
@@ -285,18 +237,14 @@ plt.show()
 
 ### Chart Hourly / Daily mean (average), min & max
 
-# Resample to hourly / daily frequency, aggregating with mean, max, min
+df_hourly_mean = resampled['1H', 'mean']
+df_daily_mean = resampled['1D', 'mean']
 
-data_columns = ['p', 't', 'h', 'l']
+df_hourly_max = resampled['1H', 'max']
+df_daily_max = resampled['1D', 'max']
 
-df_hourly_mean = df[data_columns].resample('H').mean()
-df_daily_mean = df[data_columns].resample('D').mean()
-
-df_hourly_max = df[data_columns].resample('H').max()
-df_daily_max = df[data_columns].resample('D').max()
-
-df_hourly_min = df[data_columns].resample('H').min()
-df_daily_min = df[data_columns].resample('D').min()
+df_hourly_min = resampled['1H', 'min']
+df_daily_min = resampled['1D', 'min']
 
 # compare rowcounts between base & resampled data frame to see difference in data point counts
 #print((df.shape[0]))
@@ -365,90 +313,36 @@ start_dt  = datetime.now() - timedelta(hours=20000)
 start_dt = start_dt.strftime("%Y-%m-%d %H:%M:%S")
 end_dt = end_dt.strftime("%Y-%m-%d %H:%M:%S")
 
-df_temp_3h_mean = df.loc[start_dt:end_dt]['t'].resample('3H').mean()
-df_h_3h_mean = df.loc[start_dt:end_dt]['h'].resample('3H').mean()
+df_temp_3h_mean = resampled['3H', 'mean'].loc[start_dt:end_dt]['t']
+df_h_3h_mean = resampled['3H', 'mean'].loc[start_dt:end_dt]['h']
 
 # Air Pressure - Magnitude & Rate of change
 
-df_p_3h_mean = df.loc[start_dt:end_dt]['p'].resample('3H').mean()
+df_p_3h_mean = resampled['3H', 'mean'].loc[start_dt:end_dt]['p']
 
-# 1st derivative, magnitude (quantity) of change
-df_p_3h_mean_pct = df_p_3h_mean.pct_change()*np.sign(df_p_3h_mean.shift(periods=1))
-# 2nd derivative, rate of change
-df_p_3h_mean_pct_2d = df_p_3h_mean_pct.pct_change()*np.sign(df_p_3h_mean.shift(periods=1))
-
-### Compute sequences of consequetive increase (rising) or decrease (falling) air pressure
-
-df_p_3h_mean_pct_f = df_p_3h_mean_pct.to_frame()
-
-## 3h mean with diff()
-
-df_p_3h_mean_f = df_p_3h_mean.to_frame()
-
-df_p_3h_mean_f['diff'] = df_p_3h_mean_f.diff(axis = 0, periods = 1)
-df_p_3h_mean_f['gt0'] = df_p_3h_mean_f['diff'].gt(0)
-df_p_3h_mean_f['lt0'] = df_p_3h_mean_f['diff'].lt(0)
-
-df_p_3h_mean_f['monotonic_rise']=df_p_3h_mean_f['gt0'].groupby(df_p_3h_mean_f['gt0'].ne(df_p_3h_mean_f['gt0'].shift()).cumsum()).cumcount().add(1).where(df_p_3h_mean_f['gt0'],0)
-df_p_3h_mean_f['monotonic_fall']=df_p_3h_mean_f['lt0'].groupby(df_p_3h_mean_f['lt0'].ne(df_p_3h_mean_f['lt0'].shift()).cumsum()).cumcount().add(1).where(df_p_3h_mean_f['lt0'],0)
+### Tendency: 1st derivative (% change), 2nd derivative (rate of change), consecutive rise / fall run length & sum
+### single vectorized pass, see weather_tendency.py
+df_p_3h_tendency = weather_tendency.tendency(df_p_3h_mean)
 
+df_p_3h_mean_pct = df_p_3h_tendency['pct']
+df_p_3h_mean_pct_2d = df_p_3h_tendency['pct_2d']
 
 
 ### plot rise/fall sequences as bar chart
 width = 0.10
-ax[2].bar(df_p_3h_mean_pct_f.index,df_p_3h_mean_f['diff'],width,label='Diff +/- (hPa)',color=df_p_3h_mean_f['gt0'].map({True: 'steelblue', False: 'coral'}))
+ax[2].bar(df_p_3h_tendency.index,df_p_3h_tendency['diff'],width,label='Diff +/- (hPa)',color=df_p_3h_tendency['diff'].gt(0).map({True: 'steelblue', False: 'coral'}))
 ax[2].legend(loc='upper right')
 ax[2].set_ylabel('')
 ax[2].set_title('Air Pressure 3h Change')
 ax[2].xaxis.set_major_formatter(mdates.DateFormatter('%b %d %H:%M'))
 
 
+### rise / fall max indicates duration (length) of consequetive increase / decrease
+### run_sum quantifies amount of increase / decrease occuring in period
 
-### using 1st derivation % change (signed)
-
-df_p_3h_mean_pct_f = df_p_3h_mean_pct.to_frame()
-
-h = df_p_3h_mean_pct_f['p'].gt(0)
-
-### monotonic (increasing)
-##h = np.sign(df_p_3h_mean['p'])
-##print h
-
-df_p_3h_mean_pct_f['monotonic']=h.groupby(h.ne(h.shift()).cumsum()).cumcount().add(1).where(h,0)
-
-###print(df_p_3h_mean_pct_f)
-###print(df_p_3h_mean_pct_f['monotonic'].max())
-###print(df_p_3h_mean_pct_f['monotonic'].sum())
-
-
-### Monotonic (increasing / decreasing) seq count using group by / join
-
-df_p_3h_mean_pct_f = df_p_3h_mean_pct_f.join( h.groupby(h.ne(h.shift()).cumsum()).cumcount().add(1)
-               .to_frame('values')
-               .assign(monotic = np.where(h,'monotic_greater_0',
-                                          'monotic_not_greater_0'),
-                       index = lambda x: x.index)
-               .where(df_p_3h_mean_pct_f['p'].notna())
-               .pivot_table(columns = 'monotic',
-                            index = 'index',
-                            values = 'values',
-                            fill_value=0) )
-
-### sum() quantifies amount of increase / decrease occuring in period
-### max indicates duration (length) of consequetive increase / decrease
-
-###print(df_p_3h_mean_pct_f['monotic_greater_0'].max())
-###print(df_p_3h_mean_pct_f['monotic_greater_0'].sum())
-
-###print(df_p_3h_mean_pct_f['monotic_not_greater_0'].max())
-###print(df_p_3h_mean_pct_f['monotic_not_greater_0'].sum())
-
-###width = 0.15
-###ax[2].bar(df_p_3h_mean_pct_f.index,df_p_3h_mean_pct_f['monotic_greater_0'],width,label='Rising')
-###ax[2].bar(df_p_3h_mean_pct_f.index,df_p_3h_mean_pct_f['monotic_not_greater_0'],width,label='Falling')
-###ax[2].legend(loc='best')
-###ax[2].set_ylabel('')
-###ax[2].set_title('Air Pressure')
+###print(df_p_3h_tendency['rise'].max())
+###print(df_p_3h_tendency['fall'].max())
+###print(df_p_3h_tendency['run_sum'])
 
 
 fig, ax = plt.subplots(3)
@@ -512,30 +406,40 @@ plt.show()
 
 
 ### Sunrise / Sunset Time by Day
+### computed for the station location (weather_solar.py) rather than parsed from the logged "sr" / "ss" strings
 
-sr = df['sr'].resample('1D').min().dropna()
-ss = df['ss'].resample('1D').min().dropna()
+sun = solar.sun_times(df_daily_mean.index.to_numpy().astype('datetime64[s]').astype(np.int64))
 
-srt = np.array(sr.values.tolist())
-srt = mpl.dates.datestr2num(srt)
-
-sst = np.array(ss.values.tolist())
-sst = mpl.dates.datestr2num(sst)
+### time of day on a common date, for a time of day y axis
+srt = mdates.date2num(pd.Timestamp(0) + (sun['sr'] - sun['sr'].dt.normalize()))
+sst = mdates.date2num(pd.Timestamp(0) + (sun['ss'] - sun['ss'].dt.normalize()))
 
 fig = plt.figure()
 ax = fig.add_subplot(111)
-ax.set_title('Sunrise (GMT) Oct 2020-Feb 2021 for Bournemouth 50.7192 N, 1.8808 W')
-ax.plot_date(sr.index, srt, '-ok', color='red', markersize=4)
+ax.set_title('Sunrise (GMT) for Bournemouth 50.7192 N, 1.8808 W')
+ax.plot(sun.index, srt, '-o', color='red', markersize=4)
 ax.yaxis_date()
 ax.yaxis.set_major_formatter(mdates.DateFormatter('%I:%M %p'))
 fig.autofmt_xdate()
 
 fig = plt.figure()
 ax = fig.add_subplot(111)
-ax.set_title('Sunset (GMT) Oct 2020-Feb 2021 for Bournemouth 50.7192 N, 1.8808 W')
-ax.plot_date(ss.index, sst, '-ok', color='red', markersize=4)
+ax.set_title('Sunset (GMT) for Bournemouth 50.7192 N, 1.8808 W')
+ax.plot(sun.index, sst, '-o', color='red', markersize=4)
 ax.yaxis_date()
 ax.yaxis.set_major_formatter(mdates.DateFormatter('%I:%M %p'))
 fig.autofmt_xdate()
 
+
+### Light level normalized by solar elevation, hourly mean (daylight only, sun above 5 degrees, see clean())
+
+fig, ax = plt.subplots(2, 1, figsize=(11, 8), sharex=True)
+ax[0].plot(df_hourly_mean['l'], linewidth=0.5, label='Light (LDR)')
+ax[0].set_title('Light Level (hourly mean)')
+ax[0].legend();
+ax[1].plot(df_hourly_mean['l_el'], linewidth=0.5, label='Light / sin(solar elevation)')
+ax[1].set_title('Light Level normalized by Solar Elevation (hourly mean)')
+ax[1].legend();
+ax[1].xaxis.set_major_formatter(mdates.DateFormatter('%b %d'))
+
 plt.show()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+#
+# Weather Analytics Benchmark
+#
+# Generates synthetic station data in the real record formats (weather_schema.py) & times each stage
+# of the python/weather.py pipeline, results are written as JSON so runs can be compared across commits.
+#
+# Formats:
+#    sd_v1        daily SD card logs, one JSON array per line   {"ts","tempC","tempF","h","LDR","p","w"}
+#    station_v2   daily logs, newer station                     {"ts","t","h","l","p","sr","ss",...}
+#    sensor_csv   daily CSV logs                                ts,tempC,tempH,humidity,LDR
+#    mongo        sensorData documents (mongomock, or a server given by --mongo-uri)
+#
+# Stages (per station, summed): discover, parse, load_cold (cache build + daily stats + concatenation
+# across the process pool), load_warm (memory-mapped cache), daily_stats, concat, resample, outliers,
+# tendency; mongo_read & mongo_resample for the mongo format.
+#
+# Usage:
+#    python weather_bench.py --stations 2 --days 365 --interval 30 --format sd_v1 --format station_v2 --out bench.json
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import weather_cache
+import weather_index
+import weather_loader
+import weather_log
+import weather_outliers
+import weather_resample
+import weather_stats
+import weather_tendency
+
+
+FORMATS = ['sd_v1', 'station_v2', 'sensor_csv', 'mongo']
+
+STAT_COLUMNS = {'p': 'pressure', 't': 't', 'h': 'humidity', 'l': 'light'}
+DATA_COLUMNS = ['p', 't', 'h', 'l']
+
+START_TS = 1577836800  # 2020-01-01
+
+
+### Synthetic day of samples: diurnal temperature & light, random walk pressure, occasional sensor spikes
+def synth_day(rng, day_ts, interval, spikes=0.001):
+    ts = day_ts + np.arange(0, 86400, interval, dtype=np.int64)
+    ts = ts + rng.integers(0, max(interval // 4, 1), len(ts))
+    hour = (ts % 86400) / 3600.0
+    diurnal = np.sin((hour - 9) / 24.0 * 2 * np.pi)
+    t = np.round(12 + 6 * diurnal + rng.normal(0, 0.3, len(ts)), 1)
+    h = np.clip(np.round(70 - 15 * diurnal + rng.normal(0, 2, len(ts))), 0, 100)
+    l = np.clip(np.round(500 + 480 * diurnal + rng.normal(0, 10, len(ts))), 0, 1023)
+    p = np.round(101325 + np.cumsum(rng.normal(0, 3, len(ts))) + rng.normal(0, 200))
+    bad = rng.random(len(ts)) < spikes
+    t[bad] = 97435.39
+    return {'ts': ts, 't': t, 'h': h, 'l': l, 'p': p}
+
+
+def _sun(day_ts):
+    return "06:%02d:00" % (day_ts // 86400 % 60), "18:%02d:00" % (day_ts // 86400 % 60)
+
+
+def write_day(filepath, fmt, cols, day_ts):
+    n = len(cols['ts'])
+    ts, t, h, l, p = (cols[k].tolist() for k in ('ts', 't', 'h', 'l', 'p'))
+    with open(filepath, 'w') as f:
+        if fmt == 'sd_v1':
+            for i in range(n):
+                f.write('[{"ts":%d,"tempC":%.1f,"tempF":%.2f,"h":%d,"LDR":%d,"p":%d,"w":0}]\n'
+                        % (ts[i], t[i], t[i] * 1.8 + 32, h[i], l[i], p[i]))
+        elif fmt == 'station_v2':
+            sr, ss = _sun(day_ts)
+            for i in range(n):
+                f.write('{"ts":%d,"t":%.1f,"h":%d,"l":%d,"p":%d,"t2":%.1f,"w":0,"sr":"%s","ss":"%s","mn":2},\n'
+                        % (ts[i], t[i], h[i], l[i], p[i], t[i] + 1.5, sr, ss))
+        elif fmt == 'sensor_csv':
+            f.write("ts,tempC,tempH,humidity,LDR\n")
+            for i in range(n):
+                f.write("%d,%.2f,%.2f,%.2f,%d\n" % (ts[i], t[i], t[i] * 1.8 + 32, h[i], l[i]))
+        else:
+            raise ValueError("unknown format: " + fmt)
+
+
+### Write daily log files for each station, returns [station dir]
+def generate_files(root, fmt, stations, days, interval, seed=0):
+    rng = np.random.default_rng(seed)
+    dirs = []
+    for s in range(stations):
+        dirpath = os.path.join(root, fmt, "station%d" % s)
+        os.makedirs(dirpath, exist_ok=True)
+        for d in range(days):
+            day_ts = START_TS + d * 86400
+            name = datetime.fromtimestamp(day_ts, timezone.utc).strftime('%Y%m%d') + ".TXT"
+            write_day(os.path.join(dirpath, name), fmt, synth_day(rng, day_ts, interval), day_ts)
+        dirs.append(dirpath)
+    return dirs
+
+
+### Insert sensorData documents (MQTT format) for each station
+def generate_mongo(collection, stations, days, interval, seed=0):
+    rng = np.random.default_rng(seed)
+    for s in range(stations):
+        for d in range(days):
+            cols = synth_day(rng, START_TS + d * 86400, interval)
+            docs = [{'station': "station%d" % s, 'ts': ts, 'tempC': t, 'tempF': round(t * 1.8 + 32, 2),
+                     'h': h, 'LDR': l, 'p': p, 'w': 0}
+                    for ts, t, h, l, p in zip(*(cols[k].tolist() for k in ('ts', 't', 'h', 'l', 'p')))]
+            collection.insert_many(docs)
+
+
+class Timer:
+    """Accumulates wall clock time per stage, one sample per run."""
+
+    def __init__(self):
+        self.runs = {}
+        self.current = {}
+
+    def stage(self, name, fn, *args, **kwargs):
+        t = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.current[name] = self.current.get(name, 0.0) + time.perf_counter() - t
+        return result
+
+    def end_run(self):
+        for name, v in self.current.items():
+            self.runs.setdefault(name, []).append(v)
+        self.current = {}
+
+    def summary(self):
+        return {name: {'min': min(v), 'mean': sum(v) / len(v), 'runs': v} for name, v in self.runs.items()}
+
+
+### same configuration as weather.py
+def _outliers(df):
+    f = weather_outliers.OutlierFilter(**weather_outliers.STATION)
+    return f.apply({c: df[c].to_numpy() for c in ['t', 'h', 'p'] if c in df})
+
+
+### Time the weather.py pipeline over one station's log directory
+def bench_station(timer, path, processes):
+    index = timer.stage('discover', weather_index.DayIndex, path)
+    for f in index.files:
+        timer.stage('parse', weather_log.read_columns, f)
+
+    shutil.rmtree(os.path.join(path, weather_cache.CACHE_DIR), ignore_errors=True)
+    timer.stage('load_cold', index.load, stat_columns=STAT_COLUMNS, processes=processes)
+    df, _ = timer.stage('load_warm', index.load, processes=processes)
+
+    timer.stage('daily_stats', weather_stats.daily_stats, df, {k: v for k, v in STAT_COLUMNS.items() if k in df})
+    days = [weather_cache.read_columns(f) for f in index.files]
+    timer.stage('concat', weather_loader.combine, days)
+
+    columns = [c for c in DATA_COLUMNS if c in df]
+    resampled = timer.stage('resample', weather_resample.resample, df, columns, ['1H', '3H', '1D'], ['mean', 'max', 'min'])
+    timer.stage('outliers', _outliers, df)
+    if 'p' in df:
+        timer.stage('tendency', weather_tendency.tendency, resampled['3H', 'mean']['p'])
+    return len(df)
+
+
+def bench_mongo(timer, collection):
+    import weather_mongo_query
+    end_ts = collection.find_one(sort=[('ts', -1)])['ts']
+    columns = ['p', 'tempC', 'h', 'LDR']
+    df = timer.stage('mongo_read', weather_mongo_query.read_frame, collection, None, end_ts, columns)
+    timer.stage('mongo_resample', weather_mongo_query.resample, collection, None, end_ts, columns)
+    return len(df)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    root = args.dir or tempfile.mkdtemp(prefix="weather_bench_")
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'formats': {},
+    }
+    try:
+        for fmt in args.format:
+            timer = Timer()
+            t = time.perf_counter()
+            if fmt == 'mongo':
+                if args.mongo_uri:
+                    import pymongo
+                    collection = pymongo.MongoClient(args.mongo_uri)[args.mongo_db]["bench_sensorData"]
+                else:
+                    import mongomock
+                    collection = mongomock.MongoClient().weather.bench_sensorData
+                collection.drop()
+                generate_mongo(collection, args.stations, args.days, args.interval, args.seed)
+                size = collection.count_documents({})
+            else:
+                dirs = generate_files(root, fmt, args.stations, args.days, args.interval, args.seed)
+                size = sum(os.path.getsize(os.path.join(d, f)) for d in dirs for f in os.listdir(d) if f.endswith(".TXT"))
+            generate = time.perf_counter() - t
+
+            rows = 0
+            for _ in range(args.repeat):
+                if fmt == 'mongo':
+                    rows = bench_mongo(timer, collection)
+                else:
+                    rows = sum(bench_station(timer, d, args.processes) for d in dirs)
+                timer.end_run()
+            if fmt == 'mongo':
+                collection.drop()
+
+            results['formats'][fmt] = {'rows': rows, 'size': size, 'generate': generate, 'stages': timer.summary()}
+            print(fmt + ": " + str(rows) + " rows", file=sys.stderr)
+            for name, s in results['formats'][fmt]['stages'].items():
+                print("  %-14s %8.3fs" % (name, s['min']), file=sys.stderr)
+    finally:
+        if not args.dir and not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Weather analytics pipeline benchmark")
+    parser.add_argument('--stations', type=int, default=1)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval', type=int, default=30, help="seconds between samples")
+    parser.add_argument('--format', action='append', choices=FORMATS, help="record format, repeatable (default sd_v1)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--processes', type=int, default=None, help="loader process pool size (default cpu count)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', help="generate data here (kept), default a temporary directory")
+    parser.add_argument('--keep', action='store_true', help="keep the temporary data directory")
+    parser.add_argument('--mongo-uri', help="mongo server for the mongo format, default mongomock")
+    parser.add_argument('--mongo-db', default="weather_bench")
+    parser.add_argument('--out', help="write results JSON here (default stdout)")
+    args = parser.parse_args()
+    if not args.format:
+        args.format = ['sd_v1']
+
+    results = run(args)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,104 @@
+#
+# Weather Data Columnar Cache
+#
+# Daily log files are parsed once (weather_log.py, canonical column names) and stored as typed numpy columns,
+# subsequent loads are memory-mapped reads rather than JSON decodes.
+#
+# Cache layout (default: <log dir>/.cache/):
+#    .cache/20200823/meta.json   source file mtime & size, column list
+#    .cache/20200823/ts.npy      int64 unix timestamp
+#    .cache/20200823/t.npy       float32 metric (one file per column)
+#
+# A day is rebuilt only when the source file mtime or size changes.
+#
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+import weather_log
+
+
+CACHE_DIR = ".cache"
+CACHE_VERSION = 2
+
+### column types as stored in cache
+TS_DTYPE = np.int64
+METRIC_DTYPE = np.float32
+
+
+### .cache/<day>, other than .TXT logs .cache/<day>.<ext> (ie 20200823.BIN beside 20200823.TXT)
+def cache_path(filepath, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(filepath), CACHE_DIR)
+    day, ext = os.path.splitext(os.path.basename(filepath))
+    return os.path.join(cache_dir, day if ext.upper() == '.TXT' else day + ext)
+
+
+def _source_stat(filepath):
+    st = os.stat(filepath)
+    return {'mtime': st.st_mtime_ns, 'size': st.st_size, 'version': CACHE_VERSION}
+
+
+def _read_meta(dirpath):
+    try:
+        with open(os.path.join(dirpath, "meta.json")) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _meta_matches(meta, filepath):
+    if meta is None:
+        return False
+    src = _source_stat(filepath)
+    return all(meta.get(k) == v for k, v in src.items())
+
+
+### True if cached copy of filepath exists & source is unchanged
+def is_fresh(filepath, cache_dir=None):
+    return _meta_matches(_read_meta(cache_path(filepath, cache_dir)), filepath)
+
+
+### Parse source log file & write typed column files
+def build(filepath, cache_dir=None):
+    dirpath = cache_path(filepath, cache_dir)
+    os.makedirs(dirpath, exist_ok=True)
+    metafile = os.path.join(dirpath, "meta.json")
+    ### invalidate first, so an interrupted rebuild is never read as fresh
+    if os.path.exists(metafile):
+        os.remove(metafile)
+
+    src = _source_stat(filepath)
+    cols = weather_log.read_columns(filepath)
+    for name, col in cols.items():
+        if name == 'ts':
+            col = col.astype(TS_DTYPE, copy=False)
+        elif col.dtype == object:
+            col = np.array(['' if v is None else v for v in col], dtype=str)
+        else:
+            col = col.astype(METRIC_DTYPE)
+        np.save(os.path.join(dirpath, name + ".npy"), col)
+
+    meta = dict(src, columns=list(cols.keys()))
+    with open(metafile + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(metafile + ".tmp", metafile)
+    return meta
+
+
+### Load a day as dict of (memory-mapped) numpy arrays, rebuilding cache if stale
+def read_columns(filepath, columns=None, cache_dir=None, mmap_mode='r'):
+    dirpath = cache_path(filepath, cache_dir)
+    meta = _read_meta(dirpath)
+    if not _meta_matches(meta, filepath):
+        meta = build(filepath, cache_dir)
+    names = meta['columns'] if columns is None else [c for c in columns if c in meta['columns']]
+    return {name: np.load(os.path.join(dirpath, name + ".npy"), mmap_mode=mmap_mode) for name in names}
+
+
+### Load a day as a DataFrame
+def read_frame(filepath, columns=None, cache_dir=None):
+    return pd.DataFrame(read_columns(filepath, columns, cache_dir))
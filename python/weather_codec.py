@@ -0,0 +1,202 @@
+#
+# Weather Station Binary Record Codec
+#
+# Fixed layout, little endian, versioned binary format for station samples (~80 bytes as JSON text,
+# 16 bytes packed, 12 bytes delta encoded). Encodes / decodes whole column arrays at a time with
+# numpy structured dtypes (tobytes / frombuffer), no per record struct calls.
+#
+# A stream (MQTT payload, .BIN log file) is a sequence of blocks, each a header followed by count records:
+#
+#    header (14 bytes)
+#      magic    2s   b'WX'
+#      version  u8   1
+#      flags    u8   bit 0: delta encoded records
+#      count    u16  number of records in block
+#      base_ts  u32  delta: reference ts, record ts = base_ts + running sum of dts, else 0
+#      base_p   i32  delta: reference p, record p = base_p + running sum of dp, else 0
+#
+#    record (flags 0, 16 bytes)                 record (flags 1, delta, 12 bytes)
+#      ts  u32  unix timestamp                    dts  u16  seconds since previous record
+#      t   i16  temperature, 0.01 C               t    i16  temperature, 0.01 C
+#      h   u16  humidity, 0.01 %                  h    u16  humidity, 0.01 %
+#      l   u16  light level (LDR)                 l    u16  light level (LDR)
+#      p   u32  pressure, pascals                 dp   i16  pressure change, pascals
+#      w   u16                                    w    u16
+#
+# Missing values are sent as the field's sentinel (i16 -32768, u16 65535, u32 0xFFFFFFFF), decoded to NaN.
+# A missing pressure in a delta block carries the previous value forward as its base.
+# encode() falls back to absolute records when a step does not fit the delta fields
+# (ts going backwards, ts gap > 65535 s, pressure step > 32766 Pa).
+#
+# Equivalent C structs for the sketches (little endian on AVR / ESP), packed so the compiler adds no padding
+# (ESP aligns uint32_t to 4 bytes, unpacked wx_record would be 20 bytes):
+#
+#    struct __attribute__((packed)) wx_header { char magic[2]; uint8_t version; uint8_t flags; uint16_t count; uint32_t base_ts; int32_t base_p; };
+#    struct __attribute__((packed)) wx_record { uint32_t ts; int16_t t; uint16_t h; uint16_t l; uint32_t p; uint16_t w; };
+#    struct __attribute__((packed)) wx_delta_record { uint16_t dts; int16_t t; uint16_t h; uint16_t l; int16_t dp; uint16_t w; };
+#
+# Usage:
+#    payload = weather_codec.encode({'ts': ts, 't': t, 'h': h, 'l': l, 'p': p}, delta=True)
+#    cols = weather_codec.decode(payload)     # {'ts': int64 array, 't': float64 array, ...}
+#
+
+import numpy as np
+
+
+MAGIC = b'WX'
+### daily log file extension (YYYYMMDD.BIN)
+EXT = '.BIN'
+VERSION = 1
+FLAG_DELTA = 0x01
+
+HEADER = np.dtype([('magic', 'S2'), ('version', 'u1'), ('flags', 'u1'), ('count', '<u2'),
+                   ('base_ts', '<u4'), ('base_p', '<i4')])
+
+RECORD = np.dtype([('ts', '<u4'), ('t', '<i2'), ('h', '<u2'), ('l', '<u2'), ('p', '<u4'), ('w', '<u2')])
+DELTA_RECORD = np.dtype([('dts', '<u2'), ('t', '<i2'), ('h', '<u2'), ('l', '<u2'), ('dp', '<i2'), ('w', '<u2')])
+
+### metric column: scale (stored = round(value * scale))
+SCALE = {'t': 100, 'h': 100, 'l': 1, 'p': 1, 'w': 1}
+COLUMNS = ['ts', 't', 'h', 'l', 'p', 'w']
+
+MAX_BLOCK = 0xFFFF
+
+
+def _sentinel(dtype):
+    return np.iinfo(dtype).min if np.issubdtype(dtype, np.signedinteger) else np.iinfo(dtype).max
+
+
+### Scale float values to a fixed point integer field, NaN / out of range -> sentinel
+def _pack(values, scale, dtype):
+    dtype = np.dtype(dtype)
+    info = np.iinfo(dtype)
+    sentinel = _sentinel(dtype)
+    with np.errstate(invalid='ignore'):
+        x = np.round(np.asarray(values, dtype=np.float64) * scale)
+        ok = np.isfinite(x) & (x >= info.min) & (x <= info.max) & (x != sentinel)
+    return np.where(ok, x, sentinel).astype(dtype)
+
+
+def _unpack(field, scale):
+    out = field.astype(np.float64)
+    out[field == _sentinel(field.dtype)] = np.nan
+    if scale != 1:
+        out /= scale
+    return out
+
+
+def _header(flags, count, base_ts=0, base_p=0):
+    h = np.zeros(1, dtype=HEADER)
+    h['magic'] = MAGIC
+    h['version'] = VERSION
+    h['flags'] = flags
+    h['count'] = count
+    h['base_ts'] = base_ts
+    h['base_p'] = base_p
+    return h.tobytes()
+
+
+def _encode_absolute(cols, n):
+    rec = np.zeros(n, dtype=RECORD)
+    rec['ts'] = np.asarray(cols['ts'], dtype=np.int64)
+    for name in COLUMNS[1:]:
+        values = cols.get(name)
+        rec[name] = _sentinel(RECORD[name]) if values is None else _pack(values, SCALE[name], RECORD[name])
+    return _header(0, n) + rec.tobytes()
+
+
+### Delta block, or None if a step does not fit
+def _encode_delta(cols, n):
+    ts = np.asarray(cols['ts'], dtype=np.int64)
+    dts = np.diff(ts, prepend=ts[0])
+    if (dts < 0).any() or (dts > 0xFFFF).any():
+        return None
+
+    p = cols.get('p')
+    p = np.full(n, np.nan) if p is None else np.round(np.asarray(p, dtype=np.float64))
+    ### carry last valid pressure forward so a gap does not break the chain
+    valid = np.isfinite(p)
+    idx = np.where(valid, np.arange(n), -1)
+    np.maximum.accumulate(idx, out=idx)
+    carried = np.where(idx >= 0, p[np.maximum(idx, 0)], np.nan)
+    first = carried[valid][0] if valid.any() else 0.0
+    prev = np.r_[first, np.nan_to_num(carried[:-1], nan=first)]
+    dp = np.where(valid, p - prev, np.nan)
+    if (np.abs(dp[valid]) >= 0x7FFF).any():
+        return None
+
+    rec = np.zeros(n, dtype=DELTA_RECORD)
+    rec['dts'] = dts
+    rec['dp'] = _pack(dp, 1, DELTA_RECORD['dp'])
+    for name in ('t', 'h', 'l', 'w'):
+        values = cols.get(name)
+        rec[name] = _sentinel(DELTA_RECORD[name]) if values is None else _pack(values, SCALE[name], DELTA_RECORD[name])
+    return _header(FLAG_DELTA, n, int(ts[0]), int(first)) + rec.tobytes()
+
+
+### Encode {column: array} (canonical names, weather_schema.py) to bytes, split in blocks of up to 65535 records
+def encode(cols, delta=True):
+    n = len(cols['ts'])
+    out = []
+    for s in range(0, n, MAX_BLOCK):
+        block = {k: np.asarray(v)[s:s + MAX_BLOCK] for k, v in cols.items() if v is not None}
+        m = len(block['ts'])
+        data = _encode_delta(block, m) if delta else None
+        out.append(data if data is not None else _encode_absolute(block, m))
+    return b''.join(out)
+
+
+### Iterate (header, records structured array) over the blocks of a buffer
+def iter_blocks(buf):
+    buf = memoryview(buf)
+    offset = 0
+    while offset + HEADER.itemsize <= len(buf):
+        h = np.frombuffer(buf, dtype=HEADER, count=1, offset=offset)[0]
+        if h['magic'] != MAGIC or h['version'] != VERSION:
+            raise ValueError("weather_codec: bad block header at offset %d" % offset)
+        dtype = DELTA_RECORD if h['flags'] & FLAG_DELTA else RECORD
+        offset += HEADER.itemsize
+        count = int(h['count'])
+        if offset + count * dtype.itemsize > len(buf):
+            ### truncated block, ie power loss during SD card write
+            count = (len(buf) - offset) // dtype.itemsize
+        yield h, np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+        offset += count * dtype.itemsize
+
+
+def _decode_block(h, rec):
+    out = {}
+    if h['flags'] & FLAG_DELTA:
+        out['ts'] = int(h['base_ts']) + np.cumsum(rec['dts'], dtype=np.int64)
+        dp = _unpack(rec['dp'], 1)
+        ### missing pressure: carry base forward, report NaN
+        out['p'] = int(h['base_p']) + np.cumsum(np.nan_to_num(dp))
+        out['p'][np.isnan(dp)] = np.nan
+    else:
+        out['ts'] = rec['ts'].astype(np.int64)
+        out['p'] = _unpack(rec['p'], 1)
+    for name in ('t', 'h', 'l', 'w'):
+        out[name] = _unpack(rec[name], SCALE[name])
+    return out
+
+
+### Decode a buffer (one or more blocks) to {column: array}, ts int64, metrics float64
+def decode(buf):
+    blocks = [_decode_block(h, rec) for h, rec in iter_blocks(buf)]
+    if not blocks:
+        out = {'ts': np.empty(0, dtype=np.int64)}
+        out.update({name: np.empty(0) for name in COLUMNS[1:]})
+        return out
+    if len(blocks) == 1:
+        return {name: blocks[0][name] for name in COLUMNS}
+    return {name: np.concatenate([b[name] for b in blocks]) for name in COLUMNS}
+
+
+def is_encoded(buf):
+    return bytes(buf[:2]) == MAGIC
+
+
+### Read a binary log file
+def read_columns(filepath):
+    with open(filepath, 'rb') as f:
+        return decode(f.read())
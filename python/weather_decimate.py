@@ -0,0 +1,188 @@
+#
+# Level of Detail Downsampling for Charts
+#
+# A chart a few thousand pixels wide cannot show more than a few points per pixel column, long raw
+# series (180 days at 30s ~ 500k samples) are decimated before they reach matplotlib:
+#
+#    minmax   per pixel column envelope: first, last, min & max sample (& first gap) of each column,
+#             every spike stays visible (default)
+#    lttb     Largest-Triangle-Three-Buckets, n points preserving the visual shape of smooth series
+#
+# Both select indices of the original samples, so pandas Series keep their (datetime) index.
+#
+# install() wraps Axes.plot so series longer than 4 points per pixel column of the axes are decimated
+# automatically (minmax: one bin per pixel column, lttb: factor points per pixel column),
+# pass decimate=False (or 'lttb') to a plot() call to override:
+#
+#    weather_decimate.install()
+#    ax[0].plot(df['t'], linewidth=0.5)      # ~4 points per pixel column instead of every sample
+#    ax[0].set_xlim(start, end)              # re-decimated over start .. end, zoom shows the detail
+#
+# The line keeps the full samples & is re-decimated to the visible x range whenever the x limits
+# change (set_xlim, interactive zoom / pan). The pixel width is taken at plot / limit change time,
+# a window resized afterwards keeps the earlier level of detail until the next zoom or pan.
+#
+
+import numpy as np
+import pandas as pd
+
+
+### x as float64 for binning (datetime -> ns), None if not numeric / monotonic
+def _numeric_x(x):
+    if isinstance(x, (pd.Index, pd.Series)):
+        x = x.to_numpy()
+    x = np.asarray(x)
+    if x.dtype.kind == 'M':
+        x = x.astype('datetime64[ns]').view(np.int64)
+    if x.dtype.kind not in 'iuf':
+        return None
+    x = x.astype(np.float64)
+    if len(x) > 1 and not np.all(x[1:] >= x[:-1]):
+        return None
+    return x
+
+
+### Indices of the per bin envelope: first, last, min, max & first NaN (line break) of each of n bins
+def minmax_indices(x, y, n):
+    y = np.asarray(y, dtype=np.float64)
+    m = len(y)
+    if m <= 4 * n:
+        return np.arange(m)
+    x = np.arange(m, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    span = x[-1] - x[0]
+    if not span > 0:
+        return np.arange(m)
+    b = np.minimum(((x - x[0]) / span * n).astype(np.int64), n - 1)
+    starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    ends = np.r_[starts[1:], m] - 1
+    seg = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, m]))
+
+    nan = np.isnan(y)
+    lo = np.where(nan, np.inf, y)
+    hi = np.where(nan, -np.inf, y)
+    seg_min = np.minimum.reduceat(lo, starts)
+    seg_max = np.maximum.reduceat(hi, starts)
+
+    def first(mask):
+        idx = np.flatnonzero(mask)
+        _, pos = np.unique(seg[idx], return_index=True)
+        return idx[pos]
+
+    keep = [starts, ends,
+            first((lo == seg_min[seg]) & ~nan),
+            first((hi == seg_max[seg]) & ~nan),
+            first(nan)]
+    return np.unique(np.concatenate(keep))
+
+
+### Largest-Triangle-Three-Buckets, indices of n samples (NaN samples are skipped)
+def lttb_indices(x, y, n):
+    y = np.asarray(y, dtype=np.float64)
+    m = len(y)
+    x = np.arange(m, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= n or n < 3:
+        return valid
+    xv, yv = x[valid], y[valid]
+    m = len(valid)
+
+    ### bucket edges over the points between first & last
+    edges = np.linspace(1, m - 1, n - 1).astype(np.int64)
+    out = np.empty(n, dtype=np.int64)
+    out[0] = 0
+    out[-1] = m - 1
+    a = 0
+    for i in range(n - 2):
+        s, e = edges[i], edges[i + 1]
+        ### average of the next bucket (last point for the final bucket)
+        ns, ne = e, edges[i + 2] if i + 2 < len(edges) else m
+        cx = xv[ns:ne].mean() if ne > ns else xv[-1]
+        cy = yv[ns:ne].mean() if ne > ns else yv[-1]
+        ax_, ay = xv[a], yv[a]
+        area = np.abs((ax_ - cx) * (yv[s:e] - ay) - (ax_ - xv[s:e]) * (cy - ay))
+        a = s + int(np.argmax(area))
+        out[i + 1] = a
+    return valid[out]
+
+
+### Decimate (x, y) to about n pixel columns, returns indices into the samples
+def decimate_indices(x, y, n, method='minmax'):
+    if method == 'lttb':
+        return lttb_indices(x, y, n)
+    return minmax_indices(x, y, n)
+
+
+### Decimate a Series (index as x), returns a Series
+def decimate_series(series, n, method='minmax'):
+    idx = decimate_indices(_numeric_x(series.index), series.to_numpy(dtype=np.float64), n, method)
+    return series.iloc[idx]
+
+
+def axes_pixel_width(ax):
+    fig = ax.figure
+    return max(int(ax.get_position().width * fig.get_figwidth() * fig.dpi), 1)
+
+
+class DecimatedLine:
+    """Full samples of a plotted line, the line shows the visible x range decimated to the axes width.
+
+    Re-decimated on every xlim change (set_xlim, zoom, pan), so zooming in shows the raw samples again.
+    """
+
+    def __init__(self, line, method='minmax', factor=2):
+        self.line = line
+        self.method = method
+        self.factor = factor
+        ### samples as plotted: x converted by the axis units (ie dates -> float days)
+        xy = line.get_xydata()
+        self.x = xy[:, 0].copy()
+        self.y = xy[:, 1].copy()
+        self.update(line.axes)
+        self.cid = line.axes.callbacks.connect('xlim_changed', self.update)
+
+    def update(self, ax):
+        lo, hi = sorted(ax.get_xlim())
+        ### one sample beyond each edge so the line runs to the axes border
+        i = max(int(np.searchsorted(self.x, lo, 'left')) - 1, 0)
+        j = min(int(np.searchsorted(self.x, hi, 'right')) + 1, len(self.x))
+        x, y = self.x[i:j], self.y[i:j]
+        n = axes_pixel_width(ax)
+        if len(y) > 4 * n:
+            idx = decimate_indices(x, y, n * self.factor if self.method == 'lttb' else n, self.method)
+            x, y = x[idx], y[idx]
+        self.line.set_data(x, y)
+
+
+### Decimate the lines of a plot() call that have more than 4 samples per pixel column & monotonic x
+def decimate_lines(ax, lines, method='minmax', factor=2):
+    n = axes_pixel_width(ax)
+    for line in lines:
+        if len(line.get_ydata(orig=True)) <= 4 * n:
+            continue
+        try:
+            x = line.get_xydata()[:, 0]
+        except (TypeError, ValueError):
+            continue
+        if len(x) > 1 and not np.all(x[1:] >= x[:-1]):
+            continue
+        line._decimated = DecimatedLine(line, method, factor)
+    return lines
+
+
+### Wrap Axes.plot to decimate long series by axes width
+def install(method='minmax', factor=2):
+    from matplotlib.axes import Axes
+    if getattr(Axes.plot, '_decimate', None) is not None:
+        return
+    plot = Axes.plot
+
+    def decimated_plot(self, *args, **kwargs):
+        m = kwargs.pop('decimate', method)
+        lines = plot(self, *args, **kwargs)
+        if m:
+            decimate_lines(self, lines, m, factor)
+        return lines
+
+    decimated_plot._decimate = method
+    decimated_plot.__doc__ = plot.__doc__
+    Axes.plot = decimated_plot
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+#
+# Weather Data Feed Server
+#
+# Serves weather series to the D3 dashboards (sensor.meteo.html, sensor_meteo_csv.html) pre-bucketed,
+# rather than the browser fetching & parsing every raw 15s sample file:
+#
+#    /series/<source>?start=&end=&points=1000    one series over a range, JSON or CSV
+#    /tiles/<source>?start=&end=&points=1000     tile index for a range: bucket width & tile URLs
+#    /tile/<source>/<width>/<n>.json|csv         tile n: TILE_BUCKETS buckets of width seconds,
+#                                                covering [n * width * TILE_BUCKETS, (n + 1) * ...)
+#
+# The bucket width is picked from the requested range, the finest of WIDTHS giving at most <points>
+# buckets, so load time depends on chart width not history length. Tiles are aligned to fixed time
+# boundaries: a pan or zoom fetches only tiles the browser does not already have, closed tiles are
+# cacheable. Responses carry an ETag (If-None-Match -> 304) & are gzip encoded if accepted.
+#
+# Sources are a single log file (sensor.meteo.json, data/SENSOR.TXT) or a directory of daily logs
+# (weather_index.DayIndex, columnar cache), any format known to weather_schema.py.
+#
+# Query parameters (all endpoints):
+#    columns   canonical metrics, default all ie t,h,l,p
+#    stat      mean (default), min, max, std, count or a list (columns are then named t_mean, t_max ...)
+#    schema    output field names of a weather_schema format, ie meteo_json -> temp, humidity, LDR
+#    format    json (array of records, as sensor.meteo.json) or csv (header line, as SENSOR.TXT)
+#    start, end unix timestamp (default the source's first / last sample), clamped to the source's samples
+#
+# Usage:
+#    python weather_feed.py --source meteo=../sensor.meteo.json --source sensor=../data/SENSOR.TXT \
+#                           --source station=../data/weather/ --port 3002
+#
+#    d3.json("http://127.0.0.1:3002/series/meteo?schema=meteo_json", ...)
+#
+
+import os
+import json
+import gzip
+import asyncio
+import time
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+
+import weather_cache
+import weather_index
+import weather_log
+import weather_resample
+import weather_schema
+
+
+### bucket widths (seconds), finest first
+WIDTHS = [15, 60, 300, 900, 3600, 10800, 86400]
+
+### buckets per tile
+TILE_BUCKETS = 256
+
+DEFAULT_POINTS = 1000
+MAX_POINTS = 10000
+
+### tiles built for one /series or /tiles request (MAX_POINTS buckets span at most 41 tiles)
+MAX_REQUEST_TILES = MAX_POINTS // TILE_BUCKETS + 2
+
+STATS = ('mean', 'min', 'max', 'std', 'count')
+
+
+### Finest bucket width giving at most points buckets over [start, end)
+def pick_width(start, end, points=DEFAULT_POINTS):
+    span = max(end - start, 1)
+    for width in WIDTHS:
+        if span / width <= points:
+            return width
+    return WIDTHS[-1]
+
+
+def tile_span(width):
+    return width * TILE_BUCKETS
+
+
+### Tile numbers covering [start, end)
+def tile_range(start, end, width):
+    span = tile_span(width)
+    return range(start // span, (max(end, start + 1) - 1) // span + 1)
+
+
+class Source:
+    """A log file or directory of daily logs, read as canonical columns."""
+
+    def __init__(self, path, ext=weather_index.EXTS):
+        self.path = path
+        self.ext = ext
+        self.is_dir = os.path.isdir(path)
+        self._files = {}
+
+    ### files which may hold samples in [start, end), daily logs are named by station (local) date
+    def files(self, start=None, end=None):
+        if not self.is_dir:
+            return [self.path]
+        index = weather_index.DayIndex(self.path, self.ext)
+        first = None if start is None else start - 86400
+        last = None if end is None else end + 86400
+        return index.select(first, last)
+
+    ### identifies the content of files, changes when any is rewritten
+    def version(self, files):
+        h = hashlib.sha1()
+        for f in files:
+            st = os.stat(f)
+            h.update(("%s:%d:%d;" % (f, st.st_mtime_ns, st.st_size)).encode())
+        return h.hexdigest()
+
+    def _read_file(self, filepath):
+        if self.is_dir:
+            return weather_cache.read_columns(filepath)
+        st = os.stat(filepath)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._files.get(filepath)
+        if cached is None or cached[0] != key:
+            cached = (key, weather_log.read_columns(filepath))
+            self._files[filepath] = cached
+        return cached[1]
+
+    ### {column: array} of samples with start <= ts < end, in ts order
+    def read(self, start=None, end=None, columns=None, files=None):
+        parts = []
+        for f in (self.files(start, end) if files is None else files):
+            cols = self._read_file(f)
+            ts = np.asarray(cols['ts'])
+            keep = np.ones(len(ts), dtype=bool)
+            if start is not None:
+                keep &= ts >= start
+            if end is not None:
+                keep &= ts < end
+            names = [c for c in cols if c != 'ts'] if columns is None else columns
+            parts.append({'ts': ts[keep], **{c: (np.asarray(cols[c], dtype=np.float64)[keep] if c in cols
+                                                 else np.full(int(keep.sum()), np.nan)) for c in names}})
+        if not parts:
+            names = [] if columns is None else columns
+            return {'ts': np.empty(0, dtype=np.int64), **{c: np.empty(0) for c in names}}
+        names = [c for c in parts[0] if c != 'ts']
+        out = {k: np.concatenate([p.get(k, np.full(len(p['ts']), np.nan)) for p in parts]) for k in ['ts'] + names}
+        order = np.argsort(out['ts'], kind='stable')
+        return {k: v[order] for k, v in out.items()}
+
+    ### (first ts, last ts) of the source, None if empty
+    def extent(self):
+        files = self.files()
+        if not files:
+            return None
+        first = np.asarray(self._read_file(files[0])['ts'])
+        last = np.asarray(self._read_file(files[-1])['ts'])
+        if not len(first) or not len(last):
+            ts = self.read()['ts']
+            return (int(ts.min()), int(ts.max())) if len(ts) else None
+        return int(first.min()), int(last.max())
+
+
+### Bucketed series over [start, end) as a DataFrame: ts (bucket start) & one column per metric / stat
+### empty buckets are omitted
+def bucket(cols, width, stats=('mean',)):
+    names = [c for c in cols if c != 'ts']
+    p = weather_resample.partials(cols['ts'], {c: cols[c] for c in names}, width)
+    out = {'ts': p['bucket']}
+    for c in names:
+        for stat in stats:
+            v = weather_resample.finalize(p, c, stat)
+            out[c if len(stats) == 1 else c + '_' + stat] = v if stat == 'count' else np.round(v, 3)
+    return pd.DataFrame(out)
+
+
+### Canonical column names -> field names of a weather_schema format (inverse of its rename map)
+def output_names(df, schema=None):
+    if not schema:
+        return df
+    inverse = {v: k for k, v in weather_schema.rename_map(schema).items()}
+
+    def rename(column):
+        base, sep, stat = column.partition('_')
+        return inverse.get(base, base) + sep + stat
+    return df.rename(columns=rename)
+
+
+def encode(df, fmt='json'):
+    if fmt == 'csv':
+        return df.to_csv(index=False, na_rep='').encode(), 'text/csv'
+    return df.to_json(orient='records').encode(), 'application/json'
+
+
+class Feed:
+    """Bucketed tiles of each source, kept in an LRU keyed by source content version."""
+
+    def __init__(self, sources, max_tiles=1024):
+        self.sources = sources
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+        ### tiles are built in executor threads
+        self.lock = threading.Lock()
+
+    ### DataFrame of tile n at width, cached until its source files change
+    def tile(self, name, width, n, columns=None, stats=('mean',)):
+        source = self.sources[name]
+        start = n * tile_span(width)
+        end = start + tile_span(width)
+        files = source.files(start, end)
+        version = source.version(files)
+        key = (name, width, n, tuple(columns or ()), tuple(stats))
+        with self.lock:
+            cached = self.tiles.get(key)
+            if cached is not None and cached[0] == version:
+                self.tiles.move_to_end(key)
+                return cached[1]
+        df = bucket(source.read(start, end, columns, files), width, stats)
+        with self.lock:
+            self.tiles[key] = (version, df)
+            if len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return df
+
+    ### Series over [start, end) at width, assembled from tiles
+    def series(self, name, start, end, width, columns=None, stats=('mean',)):
+        frames = [self.tile(name, width, n, columns, stats) for n in tile_range(start, end, width)]
+        df = pd.concat(frames, ignore_index=True) if frames else bucket({'ts': np.empty(0, dtype=np.int64)}, width)
+        return df[(df['ts'] >= start - start % width) & (df['ts'] < end)].reset_index(drop=True)
+
+
+def _params(request, feed):
+    name = request.match_info['source']
+    if name not in feed.sources:
+        raise web.HTTPNotFound(text="unknown source: " + name)
+    q = request.query
+    columns = [c for c in q['columns'].split(',') if c] if q.get('columns') else None
+    stats = tuple(s for s in q.get('stat', 'mean').split(',') if s)
+    if not stats or any(s not in STATS for s in stats):
+        raise web.HTTPBadRequest(text="stat: one or more of " + ",".join(STATS))
+    schema = q.get('schema')
+    if schema and schema not in weather_schema.SCHEMAS:
+        raise web.HTTPBadRequest(text="unknown schema: " + schema)
+    fmt = q.get('format', 'json')
+    if fmt not in ('json', 'csv'):
+        raise web.HTTPBadRequest(text="format: json or csv")
+    return name, columns, stats, schema, fmt
+
+
+async def _range(request, feed, name):
+    q = request.query
+    try:
+        start = int(q['start']) if 'start' in q else None
+        end = int(q['end']) if 'end' in q else None
+        points = min(int(q.get('points', DEFAULT_POINTS)), MAX_POINTS)
+    except ValueError:
+        raise web.HTTPBadRequest(text="start, end & points are integers")
+    if (start is not None and end is not None and end <= start) or points < 1:
+        raise web.HTTPBadRequest(text="empty range")
+    extent = await _run(feed.sources[name].extent)
+    if extent is None:
+        raise web.HTTPNotFound(text="no data: " + name)
+    ### only buckets holding samples are built
+    start = extent[0] if start is None else max(start, extent[0])
+    end = extent[1] + 1 if end is None else min(end, extent[1] + 1)
+    if end <= start:
+        raise web.HTTPNotFound(text="no data in range: " + name)
+    if len(tile_range(start, end, pick_width(start, end, points))) > MAX_REQUEST_TILES:
+        raise web.HTTPBadRequest(text="range too long, at most %d tiles of %ds buckets" % (MAX_REQUEST_TILES, WIDTHS[-1]))
+    return start, end, points
+
+
+async def _run(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+### Response with ETag / If-None-Match & gzip content encoding
+def respond(request, body, content_type, cache_control='no-cache'):
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+    }
+    match = request.headers.get('If-None-Match', '')
+    if etag in [m.strip() for m in match.split(',')] or match.strip() == '*':
+        return web.Response(status=304, headers=headers)
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and len(body) > 256:
+        body = gzip.compress(body, 6)
+        headers['Content-Encoding'] = 'gzip'
+    return web.Response(body=body, content_type=content_type, headers=headers)
+
+
+async def handle_series(request):
+    feed = request.app['feed']
+    name, columns, stats, schema, fmt = _params(request, feed)
+    start, end, points = await _range(request, feed, name)
+    width = pick_width(start, end, points)
+    df = await _run(feed.series, name, start, end, width, columns, stats)
+    body, content_type = encode(output_names(df, schema), fmt)
+    return respond(request, body, content_type)
+
+
+async def handle_tiles(request):
+    feed = request.app['feed']
+    name, _, _, _, fmt = _params(request, feed)
+    start, end, points = await _range(request, feed, name)
+    width = pick_width(start, end, points)
+    span = tile_span(width)
+    query = ''.join('&%s=%s' % (k, request.query[k]) for k in ('columns', 'stat', 'schema') if k in request.query)
+    tiles = [{'tile': n, 'start': n * span, 'end': (n + 1) * span,
+              'url': "/tile/%s/%d/%d.%s%s" % (name, width, n, fmt, '?' + query[1:] if query else '')}
+             for n in tile_range(start, end, width)]
+    body = json.dumps({'source': name, 'start': start, 'end': end, 'width': width, 'span': span, 'tiles': tiles})
+    return respond(request, body.encode(), 'application/json')
+
+
+async def handle_tile(request):
+    feed = request.app['feed']
+    name, columns, stats, schema, _ = _params(request, feed)
+    try:
+        width = int(request.match_info['width'])
+        n = int(request.match_info['n'])
+    except ValueError:
+        raise web.HTTPNotFound()
+    if width not in WIDTHS:
+        raise web.HTTPNotFound(text="width: one of " + ",".join(map(str, WIDTHS)))
+    df = await _run(feed.tile, name, width, n, columns, stats)
+    body, content_type = encode(output_names(df, schema), request.match_info['fmt'])
+    ### a tile ending in the past only changes if its log files are rewritten (ETag revalidates)
+    closed = (n + 1) * tile_span(width) <= time.time()
+    return respond(request, body, content_type, 'public, max-age=3600' if closed else 'no-cache')
+
+
+def make_app(sources, max_tiles=1024):
+    app = web.Application()
+    app['feed'] = Feed(sources, max_tiles)
+    app.router.add_get('/series/{source}', handle_series)
+    app.router.add_get('/tiles/{source}', handle_tiles)
+    app.router.add_get(r'/tile/{source}/{width}/{n}.{fmt:json|csv}', handle_tile)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-bucketed weather series for the D3 dashboards")
+    parser.add_argument('--source', action='append', required=True, help="name=path (log file or daily log directory), repeatable")
+    parser.add_argument('--ext', action='append', help="daily log file extension, repeatable in order of preference (default .BIN then .TXT)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3002)
+    parser.add_argument('--max-tiles', type=int, default=1024, help="tiles kept in memory")
+    args = parser.parse_args()
+
+    sources = {}
+    for s in args.source:
+        name, _, path = s.partition('=')
+        if not path:
+            parser.error("--source name=path")
+        sources[name] = Source(path, args.ext or weather_index.EXTS)
+    web.run_app(make_app(sources, args.max_tiles), host=args.host, port=args.port)
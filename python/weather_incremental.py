@@ -0,0 +1,173 @@
+#
+# Incremental Weather Analytics
+#
+# Persist the last processed timestamp plus bucket partial aggregates (weather_resample.py) for
+# hourly, 3 hourly & daily windows. Each run reads only samples newer than the last run (via the
+# date index, so only the latest daily files are opened) and folds them into the open buckets.
+#
+# Hourly / daily / 3 hour mean, min, max & pressure tendency (weather_tendency.py) are then derived
+# from the stored aggregates (a few thousand rows) instead of the full sample history.
+#
+# Samples arriving with ts <= last processed ts (ie a late SD card backfill, RTC reset) are not folded in,
+# they are counted (late, saved with the state) & logged, delete the state file to rebuild from scratch.
+# Late samples are found by the row count each recent log file had at the previous run (logs are append only).
+#
+# An optional prepare(df) callable cleans / derives columns of the new samples before they are folded in
+# (ie weather.py outlier filter & normalized light), a first run can be limited to recent history (start).
+#
+# Usage (cron):
+#    python weather_incremental.py ../data/weather/ weather_state.npz
+#
+#    state = IncrementalState(statefile, prepare=clean)
+#    state.update_from_index(weather_index.DayIndex(path), start=now - timedelta(days=180))
+#    state.save()
+#    df_hourly_mean = state.frame('1H', 'mean')
+#
+
+import os
+import sys
+import json
+import logging
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import weather_cache
+import weather_index
+import weather_loader
+import weather_resample
+import weather_tendency
+
+
+DEFAULT_COLUMNS = ['p', 't', 'h', 'l']
+DEFAULT_WINDOWS = ['1H', '3H', '1D']
+
+
+class IncrementalState:
+    """Last processed ts & per window bucket partials, persisted to a .npz file."""
+
+    def __init__(self, filepath, columns=DEFAULT_COLUMNS, windows=DEFAULT_WINDOWS, prepare=None):
+        self.filepath = filepath
+        self.columns = list(columns)
+        self.windows = list(windows)
+        self.prepare = prepare
+        self.last_ts = None
+        ### samples not folded in, ts <= last_ts on arrival
+        self.late = 0
+        ### rows per recent log file at the last update, {path: n}
+        self.rows = {}
+        self.partials = {w: None for w in self.windows}
+        if os.path.exists(filepath):
+            self.load()
+
+    def load(self):
+        with np.load(self.filepath) as z:
+            meta = json.loads(str(z['meta']))
+            if meta['columns'] != self.columns or meta['windows'] != self.windows:
+                ### configuration changed, rebuild
+                return
+            self.last_ts = meta['last_ts']
+            self.late = meta.get('late', 0)
+            self.rows = meta.get('rows', {})
+            for w in self.windows:
+                if w + '.bucket' not in z:
+                    ### saved before any samples
+                    continue
+                p = {'bucket': z[w + '.bucket'], 'width': weather_resample.window_seconds(w)}
+                for c in self.columns:
+                    p[c] = {k: z['.'.join((w, c, k))] for k in weather_resample.PARTIALS}
+                self.partials[w] = p
+
+    def save(self):
+        arrays = {'meta': np.array(json.dumps({
+            'last_ts': self.last_ts,
+            'late': self.late,
+            'rows': self.rows,
+            'columns': self.columns,
+            'windows': self.windows,
+        }))}
+        for w, p in self.partials.items():
+            if p is None:
+                continue
+            arrays[w + '.bucket'] = p['bucket']
+            for c in self.columns:
+                for k in weather_resample.PARTIALS:
+                    arrays['.'.join((w, c, k))] = p[c][k]
+        tmp = self.filepath + '.tmp.npz'
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.filepath)
+
+    ### Fold in samples newer than last_ts, returns number of new samples
+    def update(self, df):
+        ts = df['ts'].to_numpy()
+        if self.last_ts is not None:
+            new = ts > self.last_ts
+            self._late(len(ts) - int(new.sum()))
+            df = df[new]
+        if self.prepare is not None and len(df):
+            df = self.prepare(df)
+        ts = df['ts'].to_numpy()
+        if not len(ts):
+            return 0
+        values = {}
+        for c in self.columns:
+            values[c] = df[c].to_numpy() if c in df else np.full(len(ts), np.nan)
+        ### reduce new samples once at the finest window, roll up to the coarser ones
+        windows = sorted(self.windows, key=weather_resample.window_seconds)
+        base = weather_resample.partials(ts, values, windows[0])
+        for w in windows:
+            p = base if w == windows[0] else weather_resample.rollup(base, w)
+            self.partials[w] = weather_resample.merge(self.partials[w], p)
+        self.last_ts = int(ts.max())
+        return len(ts)
+
+    def _late(self, n):
+        if n > 0:
+            self.late += n
+            logging.warning("%d late / out of order samples (ts <= %s) not folded in, %d in total",
+                            n, self.last_ts, self.late)
+
+    ### Read & fold new samples from daily log files
+    ### start: first run only, ignore samples before start (datetime / ts)
+    def update_from_index(self, index, start=None, cache_dir=None):
+        if self.last_ts is None:
+            df, _ = index.load(start, None, columns=self.columns, cache_dir=cache_dir)
+        else:
+            files = self._recent(index)
+            df, _ = weather_loader.load_days(files, columns=self.columns, cache_dir=cache_dir, start_ts=self.last_ts + 1)
+            ### rows added to a file since the last run that are not newer than last_ts
+            late = 0
+            for f in files:
+                ts = weather_cache.read_columns(f, ['ts'], cache_dir)['ts']
+                late += max(int((ts <= self.last_ts).sum()) - self.rows.get(f, 0), 0)
+            self._late(late)
+        n = self.update(df)
+        if self.last_ts is not None:
+            self.rows = {f: len(weather_cache.read_columns(f, ['ts'], cache_dir)['ts']) for f in self._recent(index)}
+        return n
+
+    ### files from the last processed day on (& a day's margin, files are named by local date)
+    def _recent(self, index):
+        return index.select(weather_index.to_date(self.last_ts) - timedelta(days=1))
+
+    def frame(self, window, stat):
+        p = self.partials.get(window)
+        if p is None:
+            return pd.DataFrame(columns=self.columns)
+        return weather_resample.to_frame(p, stat, self.columns)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else "../data/weather/"
+    statefile = sys.argv[2] if len(sys.argv) > 2 else os.path.join(path, "weather_state.npz")
+
+    state = IncrementalState(statefile)
+    n = state.update_from_index(weather_index.DayIndex(path))
+    state.save()
+    print("New samples: " + str(n) + ", last ts: " + str(state.last_ts))
+
+    df_hourly_mean = state.frame('1H', 'mean')
+    df_p_3h_mean = state.frame('3H', 'mean')['p']
+    print(df_hourly_mean.tail(3))
+    print(weather_tendency.tendency(df_p_3h_mean).tail(3))
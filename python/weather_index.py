@@ -0,0 +1,109 @@
+#
+# Weather Data File Index
+#
+# Index daily log files by date (filename YYYYMMDD.BIN or YYYYMMDD.TXT, one per date) so that a query for a date / time range
+# opens only the files covering that range, and seeks within each day's (cached, sorted) ts
+# column rather than loading whole days and slicing the combined DataFrame afterwards.
+#
+# Usage:
+#    index = weather_index.DayIndex("../data/weather/")
+#    now = datetime.now(timezone.utc)
+#    df, df_stat = index.load(now - timedelta(hours=48), now)
+#
+
+import os
+import bisect
+import calendar
+from datetime import date, datetime, timedelta, timezone
+
+import weather_codec
+import weather_loader
+
+
+### daily log file extensions: binary records & SD card JSON / CSV text
+### in order of preference, a date with both (ie during migration) is read from the first found
+EXTS = (weather_codec.EXT, '.TXT')
+
+
+### naive datetimes are treated as UTC, consistent with pd.to_datetime(df['ts'], unit='s')
+def to_ts(t):
+    if t is None:
+        return None
+    if isinstance(t, datetime):
+        if t.tzinfo is not None:
+            return int(t.timestamp())
+        return calendar.timegm(t.timetuple())
+    if isinstance(t, date):
+        return calendar.timegm(t.timetuple())
+    return int(t)
+
+
+def to_date(t):
+    if t is None:
+        return None
+    if isinstance(t, datetime):
+        t = to_ts(t)
+    elif isinstance(t, date):
+        return t
+    return datetime.fromtimestamp(int(t), timezone.utc).date()
+
+
+### YYYYMMDD -> date, None if filename is not a daily log
+def parse_filename(filename):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if len(stem) != 8 or not stem.isdigit():
+        return None
+    try:
+        return date(int(stem[0:4]), int(stem[4:6]), int(stem[6:8]))
+    except ValueError:
+        return None
+
+
+class DayIndex:
+    """Daily log files keyed by date, in date order, one file per date (first of ext, ie .BIN over .TXT)."""
+
+    def __init__(self, path, ext=EXTS):
+        self.path = path
+        exts = [e.upper() for e in ((ext,) if isinstance(ext, str) else ext)]
+        days = {}
+        for f in os.listdir(path):
+            suffix = os.path.splitext(f)[1].upper()
+            if suffix not in exts:
+                continue
+            d = parse_filename(f)
+            if d is None:
+                continue
+            rank = exts.index(suffix)
+            if d not in days or rank < days[d][0]:
+                days[d] = (rank, os.path.join(path, f))
+        self.dates = sorted(days)
+        self.files = [days[d][1] for d in self.dates]
+
+    def __len__(self):
+        return len(self.dates)
+
+    ### files for dates in [start, end] (inclusive), None for open ended range
+    def select(self, start=None, end=None):
+        start, end = to_date(start), to_date(end)
+        i = 0 if start is None else bisect.bisect_left(self.dates, start)
+        j = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return self.files[i:j]
+
+    ### load rows with start <= ts <= end from only the files covering that range
+    ### margin: extra days either side, files are named by station (local) date whereas ts is UTC
+    def load(self, start=None, end=None, columns=None, stat_columns=None, processes=None, cache_dir=None, margin=1):
+        first, last = to_date(start), to_date(end)
+        files = self.select(first - timedelta(days=margin) if first else None,
+                            last + timedelta(days=margin) if last else None)
+        df, df_stat = weather_loader.load_days(files, columns=columns, stat_columns=stat_columns,
+                                               processes=processes, cache_dir=cache_dir,
+                                               start_ts=to_ts(start), end_ts=to_ts(end))
+        ### daily stats only for days within range, not the margin files
+        if len(df_stat):
+            keep = df_stat['date'].notna()
+            if first is not None:
+                keep &= df_stat['date'] >= first.strftime('%Y%m%d')
+            if last is not None:
+                keep &= df_stat['date'] <= last.strftime('%Y%m%d')
+            df_stat = df_stat[keep].reset_index(drop=True)
+        return df, df_stat
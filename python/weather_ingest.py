@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+#
+# Weather Station MQTT Ingest Service (asyncio)
+#
+# Subscribes to wildcard station topics (ie "weather/+/out") on an MQTT broker, payloads from all
+# stations fan in to one bounded queue, decode workers parse JSON in batches & fan out to
+# pluggable sinks:
+#
+#    MongoSink      bulk inserts via weather_mongo_writer.BulkWriter
+#    LogSink        appends SD card log format lines per station / day (data/<station>/YYYYMMDD.TXT),
+#                   read back through weather_index / weather_cache as typed columns
+#    WebsocketSink  broadcasts each decoded batch to connected websocket clients
+#
+# Payloads are JSON, or binary record blocks (weather_codec.py, magic b'WX') decoded in bulk.
+#
+# Throughput & queue depth are tracked per station.
+#
+# The paho MQTT client runs on the asyncio event loop (socket add_reader / add_writer), no network thread.
+# A failed connect or dropped connection is retried with exponential backoff (1s .. --reconnect-max),
+# subscriptions are renewed on each connect.
+# Ingest.submit(topic, payload) is the entry point for messages, so a fake broker can drive it directly.
+#
+# Start cmd: python weather_ingest.py --host 192.168.1.127 --topic esp8266.out --topic "weather/+/out" --mongo mongodb://localhost:27017/
+#
+
+import os
+import json
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+import weather_codec
+
+
+### Station id from topic: levels matched by '+' / '#' in the subscription pattern, or the whole topic
+def station_from_topic(topic, patterns):
+    levels = topic.split('/')
+    for pattern in patterns:
+        plevels = pattern.split('/')
+        matched = []
+        for i, p in enumerate(plevels):
+            if p == '#':
+                matched.extend(levels[i:])
+                break
+            if i >= len(levels):
+                matched = None
+                break
+            if p == '+':
+                matched.append(levels[i])
+            elif p != levels[i]:
+                matched = None
+                break
+        else:
+            if len(levels) != len(plevels):
+                matched = None
+        if matched:
+            return '/'.join(matched)
+    return topic
+
+
+### Decoded binary columns -> documents, missing (NaN) metrics omitted
+def _records(cols):
+    names = [k for k in cols if k != 'ts']
+    docs = []
+    for i, ts in enumerate(cols['ts'].tolist()):
+        doc = {'ts': ts}
+        for k in names:
+            v = cols[k][i]
+            if not np.isnan(v):
+                doc[k] = v.item()
+        docs.append(doc)
+    return docs
+
+
+class StationStats:
+
+    def __init__(self):
+        self.messages = 0
+        self.docs = 0
+        self.bytes = 0
+        self.errors = 0
+        self.dropped = 0
+        self.queued = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class Ingest:
+
+    def __init__(self, sinks, patterns=(), max_queue=10000, workers=4, batch_size=256):
+        self.sinks = list(sinks)
+        self.patterns = list(patterns)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.stations = {}
+        self._tasks = []
+
+    def station(self, name):
+        st = self.stations.get(name)
+        if st is None:
+            st = self.stations[name] = StationStats()
+        return st
+
+    ### Queue a raw MQTT message, never blocks (called from the paho callback on the event loop)
+    def submit(self, topic, payload):
+        name = station_from_topic(topic, self.patterns)
+        st = self.station(name)
+        st.messages += 1
+        st.bytes += len(payload)
+        try:
+            self.queue.put_nowait((name, payload))
+            st.queued += 1
+        except asyncio.QueueFull:
+            st.dropped += 1
+
+    def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.ensure_future(self._worker()))
+
+    async def stop(self):
+        await self.queue.join()
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for sink in self.sinks:
+            await sink.close()
+
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            for name, _ in batch:
+                self.stations[name].queued -= 1
+            try:
+                docs = self._decode(batch)
+                if docs:
+                    await asyncio.gather(*(sink.write(docs) for sink in self.sinks))
+            except Exception as e:
+                logging.exception("ingest sink error: %s", e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _decode(self, batch):
+        docs = []
+        for name, payload in batch:
+            st = self.stations[name]
+            try:
+                if weather_codec.is_encoded(payload):
+                    obj = _records(weather_codec.decode(payload))
+                else:
+                    obj = json.loads(payload)
+            except ValueError:
+                st.errors += 1
+                continue
+            if isinstance(obj, dict):
+                obj = [obj]
+            elif not isinstance(obj, list):
+                ### valid JSON but not a document (ie null, 123, "x")
+                st.errors += 1
+                continue
+            for doc in obj:
+                if isinstance(doc, dict):
+                    doc.setdefault('station', name)
+                    docs.append(doc)
+                    st.docs += 1
+        return docs
+
+    def stats(self):
+        return {
+            'queue': self.queue.qsize(),
+            'stations': {name: st.as_dict() for name, st in self.stations.items()},
+        }
+
+    ### Log per station message rate & queue depth every interval seconds
+    async def report(self, interval=60):
+        last = {}
+        while True:
+            await asyncio.sleep(interval)
+            for name, st in self.stations.items():
+                rate = (st.messages - last.get(name, 0)) / float(interval)
+                last[name] = st.messages
+                logging.info("station %s: %.1f msg/s, docs %d, queued %d, dropped %d, errors %d",
+                             name, rate, st.docs, st.queued, st.dropped, st.errors)
+            logging.info("ingest queue depth: %d", self.queue.qsize())
+
+
+### Sinks: async write(docs), async close()
+
+class MongoSink:
+
+    def __init__(self, collection, **kwargs):
+        from weather_mongo_writer import BulkWriter
+        import weather_mongo_schema
+        kwargs.setdefault('prepare', weather_mongo_schema.prepare)
+        self.writer = BulkWriter(collection, **kwargs).start()
+
+    async def write(self, docs):
+        ### BulkWriter.put may block on backpressure, keep it off the event loop
+        ### copies: insert_many adds _id to each document from the writer thread
+        docs = [dict(d) for d in docs]
+        await asyncio.get_event_loop().run_in_executor(None, self.writer.put, docs)
+
+    async def close(self):
+        await asyncio.get_event_loop().run_in_executor(None, self.writer.close)
+
+
+class LogSink:
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+
+    def _file(self, station, ts):
+        day = datetime.fromtimestamp(ts, timezone.utc).strftime('%Y%m%d')
+        key = (station, day)
+        f = self.files.get(key)
+        if f is None:
+            ### one open file per station, close previous day
+            for k in [k for k in self.files if k[0] == station]:
+                self.files.pop(k).close()
+            dirpath = os.path.join(self.path, station.replace('/', '_'))
+            os.makedirs(dirpath, exist_ok=True)
+            f = self.files[key] = open(os.path.join(dirpath, day + ".TXT"), "a")
+        return f
+
+    async def write(self, docs):
+        for doc in docs:
+            ts = doc.get('ts')
+            if ts is None:
+                continue
+            rec = {k: v for k, v in doc.items() if k not in ('station', '_id')}
+            self._file(doc['station'], ts).write("[" + json.dumps(rec, separators=(',', ':')) + "]\n")
+        for f in self.files.values():
+            f.flush()
+
+    async def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+class WebsocketSink:
+
+    def __init__(self, host="127.0.0.1", port=5679):
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.server = None
+
+    async def start(self):
+        import websockets
+        self.server = await websockets.serve(self._handler, self.host, self.port)
+
+    async def _handler(self, websocket, path=None):
+        self.clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.clients.discard(websocket)
+
+    async def write(self, docs):
+        if self.clients:
+            import websockets
+            message = json.dumps([{k: v for k, v in d.items() if k != '_id'} for d in docs])
+            websockets.broadcast(self.clients, message)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+### Run a paho MQTT client on the asyncio event loop
+class AsyncioMqtt:
+
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self.misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc is not None:
+            self.misc.cancel()
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        import paho.mqtt.client as mqtt
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+
+async def main(args):
+    sinks = []
+    if args.mongo:
+        import pymongo
+        import weather_mongo_schema
+        db = pymongo.MongoClient(args.mongo)[args.db]
+        weather_mongo_schema.ensure_indexes(db, args.collection)
+        sinks.append(MongoSink(db[args.collection]))
+    if args.log_dir:
+        sinks.append(LogSink(args.log_dir))
+    if args.ws_port:
+        ws = WebsocketSink(args.ws_host, args.ws_port)
+        await ws.start()
+        sinks.append(ws)
+
+    ingest = Ingest(sinks, patterns=args.topic, max_queue=args.max_queue, workers=args.workers)
+    ingest.start()
+    asyncio.ensure_future(ingest.report(args.report))
+
+    try:
+        await subscribe(ingest, args.host, args.port, args.topic, max_delay=args.reconnect_max)
+    finally:
+        await ingest.stop()
+
+
+### Connect a paho client to the broker & keep it connected, reconnecting with exponential backoff
+### (min_delay doubling to max_delay, reset after a connection stays up for max_delay), runs until cancelled
+async def keep_connected(client, host, port, keepalive=60, min_delay=1.0, max_delay=60.0):
+    loop = asyncio.get_event_loop()
+    delay = min_delay
+    while True:
+        disconnected = loop.create_future()
+
+        def on_disconnect(client, userdata, *args_):
+            if not disconnected.done():
+                disconnected.set_result(True)
+
+        client.on_disconnect = on_disconnect
+        try:
+            client.connect(host, port, keepalive)
+        except OSError as e:
+            logging.warning("mqtt connect %s:%d failed: %s, retry in %.0fs", host, port, e, delay)
+        else:
+            connected = loop.time()
+            await disconnected
+            if loop.time() - connected >= max_delay:
+                delay = min_delay
+            logging.warning("mqtt %s:%d disconnected, reconnect in %.0fs", host, port, delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+### Feed messages on topics from the broker into ingest, runs until cancelled
+async def subscribe(ingest, host, port, topics, keepalive=60, min_delay=1.0, max_delay=60.0):
+    import paho.mqtt.client as mqtt
+
+    def on_connect(client, userdata, flags, rc, *args_):
+        print("Connected with result code:"+str(rc))
+        for topic in topics:
+            print("MQTT topic: "+topic)
+            client.subscribe(topic)
+
+    def on_message(client, userdata, msg):
+        ingest.submit(msg.topic, msg.payload)
+
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    else:
+        client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    AsyncioMqtt(asyncio.get_event_loop(), client)
+    try:
+        await keep_connected(client, host, port, keepalive, min_delay, max_delay)
+    finally:
+        client.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Weather station MQTT ingest service")
+    parser.add_argument('--host', default="192.168.1.127")
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--topic', action='append', help="topic / wildcard pattern, repeatable (default esp8266.out)")
+    parser.add_argument('--mongo', help="mongo server uri, ie mongodb://localhost:27017/")
+    parser.add_argument('--db', default="weather")
+    parser.add_argument('--collection', default="sensorData")
+    parser.add_argument('--log-dir', help="write SD card format logs per station / day to this directory")
+    parser.add_argument('--ws-host', default="127.0.0.1")
+    parser.add_argument('--ws-port', type=int, help="broadcast decoded samples to websocket clients on this port")
+    parser.add_argument('--max-queue', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--report', type=int, default=60, help="stats log interval (seconds)")
+    parser.add_argument('--reconnect-max', type=float, default=60.0, help="max seconds between broker reconnect attempts")
+    args = parser.parse_args()
+    if not args.topic:
+        args.topic = ["esp8266.out"]
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args))
@@ -0,0 +1,127 @@
+#
+# Parallel Weather Data Loader
+#
+# Parse daily log files and compute per day stats across a process pool.
+#
+# Workers parse each file into the columnar cache (weather_cache.py) and return only
+# small metadata & the day's stats rows; column data is passed back through the cache
+# files, memory-mapped by the parent & copied once into the combined arrays, rather
+# than pickling DataFrames between processes.
+#
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import weather_cache
+import weather_stats
+
+
+### Worker: refresh cache for one file, compute stats for that day
+def _load_day(args):
+    filepath, cache_dir, stat_columns = args
+    if not weather_cache.is_fresh(filepath, cache_dir):
+        weather_cache.build(filepath, cache_dir)
+    df_stat = None
+    if stat_columns:
+        cols = weather_cache.read_columns(filepath, list(stat_columns) + ['ts'], cache_dir)
+        df = pd.DataFrame(cols)
+        present = {k: v for k, v in _as_dict(stat_columns).items() if k in df}
+        if present and len(df):
+            date = os.path.splitext(os.path.basename(filepath))[0]
+            df_stat = weather_stats.daily_stats(df, present, day=np.repeat(date, len(df)))
+    return filepath, df_stat
+
+
+def _as_dict(columns):
+    return columns if isinstance(columns, dict) else {c: c for c in columns}
+
+
+### Concatenate per day column arrays into one preallocated array per column
+def combine(days, columns=None):
+    n = sum(len(d['ts']) for d in days)
+    names = ['ts']
+    dtypes = {'ts': np.dtype(np.int64)}
+    for d in days:
+        for name, col in d.items():
+            if columns is not None and name not in columns:
+                continue
+            if name not in dtypes:
+                names.append(name)
+                dtypes[name] = col.dtype
+            else:
+                dtypes[name] = np.result_type(dtypes[name], col.dtype)
+
+    out = {}
+    for name in names:
+        dtype = dtypes[name]
+        if dtype.kind == 'f':
+            out[name] = np.full(n, np.nan, dtype=dtype)
+        else:
+            out[name] = np.zeros(n, dtype=dtype)
+
+    i = 0
+    for d in days:
+        m = len(d['ts'])
+        for name in names:
+            if name in d:
+                out[name][i:i+m] = d[name]
+        i += m
+    return out
+
+
+### Seek to rows start_ts <= ts <= end_ts within a day's (memory-mapped) columns
+def _slice_day(day, start_ts=None, end_ts=None):
+    if start_ts is None and end_ts is None:
+        return day
+    ts = day['ts']
+    if len(ts) and np.all(ts[1:] >= ts[:-1]):
+        i = 0 if start_ts is None else np.searchsorted(ts, start_ts, side='left')
+        j = len(ts) if end_ts is None else np.searchsorted(ts, end_ts, side='right')
+        return {name: col[i:j] for name, col in day.items()}
+    ### out of order samples (ie RTC reset), fall back to a mask
+    mask = np.ones(len(ts), dtype=bool)
+    if start_ts is not None:
+        mask &= ts >= start_ts
+    if end_ts is not None:
+        mask &= ts <= end_ts
+    return {name: col[mask] for name, col in day.items()}
+
+
+### Load list of daily log files (date order) into a single DataFrame
+### stat_columns: optional list / {column: label} dict, per day stats are returned as df_stat
+### start_ts, end_ts: optional unix timestamp range, rows outside are never copied
+### returns (df, df_stat)
+def load_days(files, columns=None, stat_columns=None, processes=None, cache_dir=None, start_ts=None, end_ts=None):
+    files = list(files)
+    jobs = [(f, cache_dir, stat_columns) for f in files]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, max(len(files), 1))
+
+    if processes > 1:
+        ### fork where available: analytics scripts run at module level, spawn would re-run them in each worker
+        if 'fork' in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context('fork')
+        else:
+            ctx = multiprocessing.get_context()
+        with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+            results = list(pool.map(_load_day, jobs, chunksize=max(1, len(jobs) // (processes * 4))))
+    else:
+        results = [_load_day(job) for job in jobs]
+
+    days = [_slice_day(weather_cache.read_columns(f, None, cache_dir), start_ts, end_ts) for f, _ in results]
+    if columns is not None:
+        columns = set(columns) | {'ts'}
+    df = pd.DataFrame(combine(days, columns))
+
+    stats = [s for _, s in results if s is not None]
+    if stats:
+        df_stat = pd.concat(stats, ignore_index=True)
+    else:
+        df_stat = pd.DataFrame(columns=weather_stats.STAT_COLUMNS)
+    return df, df_stat
@@ -0,0 +1,215 @@
+#
+# Weather Station SD Card Log Reader
+#
+# Stream parse daily weather data files (../data/weather/YYYYMMDD.TXT) one line at a time
+# directly into typed column buffers, no intermediate .json copy (replaces weather_preprocess.bash)
+#
+# SD card log format, one JSON array per line:
+#    [{"ts":1585744094,"tempC":18.6,"tempF":65.48,"h":47,"LDR":60,"p":102163,"w":0}]
+#
+# Pre-processed .json format (json array, one object per line) is also accepted:
+#    [
+#    {"ts":1585744094,"tempC":18.6,"tempF":65.48,"h":47,"LDR":60,"p":102163,"w":0},
+#    ]
+#
+# CSV logs with a header line (ie data/SENSOR.TXT: ts,tempC,tempH,humidity,LDR) are also accepted,
+# as are binary .BIN logs (weather_codec.py).
+#
+# Field names are mapped to canonical columns (weather_schema.py) as they are parsed, the record
+# format is detected from the first record / CSV header, schema=None keeps source field names.
+#
+# Numeric metrics are stored as float64 (NaN for missing values), "ts" as int64,
+# text fields (ie sunrise / sunset "sr":"05:50:15") as python lists
+#
+
+import os
+import json
+from array import array
+
+import numpy as np
+import pandas as pd
+
+import weather_codec
+import weather_schema
+
+
+### Parse one log line, return a (possibly empty) sequence of record dicts
+def parse_line(line):
+    line = line.strip().rstrip(',')
+    if not line or line in ('[', ']'):
+        return ()
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        ### truncated / corrupt line, ie power loss during SD card write
+        return ()
+    if isinstance(obj, dict):
+        return (obj,)
+    if isinstance(obj, list):
+        return [o for o in obj if isinstance(o, dict)]
+    return ()
+
+
+### Generator, yields each record in a log file
+def iter_records(filepath):
+    with open(filepath, errors='replace') as f:
+        for line in f:
+            for rec in parse_line(line):
+                yield rec
+
+
+### Record ts as int, None if missing / not a number (ie "ts":"x", NaN, bool) / out of int64 range
+def _timestamp(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        ts = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not -2 ** 63 <= ts < 2 ** 63:
+        return None
+    return ts
+
+
+class ColumnBuffer:
+    """Append-only typed column store, one array per metric.
+
+    rename: optional {source field: column} map, resolved once per field (not per record).
+    """
+
+    def __init__(self, columns=None, rename=None):
+        self.columns = list(columns) if columns is not None else None
+        self.rename = rename or {}
+        self.ts = array('q')
+        self.data = {}
+        ### source field -> column array (None: field skipped)
+        self.fields = {}
+        if self.columns is not None:
+            for c in self.columns:
+                if c != 'ts':
+                    self.data[c] = array('d')
+
+    def __len__(self):
+        return len(self.ts)
+
+    def _new_column(self, key, value):
+        n = len(self.ts)
+        if isinstance(value, str):
+            col = [None] * n
+        else:
+            col = array('d', [np.nan]) * n
+        self.data[key] = col
+        return col
+
+    def _field(self, key, value):
+        name = self.rename.get(key, key)
+        col = self.data.get(name)
+        if col is None and self.columns is None:
+            col = self._new_column(name, value)
+        self.fields[key] = col
+        return col
+
+    ### Append one record, False (nothing appended) if its ts is missing or not an int64 timestamp
+    def append(self, rec):
+        ts = _timestamp(rec.get('ts'))
+        if ts is None:
+            return False
+        for key, value in rec.items():
+            if key == 'ts':
+                continue
+            try:
+                col = self.fields[key]
+            except KeyError:
+                col = self._field(key, value)
+            if col is None:
+                continue
+            if isinstance(col, list):
+                col.append(value)
+            elif isinstance(value, (int, float)):
+                col.append(value)
+            else:
+                col.append(np.nan)
+        self.ts.append(ts)
+        ### pad metrics absent from this record
+        n = len(self.ts)
+        for col in self.data.values():
+            if len(col) < n:
+                col.append(None if isinstance(col, list) else np.nan)
+        return True
+
+    def arrays(self):
+        out = {'ts': np.frombuffer(self.ts, dtype=np.int64) if len(self.ts) else np.empty(0, dtype=np.int64)}
+        for key, col in self.data.items():
+            if isinstance(col, list):
+                out[key] = np.array(col, dtype=object)
+            elif len(col):
+                out[key] = np.frombuffer(col, dtype=np.float64)
+            else:
+                out[key] = np.empty(0, dtype=np.float64)
+        return out
+
+
+### CSV log if the first non blank line is a header of a known schema (ts & the schema's fields),
+### anything else (incl. a corrupt / truncated first record) is read as JSON lines, bad lines skipped
+def is_csv(filepath):
+    with open(filepath, errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                return is_csv_header(line)
+    return False
+
+
+def is_csv_header(line):
+    if line.startswith(('[', '{')):
+        return False
+    fields = [c.strip() for c in line.split(',')]
+    return 'ts' in fields and weather_schema.detect(fields) is not None
+
+
+### Read a CSV log (header line of field names) into a dict of numpy column arrays
+def read_csv_columns(filepath, columns=None, schema='auto'):
+    df = pd.read_csv(filepath, on_bad_lines='skip')
+    df.columns = [c.strip() for c in df.columns]
+    rename = weather_schema.rename_map(schema, df.columns)
+    df = df.rename(columns=rename)
+    ts = pd.to_numeric(df['ts'], errors='coerce') if 'ts' in df else pd.Series(dtype=np.float64)
+    df = df[ts.notna()]
+    out = {'ts': ts[ts.notna()].to_numpy(dtype=np.int64)}
+    for name in (df.columns if columns is None else columns):
+        if name == 'ts':
+            continue
+        if name in df:
+            out[name] = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+        elif columns is not None:
+            out[name] = np.full(len(df), np.nan)
+    return out
+
+
+### Read a log file into a dict of numpy column arrays
+### columns: optional list of (canonical) metrics to keep, others are skipped while parsing
+### schema: weather_schema name, 'auto' to detect from the first record, None to keep source field names
+def read_columns(filepath, columns=None, schema='auto'):
+    if filepath.upper().endswith('.BIN'):
+        cols = weather_codec.read_columns(filepath)
+        return cols if columns is None else {k: v for k, v in cols.items() if k == 'ts' or k in columns}
+    if is_csv(filepath):
+        return read_csv_columns(filepath, columns, schema)
+    buf = None
+    for rec in iter_records(filepath):
+        if buf is None:
+            buf = ColumnBuffer(columns, weather_schema.rename_map(schema, rec.keys()))
+        buf.append(rec)
+    if buf is None:
+        buf = ColumnBuffer(columns)
+    return buf.arrays()
+
+
+### Read a log file into a DataFrame
+def read_frame(filepath, columns=None, schema='auto'):
+    return pd.DataFrame(read_columns(filepath, columns, schema))
+
+
+### List daily log files in a directory, sorted by date (filename YYYYMMDD)
+def list_log_files(path, ext=".TXT"):
+    return sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(ext))
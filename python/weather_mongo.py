@@ -9,9 +9,16 @@
 
 
 import os
-import json
+import sys
 import numpy as np
 
+### headless: WEATHER_RENDER=<dir> writes charts to files (weather_render.py) instead of plt.show() windows
+import weather_render
+weather_render.setup()
+### long series are decimated to the axes width before plotting (weather_decimate.py)
+import weather_decimate
+weather_decimate.install()
+
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import pandas as pd
@@ -23,7 +30,10 @@ sns.set(rc={'figure.figsize':(11, 4)})
 
 
 import pymongo
-from bson import json_util
+
+import weather_stats
+import weather_mongo_query
+import weather_mongo_schema
 
 mongo_server = "mongodb://localhost:27017/"
 mongo_db = "weather"
@@ -33,19 +43,17 @@ mongoClient = pymongo.MongoClient(mongo_server)
 mydb = mongoClient[mongo_db]
 sensorData = mydb[mongo_collection]
 
-d = []
-
-
 currts = sensorData.find_one(sort=[("ts", pymongo.DESCENDING)])
+
+### render mode: charts are current if no document was added since the last run (newest document & count)
+if weather_render.unchanged(extra=[currts['_id'], currts['ts'], sensorData.estimated_document_count()]):
+    sys.exit(0)
 startts = currts['ts'] - 86400
 endts = currts['ts'] - 18000
 
-mydoc = sensorData.find({"ts":{'$gte': startts,'$lte': endts}}, {'_id': 0})
+data_columns = ['p', 'tempC', 'h', 'LDR']
 
-for doc in mydoc:
-  s = json.dumps(doc, sort_keys=True,default=json_util.default)
-  o = json.loads(s)
-  d.append(o)
+df = weather_mongo_query.read_frame(sensorData, startts, endts, data_columns)
 
 
 pd.set_option('display.max_rows', None)
@@ -54,32 +62,14 @@ pd.set_option('display.width', None)
 pd.set_option('display.max_colwidth', -1)
 
 
-df_stat = pd.DataFrame(columns = ['data', 'date', 'mean' , 'std', 'min' , 'max', 'last'])
-frames = []
-stats = []
-
-
-df = pd.DataFrame(d)
 print(df.info(verbose=True))
 
 ### Compute Daily Stats - Mean, Min, Max, STD Deviation (freq: all data points)
-row1 = pd.DataFrame({'data': 'pressure','date': df.ts,'mean': df.p.mean() ,'std': df.p.std(),'min': df.p.min(),'max': df.p.max(),'last': df.p.iloc[-1]},index=[0])
-row2 = pd.DataFrame({'data': 'tempC','date': df.ts,'mean': df.tempC.mean() ,'std': df.tempC.std(),'min': df.tempC.min(),'max': df.tempC.max(),'last': df.tempC.iloc[-1]},index=[0])
-row3 = pd.DataFrame({'data': 'humidity','date': df.ts,'mean': df.h.mean() ,'std': df.h.std(),'min': df.h.min(),'max': df.h.max(),'last': df.h.iloc[-1]},index=[0])
-row4 = pd.DataFrame({'data': 'light','date': df.ts,'mean': df.LDR.mean() ,'std': df.LDR.std(),'min': df.LDR.min(),'max': df.LDR.max(),'last': df.LDR.iloc[-1]},index=[0])
-
-df_stat = df_stat.append(row1,ignore_index=True,sort=True)
-df_stat = df_stat.append(row2,ignore_index=True,sort=True)
-df_stat = df_stat.append(row3,ignore_index=True,sort=True)
-df_stat = df_stat.append(row4,ignore_index=True,sort=True)
-
-frames.append(df)
+df_stat = weather_stats.daily_stats(df, {'p': 'pressure', 'tempC': 'tempC', 'h': 'humidity', 'LDR': 'light'})
 
 
 print(df_stat)
 
-df = pd.concat(frames)
-
 
 df.sort_values(by='ts', ascending=True)
 df['datetime'] = pd.to_datetime(df['ts'],unit='s')
@@ -95,7 +85,7 @@ df.index
 df['Year'] = df.index.year
 df['Month'] = df.index.month
 df['Day'] = df.index.day
-df['Weekday Name'] = df.index.weekday_name
+df['Weekday Name'] = df.index.day_name()
 df['Hour'] = df.index.hour
 
 # display a random sample of 5 rows
@@ -136,18 +126,20 @@ ax[3].legend();
 
 
 
-data_columns = ['p', 'tempC', 'h', 'LDR']
+# Resample to hourly / 3 hourly / daily frequency, aggregating with mean, max, min (single pass)
 
-# Resample to hourly / daily frequency, aggregating with mean, max, min
+### bucketing runs server side (aggregation pipeline), only bucketed rows are transferred
+### closed hourly buckets are read from the rollup collection (weather_mongo_schema.py --downsample), the rest from raw samples
+resampled = weather_mongo_schema.resample(mydb, startts, endts, data_columns, ['1H', '3H', '1D'], ['mean', 'max', 'min'], mongo_collection)
 
-df_hourly_mean = df[data_columns].resample('H').mean()
-df_daily_mean = df[data_columns].resample('D').mean()
+df_hourly_mean = resampled['1H', 'mean']
+df_daily_mean = resampled['1D', 'mean']
 
-df_hourly_max = df[data_columns].resample('H').max()
-df_daily_max = df[data_columns].resample('D').max()
+df_hourly_max = resampled['1H', 'max']
+df_daily_max = resampled['1D', 'max']
 
-df_hourly_min = df[data_columns].resample('H').min()
-df_daily_min = df[data_columns].resample('D').min()
+df_hourly_min = resampled['1H', 'min']
+df_daily_min = resampled['1D', 'min']
 
 print(df_hourly_mean.head(15))
 
@@ -221,16 +213,16 @@ start_dt = start_dt.strftime("%Y-%m-%d %H:%M:%S")
 end_dt = end_dt.strftime("%Y-%m-%d %H:%M:%S")
 
 
-df_temp_3h_mean = df.loc[start_dt:end_dt]['tempC'].resample('3H').mean()
-df_p_3h_mean = df.loc[start_dt:end_dt]['p'].resample('3H').mean()
+df_temp_3h_mean = resampled['3H', 'mean'].loc[start_dt:end_dt]['tempC']
+df_p_3h_mean = resampled['3H', 'mean'].loc[start_dt:end_dt]['p']
 
 df_temp_3h_mean_pct = df_temp_3h_mean.pct_change()*np.sign(df_temp_3h_mean.shift(periods=1))
 df_p_3h_mean_pct = df_p_3h_mean.pct_change()*np.sign(df_p_3h_mean.shift(periods=1))
 
 df_p_3h_mean_pct_2d = df_p_3h_mean_pct.pct_change()*np.sign(df_p_3h_mean_pct.shift(periods=1))
 
-print df_p_3h_mean_pct
-print df_p_3h_mean_pct_2d
+print(df_p_3h_mean_pct)
+print(df_p_3h_mean_pct_2d)
 
 
 fig, ax = plt.subplots(4)
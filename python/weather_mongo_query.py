@@ -0,0 +1,160 @@
+#
+# Weather Mongo DB Query Layer
+#
+# Push time bucketing into a MongoDB aggregation pipeline ($group on ts truncated to the bucket width),
+# only bucketed rows are transferred, decoded straight into numpy arrays.
+#
+# The pipeline returns bucket partials (count, sum, sum of squares, min, max) at the finest window,
+# coarser windows & statistics are rolled up locally by weather_resample.py, so hourly, 3 hourly &
+# daily mean / min / max need one query:
+#
+#    r = weather_mongo_query.resample(sensorData, startts, endts, ['p', 'tempC', 'h', 'LDR'])
+#    df_hourly_mean = r['1H', 'mean']
+#
+# Raw samples are read with a projection on the needed fields & find_raw_batches(), each BSON batch is
+# decoded in one bson.decode_all() call (C extension, small dicts of the projected fields only) & appended
+# column wise to typed buffers (no json dumps / loads per document). Non numeric values are read as NaN,
+# documents without a numeric ts are skipped:
+#
+#    df = weather_mongo_query.read_frame(sensorData, startts, endts, ['tempC', 'h', 'LDR', 'p'])
+#
+
+from array import array
+
+import bson
+import numpy as np
+import pandas as pd
+
+import weather_resample
+
+
+### Numeric value as float, NaN for None / non numeric values
+def number(v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    return float('nan')
+
+
+### Query filter on ts range (inclusive) & station
+def match_filter(start_ts=None, end_ts=None, station=None):
+    match = {}
+    if start_ts is not None or end_ts is not None:
+        match['ts'] = {}
+        if start_ts is not None:
+            match['ts']['$gte'] = start_ts
+        if end_ts is not None:
+            match['ts']['$lte'] = end_ts
+    if station is not None:
+        match['station'] = station
+    return match
+
+
+### $group accumulators c<i>_count, _sum, _sumsq, _min, _max for each column
+### only numeric values are samples: strings, booleans & nulls are skipped (as NaN in read_columns)
+def group_partials(group, columns):
+    for i, c in enumerate(columns):
+        field = '$' + c
+        num = {'$cond': [{'$isNumber': field}, field, None]}
+        group['c%d_count' % i] = {'$sum': {'$cond': [{'$isNumber': field}, 1, 0]}}
+        group['c%d_sum' % i] = {'$sum': num}
+        group['c%d_sumsq' % i] = {'$sum': {'$multiply': [num, num]}}
+        group['c%d_min' % i] = {'$min': num}
+        group['c%d_max' % i] = {'$max': num}
+    return group
+
+
+### Aggregation pipeline: per bucket partials for each column
+def bucket_pipeline(columns, window, start_ts=None, end_ts=None, station=None, match=None):
+    width = weather_resample.window_seconds(window)
+    if match is None:
+        match = match_filter(start_ts, end_ts, station)
+
+    group = group_partials({'_id': {'$subtract': ['$ts', {'$mod': ['$ts', width]}]}}, columns)
+
+    pipeline = []
+    if match:
+        pipeline.append({'$match': match})
+    pipeline.append({'$group': group})
+    pipeline.append({'$sort': {'_id': 1}})
+    return pipeline
+
+
+### Run bucket pipeline, returns partials in weather_resample format
+### match: query filter, instead of start_ts, end_ts & station
+def bucket_partials(collection, columns, window='1H', start_ts=None, end_ts=None, station=None, match=None):
+    pipeline = bucket_pipeline(columns, window, start_ts, end_ts, station, match)
+    fields = [('c%d_' % i) + k for i in range(len(columns)) for k in weather_resample.PARTIALS]
+    bucket = array('q')
+    buffers = {f: array('d') for f in fields}
+    for row in collection.aggregate(pipeline, allowDiskUse=True):
+        bucket.append(int(row['_id']))
+        for f in fields:
+            buffers[f].append(number(row.get(f)))
+
+    out = {'bucket': np.frombuffer(bucket, dtype=np.int64) if len(bucket) else np.empty(0, dtype=np.int64),
+           'width': weather_resample.window_seconds(window)}
+    for i, c in enumerate(columns):
+        p = {}
+        for k in weather_resample.PARTIALS:
+            col = buffers['c%d_%s' % (i, k)]
+            p[k] = np.frombuffer(col, dtype=np.float64) if len(col) else np.empty(0)
+        p['count'] = p['count'].astype(np.int64)
+        out[c] = p
+    return out
+
+
+### Server side resample: returns {(window, stat): DataFrame}, as weather_resample.resample()
+def resample(collection, start_ts, end_ts, columns, windows=('1H', '3H', '1D'), stats=('mean', 'min', 'max'), station=None):
+    windows = sorted(windows, key=weather_resample.window_seconds)
+    p = bucket_partials(collection, columns, windows[0], start_ts, end_ts, station)
+    tables = {windows[0]: p}
+    for w in windows[1:]:
+        tables[w] = weather_resample.rollup(p, w)
+    return {(w, stat): weather_resample.to_frame(tables[w], stat, columns) for w in windows for stat in stats}
+
+
+### Raw resolution reads: decode the cursor in BSON batches straight into typed column buffers
+### projection limits documents to the requested fields, no per document json round trip
+def read_columns(collection, start_ts=None, end_ts=None, columns=('tempC', 'h', 'LDR', 'p'), station=None, batch_size=10000):
+    match = match_filter(start_ts, end_ts, station)
+    projection = dict.fromkeys(columns, 1)
+    projection['ts'] = 1
+    projection['_id'] = 0
+
+    ts = array('q')
+    buffers = [array('d') for _ in columns]
+
+    def append(docs):
+        for d in docs:
+            t = d.get('ts')
+            if not isinstance(t, (int, float)) or isinstance(t, bool) or t != t:
+                continue
+            ts.append(int(t))
+            for c, buf in zip(columns, buffers):
+                buf.append(number(d.get(c)))
+
+    try:
+        cursor = collection.find_raw_batches(match, projection, sort=[('ts', 1)], batch_size=batch_size)
+    except (AttributeError, NotImplementedError):
+        ### ie mongomock, no raw batch support
+        cursor = None
+    if cursor is not None:
+        for batch in cursor:
+            append(bson.decode_all(batch))
+    else:
+        docs = []
+        for d in collection.find(match, projection, sort=[('ts', 1)]):
+            docs.append(d)
+            if len(docs) >= batch_size:
+                append(docs)
+                docs = []
+        append(docs)
+
+    out = {'ts': np.frombuffer(ts, dtype=np.int64) if len(ts) else np.empty(0, dtype=np.int64)}
+    for c, buf in zip(columns, buffers):
+        out[c] = np.frombuffer(buf, dtype=np.float64) if len(buf) else np.empty(0)
+    return out
+
+
+def read_frame(collection, start_ts=None, end_ts=None, columns=('tempC', 'h', 'LDR', 'p'), station=None):
+    return pd.DataFrame(read_columns(collection, start_ts, end_ts, columns, station))
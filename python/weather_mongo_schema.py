@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+#
+# Weather Mongo DB Schema Bootstrap & Downsampling
+#
+# Indexes for the raw sensor collection (sensorData):
+#
+#    ts_1             latest reading (find_one sort ts desc) & ts range scans, single station
+#    station_1_ts_1   ts range scans per station (weather_ingest.py tags documents with station)
+#    dt_1  (TTL)      opt in (expire_days), raw samples expire after expire_days, dt is a BSON date copy of ts
+#
+# Closed hourly buckets are downsampled server side ($group + $merge) into a rollup collection
+# (sensorData_1H) holding bucket partials (count, sum, sumsq, min, max) per column, keyed by {station, ts},
+# each station from its own last rolled up bucket. resample() reads closed buckets from the rollup &
+# only the rest from raw samples, so long range history survives a raw TTL.
+#
+# Raw samples never expire by default. A TTL is only safe with downsample() scheduled (cron, or
+# --interval) at well under the TTL, and long range readers going through resample() / rollup_partials().
+#
+# Documents need a 'dt' date field for the TTL index, prepare(doc) adds it at write time
+# (BulkWriter(collection, prepare=weather_mongo_schema.prepare)), --migrate backfills older documents.
+#
+# Usage:
+#    python weather_mongo_schema.py --migrate                           # one off: backfill dt, indexes, downsample history
+#    python weather_mongo_schema.py --downsample                        # cron (ie hourly): fold newly closed buckets
+#    python weather_mongo_schema.py --downsample --interval 3600 --expire-days 90   # service: downsample hourly, raw TTL
+#
+
+import time
+import argparse
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+import pymongo
+
+import weather_resample
+import weather_mongo_query
+
+
+DEFAULT_COLUMNS = ['p', 'tempC', 'h', 'LDR']
+### None: leave any TTL index as is, 0: remove it
+DEFAULT_EXPIRE_DAYS = None
+DEFAULT_WINDOW = '1H'
+
+
+def rollup_name(name, window=DEFAULT_WINDOW):
+    return name + '_' + window
+
+
+### Add a BSON date copy of ts (TTL index field), returns doc
+### called on the MQTT thread for every message: a non numeric / out of range ts leaves the document without dt
+def prepare(doc):
+    ts = doc.get('ts')
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool) and 'dt' not in doc:
+        try:
+            doc['dt'] = datetime.fromtimestamp(ts, timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            pass
+    return doc
+
+
+### Create (idempotent) raw & rollup collection indexes
+def ensure_indexes(db, name='sensorData', expire_days=DEFAULT_EXPIRE_DAYS, window=DEFAULT_WINDOW):
+    raw = db[name]
+    raw.create_index([('ts', pymongo.ASCENDING)], name='ts_1')
+    raw.create_index([('station', pymongo.ASCENDING), ('ts', pymongo.ASCENDING)], name='station_1_ts_1')
+    if expire_days is not None:
+        ensure_ttl(raw, expire_days)
+
+    rollup = db[rollup_name(name, window)]
+    rollup.create_index([('ts', pymongo.ASCENDING)], name='ts_1')
+    rollup.create_index([('station', pymongo.ASCENDING), ('ts', pymongo.ASCENDING)], name='station_1_ts_1')
+    return raw, rollup
+
+
+### Set (or with expire_days 0 remove) the raw sample TTL, an existing TTL is changed in place (collMod)
+def ensure_ttl(raw, expire_days):
+    info = raw.index_information().get('dt_1')
+    if not expire_days:
+        if info is not None and 'expireAfterSeconds' in info:
+            raw.drop_index('dt_1')
+        return
+    seconds = int(expire_days * 86400)
+    if info is None:
+        raw.create_index([('dt', pymongo.ASCENDING)], name='dt_1', expireAfterSeconds=seconds)
+    elif 'expireAfterSeconds' not in info:
+        ### plain dt index, recreate as TTL
+        raw.drop_index('dt_1')
+        raw.create_index([('dt', pymongo.ASCENDING)], name='dt_1', expireAfterSeconds=seconds)
+    elif info['expireAfterSeconds'] != seconds:
+        raw.database.command({'collMod': raw.name, 'index': {'keyPattern': {'dt': 1}, 'expireAfterSeconds': seconds}})
+
+
+### Query filter on ts range & station, station None matches documents without a station
+def station_filter(station, start_ts=None, end_ts=None):
+    match = weather_mongo_query.match_filter(start_ts, end_ts)
+    match['station'] = station
+    return match
+
+
+### Last rollup bucket per station, {station: ts}
+def last_buckets(rollup):
+    return {row['_id']: row['ts'] for row in rollup.aggregate([{'$group': {'_id': '$station', 'ts': {'$max': '$ts'}}}])}
+
+
+### Stations (None for documents without one) in the raw & rollup collections
+def stations(db, name='sensorData', window=DEFAULT_WINDOW):
+    found = {None}
+    found.update(db[name].distinct('station'))
+    found.update(db[rollup_name(name, window)].distinct('station'))
+    return found
+
+
+### Aggregation pipeline: per (station, bucket) partials, merged into the rollup collection
+def downsample_pipeline(columns, window, match, target):
+    width = weather_resample.window_seconds(window)
+    bucket = {'$subtract': ['$ts', {'$mod': ['$ts', width]}]}
+    group = weather_mongo_query.group_partials({'_id': {'station': '$station', 'ts': bucket}}, columns)
+    project = {'_id': 1, 'station': '$_id.station', 'ts': '$_id.ts', 'width': {'$literal': width}}
+    for i, c in enumerate(columns):
+        project[c] = {k: '$c%d_%s' % (i, k) for k in weather_resample.PARTIALS}
+
+    return [
+        {'$match': match},
+        {'$group': group},
+        {'$project': project},
+        {'$merge': {'into': target, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+### Fold closed buckets since each station's last rollup bucket into the rollup collection
+### the last stored bucket is recomputed (may have been partial), the open bucket is skipped
+### returns {station: (start_ts, end_ts)} of the ranges downsampled
+def downsample(db, name='sensorData', columns=DEFAULT_COLUMNS, window=DEFAULT_WINDOW, now=None):
+    width = weather_resample.window_seconds(window)
+    target = rollup_name(name, window)
+    last = last_buckets(db[target])
+    now = int(time.time() if now is None else now)
+    end_ts = now - now % width - 1
+    done = {}
+    for station in stations(db, name, window):
+        start_ts = last.get(station)
+        if start_ts is not None and start_ts > end_ts:
+            continue
+        match = station_filter(station, start_ts, end_ts)
+        db[name].aggregate(downsample_pipeline(columns, window, match, target), allowDiskUse=True)
+        done[station] = (start_ts, end_ts)
+    return done
+
+
+### Read rollup buckets (all stations summed, unless station or a match filter given) as weather_resample partials
+def rollup_partials(collection, columns=DEFAULT_COLUMNS, start_ts=None, end_ts=None, station=None, match=None):
+    group = {'_id': '$ts', 'width': {'$first': '$width'}}
+    for c in columns:
+        group[c + '_count'] = {'$sum': '$' + c + '.count'}
+        group[c + '_sum'] = {'$sum': '$' + c + '.sum'}
+        group[c + '_sumsq'] = {'$sum': '$' + c + '.sumsq'}
+        group[c + '_min'] = {'$min': '$' + c + '.min'}
+        group[c + '_max'] = {'$max': '$' + c + '.max'}
+    pipeline = [
+        {'$match': weather_mongo_query.match_filter(start_ts, end_ts, station) if match is None else match},
+        {'$group': group},
+        {'$sort': {'_id': 1}},
+    ]
+
+    fields = [c + '_' + k for c in columns for k in weather_resample.PARTIALS]
+    bucket = array('q')
+    buffers = {f: array('d') for f in fields}
+    width = None
+    for row in collection.aggregate(pipeline, allowDiskUse=True):
+        bucket.append(int(row['_id']))
+        width = row['width']
+        for f in fields:
+            buffers[f].append(weather_mongo_query.number(row.get(f)))
+
+    if width is None:
+        out = {'bucket': np.empty(0, dtype=np.int64), 'width': weather_resample.window_seconds(DEFAULT_WINDOW)}
+        out.update({c: weather_resample.empty_partial() for c in columns})
+        return out
+    out = {'bucket': np.frombuffer(bucket, dtype=np.int64), 'width': int(width)}
+    for c in columns:
+        p = {k: np.frombuffer(buffers[c + '_' + k], dtype=np.float64) for k in weather_resample.PARTIALS}
+        p['count'] = p['count'].astype(np.int64)
+        out[c] = p
+    return out
+
+
+### Partials at the rollup window over [start_ts, end_ts]: whole buckets before each station's last rollup
+### bucket from the rollup, the rest (range edges, the possibly partial last bucket & later) from raw samples
+def history_partials(db, name='sensorData', columns=DEFAULT_COLUMNS, start_ts=None, end_ts=None, window=DEFAULT_WINDOW):
+    width = weather_resample.window_seconds(window)
+    rollup = db[rollup_name(name, window)]
+    last = last_buckets(rollup)
+    out = None
+
+    def raw(station, start, end):
+        if start is None or end is None or start <= end:
+            match = station_filter(station, start, end)
+            return weather_mongo_query.bucket_partials(db[name], columns, window, match=match)
+        return None
+
+    for station in stations(db, name, window):
+        boundary = last.get(station)
+        ### first & last rollup bucket wholly within [start_ts, end_ts] & before the last (partial) rollup bucket
+        lo = None if start_ts is None else -(-start_ts // width) * width
+        hi = None if boundary is None else int(boundary) - width
+        if end_ts is not None and hi is not None:
+            hi = min(hi, (end_ts + 1) // width * width - width)
+        if hi is None or (lo is not None and lo > hi):
+            out = weather_resample.merge(out, raw(station, start_ts, end_ts))
+            continue
+        out = weather_resample.merge(out, rollup_partials(rollup, columns, match=station_filter(station, lo, hi)))
+        if lo is not None:
+            out = weather_resample.merge(out, raw(station, start_ts, lo - 1))
+        out = weather_resample.merge(out, raw(station, hi + width, end_ts))
+    return out
+
+
+### Resample via the rollup: returns {(window, stat): DataFrame}, as weather_mongo_query.resample()
+### windows must be multiples of the rollup window
+def resample(db, start_ts, end_ts, columns, windows=('1H', '3H', '1D'), stats=('mean', 'min', 'max'), name='sensorData', window=DEFAULT_WINDOW):
+    windows = sorted(windows, key=weather_resample.window_seconds)
+    p = history_partials(db, name, columns, start_ts, end_ts, window)
+    tables = {w: weather_resample.rollup(p, w) for w in windows}
+    return {(w, stat): weather_resample.to_frame(tables[w], stat, columns) for w in windows for stat in stats}
+
+
+### One off migration of an existing raw collection: backfill dt, create indexes, downsample history
+def migrate(db, name='sensorData', columns=DEFAULT_COLUMNS, expire_days=DEFAULT_EXPIRE_DAYS, window=DEFAULT_WINDOW):
+    ### downsample first, the TTL index may expire old samples as soon as dt exists
+    db[rollup_name(name, window)].delete_many({})
+    downsample(db, name, columns, window)
+    res = db[name].update_many(
+        {'dt': {'$exists': False}, 'ts': {'$type': 'number'}},
+        [{'$set': {'dt': {'$toDate': {'$multiply': [{'$toLong': '$ts'}, 1000]}}}}])
+    ensure_indexes(db, name, expire_days, window)
+    return res.modified_count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Weather Mongo DB schema bootstrap & downsampling")
+    parser.add_argument('--mongo', default="mongodb://localhost:27017/")
+    parser.add_argument('--db', default="weather")
+    parser.add_argument('--collection', default="sensorData")
+    parser.add_argument('--expire-days', type=float, default=DEFAULT_EXPIRE_DAYS,
+                        help="raw sample TTL (days), 0 removes the TTL, requires --downsample (cron or --interval)")
+    parser.add_argument('--column', action='append', help="metric column to downsample, repeatable")
+    parser.add_argument('--migrate', action='store_true', help="backfill dt on existing documents & downsample history")
+    parser.add_argument('--downsample', action='store_true', help="fold newly closed buckets into the rollup collection")
+    parser.add_argument('--interval', type=float, help="with --downsample, repeat every interval seconds")
+    args = parser.parse_args()
+    columns = args.column or DEFAULT_COLUMNS
+    if args.expire_days and not args.downsample:
+        parser.error("--expire-days: raw samples would expire without being downsampled, schedule --downsample")
+
+    db = pymongo.MongoClient(args.mongo)[args.db]
+    if args.migrate:
+        n = migrate(db, args.collection, columns, args.expire_days)
+        print("Migrated: " + str(n) + " documents")
+    else:
+        ensure_indexes(db, args.collection, args.expire_days)
+    while args.downsample:
+        for station, (start_ts, end_ts) in downsample(db, args.collection, columns).items():
+            print("Downsampled: " + str(station) + " " + str(start_ts) + " - " + str(end_ts))
+        if not args.interval:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,157 @@
+#
+# Buffered MongoDB Bulk Writer
+#
+# Collects sensor documents from any thread (ie paho MQTT network thread) into a bounded queue,
+# a background worker flushes them with unordered insert_many() when batch_size documents are
+# buffered or flush_interval seconds have passed, whichever comes first.
+#
+# When the queue is full put() blocks for up to put_timeout seconds in total per call (backpressure),
+# then drops the remaining documents & counts them rather than stalling the caller (ie the paho
+# network thread, keepalives) for a timeout per document.
+#
+# An optional prepare(doc) callable is applied to each document as it is queued
+# (ie weather_mongo_schema.prepare adds the TTL date field), if it raises the document is queued as is.
+#
+# inserted / dropped / errors counters are updated from the worker & caller threads under a lock,
+# read them together with stats().
+#
+# Usage:
+#    writer = BulkWriter(mydb["sensorData"])
+#    writer.start()
+#    writer.put(json.loads(msg.payload))   # dict or list of dicts
+#    writer.stats()                        # {'inserted': n, 'dropped': n, 'errors': n, 'queued': n}
+#    writer.close()                        # flush remaining & stop
+#
+
+import time
+import queue
+import logging
+import threading
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+
+### queued by close() to wake the worker, not a document
+_WAKE = object()
+
+class BulkWriter:
+
+    def __init__(self, collection, batch_size=500, flush_interval=2.0, max_queue=10000, put_timeout=1.0, retries=3, prepare=None):
+        self.collection = collection
+        self.prepare = prepare
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.inserted = 0
+        self.dropped = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="BulkWriter", daemon=True)
+        self._thread.start()
+        return self
+
+    ### Queue a document or list of documents, returns number queued
+    ### blocks for at most put_timeout seconds per call while the queue is full
+    def put(self, docs):
+        if isinstance(docs, dict):
+            docs = [docs]
+        deadline = time.monotonic() + self.put_timeout
+        n = 0
+        full = 0
+        for doc in docs:
+            if not isinstance(doc, dict):
+                continue
+            if self.prepare is not None:
+                try:
+                    doc = self.prepare(doc)
+                except Exception as e:
+                    logging.warning("BulkWriter prepare failed, document queued as is: %s", e)
+            try:
+                if full:
+                    self.queue.put_nowait(doc)
+                else:
+                    self.queue.put(doc, timeout=max(deadline - time.monotonic(), 0))
+                n += 1
+            except queue.Full:
+                full += 1
+        if full:
+            dropped = self._count(dropped=full)
+            logging.warning("BulkWriter queue full, %d documents dropped (dropped: %d)", full, dropped)
+        return n
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    ### Add to the counters, returns the dropped total
+    def _count(self, inserted=0, dropped=0, errors=0):
+        with self._lock:
+            self.inserted += inserted
+            self.dropped += dropped
+            self.errors += errors
+            return self.dropped
+
+    ### Consistent snapshot of the counters
+    def stats(self):
+        with self._lock:
+            stats = {'inserted': self.inserted, 'dropped': self.dropped, 'errors': self.errors}
+        stats['queued'] = self.queue.qsize()
+        return stats
+
+    ### Flush remaining documents & stop worker
+    def close(self, timeout=None):
+        self._stop.set()
+        try:
+            self.queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=max(remaining, 0.01)))
+                ### drain whatever else is already queued, up to batch size
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stopping = self._stop.is_set()
+            if stopping:
+                batch = [d for d in batch if d is not _WAKE]
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline or stopping:
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+                if stopping and self.queue.empty():
+                    return
+
+    def _flush(self, batch):
+        for attempt in range(self.retries):
+            try:
+                res = self.collection.insert_many(batch, ordered=False)
+                self._count(inserted=len(res.inserted_ids))
+                return
+            except BulkWriteError as e:
+                ### unordered: valid documents are written, report the failed ones (ie duplicate keys)
+                details = e.details
+                self._count(inserted=details.get('nInserted', 0), errors=len(details.get('writeErrors', [])))
+                logging.error("BulkWriter write errors: %d", len(details.get('writeErrors', [])))
+                return
+            except PyMongoError as e:
+                logging.error("BulkWriter insert_many failed (attempt %d): %s", attempt + 1, e)
+                time.sleep(min(2 ** attempt, 10))
+        self._count(dropped=len(batch))
+        logging.error("BulkWriter batch of %d documents dropped", len(batch))
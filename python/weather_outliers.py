@@ -0,0 +1,152 @@
+#
+# Weather Sensor Outlier Rejection
+#
+# Configurable outlier filter run over numpy column arrays in fixed size chunks, in one pass per column:
+#
+#  - bounds:  per sensor (low, high) limits, exclusive, None for open ended ie {'t': (None, 50)}
+#  - spike:   per sensor max step, a sample differing from both neighbours by more than the step
+#             in the same direction is rejected (ie the 97435.39 C temperature readings)
+#  - zscore:  rolling (trailing window) z-score threshold
+#  - mad:     rolling median absolute deviation (Hampel) threshold, modified z-score 0.6745 * (x - median) / MAD
+#             over a centred window (pandas rolling median), MAD is floored at the sensor resolution
+#             (resolution {'t': 0.1}, else the decimal step readings are quantized to) as quantized readings
+#             of a steady sensor otherwise give MAD ~ 0 & flag every normal step
+#
+# Checks run in that order; samples rejected by an earlier check are excluded from later checks' neighbours &
+# rolling stats (a check's own rejections are not, so results don't depend on chunk_size).
+# Returns a keep mask per column & per check rejection counts.
+#
+# STATION is the configuration weather.py runs for the station sensors (weather_bench.py times the same):
+#
+# Usage:
+#    f = weather_outliers.OutlierFilter(bounds={'p': (96000, 109000)}, spike={'t': 5.0}, mad=3.5)
+#    masks, counts = f.apply({'p': df['p'].to_numpy(), 't': df['t'].to_numpy()})
+#
+#    f = weather_outliers.OutlierFilter(**weather_outliers.STATION)
+#
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+CHECKS = ['missing', 'bounds', 'spike', 'zscore', 'mad']
+
+### station sensors: threshold bounds & spike detector
+### a rolling MAD (Hampel) check is available, mad=6.0, resolution={'t': 0.1, 'h': 1, 'p': 1}
+STATION = {
+    'bounds': {'t': (None, 50), 'h': (None, 100), 'p': (96000, 109000)},
+    'spike': {'t': 5.0, 'h': 20.0, 'p': 300.0},
+}
+
+
+class OutlierFilter:
+
+    def __init__(self, bounds=None, spike=None, zscore=None, mad=None, window=121, chunk_size=16384, resolution=None):
+        self.bounds = bounds or {}
+        self.spike = spike or {}
+        self.zscore = zscore
+        self.mad = mad
+        self.resolution = resolution or {}
+        self.window = window
+        self.chunk_size = chunk_size
+
+    ### Filter one column, returns (keep mask, {check: rejected count})
+    def filter_column(self, name, x):
+        x = np.asarray(x, dtype=np.float64)
+        n = len(x)
+        keep = ~np.isnan(x)
+        counts = dict.fromkeys(CHECKS, 0)
+        counts['missing'] = int(n - keep.sum())
+
+        lo, hi = self.bounds.get(name, (None, None))
+        if lo is not None or hi is not None:
+            ok = keep.copy()
+            with np.errstate(invalid='ignore'):
+                if lo is not None:
+                    ok &= x > lo
+                if hi is not None:
+                    ok &= x < hi
+            counts['bounds'] = int(keep.sum() - ok.sum())
+            keep = ok
+
+        step = self.spike.get(name)
+        rolling = self.zscore is not None
+        if step is not None or rolling:
+            self._chunked(x, keep, counts, step)
+        if self.mad is not None:
+            self._hampel(name, x, keep, counts)
+        return keep, counts
+
+    ### spike & z-score checks in fixed size chunks, updates keep & counts in place
+    def _chunked(self, x, keep, counts, step):
+        n = len(x)
+        rolling = self.zscore is not None
+
+        ### padded copy: window - 1 leading NaN so every sample has a full trailing window, 1 trailing NaN for next neighbour
+        ### each check reads the samples kept by the earlier checks only (not its own rejections), so masks
+        ### don't depend on chunk boundaries: spikes compare against yp (after bounds), z-scores against
+        ### zp (after bounds & spikes)
+        w = self.window
+        yp = np.full(n + w, np.nan)
+        yp[w - 1:w - 1 + n] = np.where(keep, x, np.nan)
+        zp = yp.copy() if step is not None and rolling else yp
+
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for s in range(0, n, self.chunk_size):
+                e = min(s + self.chunk_size, n)
+                y = yp[s + w - 1:e + w - 1]
+                k = keep[s:e]
+
+                if step is not None:
+                    d1 = y - yp[s + w - 2:e + w - 2]
+                    d2 = y - yp[s + w:e + w]
+                    spike = (np.abs(d1) > step) & (np.abs(d2) > step) & (np.sign(d1) == np.sign(d2)) & k
+                    counts['spike'] += int(spike.sum())
+                    k &= ~spike
+                    zp[s + w - 1:e + w - 1][spike] = np.nan
+
+                if rolling:
+                    win = sliding_window_view(zp[s:e + w - 1], w)
+                    z = (zp[s + w - 1:e + w - 1] - np.nanmean(win, axis=1)) / np.nanstd(win, axis=1)
+                    bad = (np.abs(z) > self.zscore) & k
+                    counts['zscore'] += int(bad.sum())
+                    k &= ~bad
+
+    ### Hampel check over a centred window, rolling medians (O(log window) per sample)
+    ### MAD approximated as the rolling median of |x - rolling median|
+    def _hampel(self, name, x, keep, counts):
+        y = pd.Series(np.where(keep, x, np.nan))
+        w = self.window
+        min_periods = w // 4 + 1
+        med = y.rolling(w, center=True, min_periods=min_periods).median()
+        mad = (y - med).abs().rolling(w, center=True, min_periods=min_periods).median()
+        mad = np.maximum(mad.to_numpy(), self._resolution(name, y.to_numpy()))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mz = 0.6745 * (y.to_numpy() - med.to_numpy()) / mad
+        bad = (np.abs(mz) > self.mad) & np.isfinite(mz) & keep
+        counts['mad'] += int(bad.sum())
+        keep &= ~bad
+
+    ### sensor resolution: configured, else the decimal step readings are quantized to (1, 0.1 ... 0.0001)
+    def _resolution(self, name, y):
+        if name in self.resolution:
+            return self.resolution[name]
+        y = y[~np.isnan(y)]
+        for k in range(5):
+            scaled = y * 10 ** k
+            if not len(y) or np.abs(scaled - np.round(scaled)).max() < 0.01:
+                return 10.0 ** -k
+        d = np.abs(np.diff(y))
+        d = d[d > 0]
+        return float(d.min()) if len(d) else 0.0
+
+    ### Filter {column: array}, returns ({column: keep mask}, {column: {check: rejected count}})
+    def apply(self, values):
+        masks, counts = {}, {}
+        for name, x in values.items():
+            masks[name], counts[name] = self.filter_column(name, x)
+        return masks, counts
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+#
+# Headless Chart Rendering
+#
+# Render mode for the analytics scripts (weather.py, python/weather.py, python/weather_mongo.py):
+# with WEATHER_RENDER=<dir> set, matplotlib uses the Agg backend & plt.show() writes each open figure
+# to <dir> as PNG (and / or SVG, WEATHER_RENDER_FORMAT=png,svg) instead of opening a window.
+#
+# Each chart is keyed by a hash of its plotted data (line / collection / patch coordinates, which covers
+# the data range), titles & labels, size and format. A chart whose hash is unchanged since the last run
+# is not re-rendered. Files are named <script>-<nn>-<title>.<hash>.<fmt>, manifest.json maps each chart
+# name to its current file, data range & hash.
+#
+# Scripts also check their inputs before reading any rows: unchanged(files, extra) keys the run on the
+# script & input files (path, mtime & size, as weather_cache.py) plus any extra values (ie today's date
+# for charts of the last n days, the newest document of a collection). If the key matches the last complete
+# run & all its charts are on disk the script exits without loading data or building figures.
+# Keys are kept in inputs.json, per script path.
+#
+# Without WEATHER_RENDER the scripts behave as before (interactive plt.show()).
+#
+# Usage:
+#    WEATHER_RENDER=../charts python weather.py                 # cron
+#
+#    if weather_render.unchanged(index.files, [date.today()]):
+#        sys.exit(0)
+#    python weather_render.py --serve ../charts --port 8000     # serve rendered charts & manifest.json
+#
+
+import os
+import re
+import sys
+import json
+import atexit
+import hashlib
+import argparse
+
+import numpy as np
+
+
+RENDER_ENV = 'WEATHER_RENDER'
+FORMAT_ENV = 'WEATHER_RENDER_FORMAT'
+MANIFEST = 'manifest.json'
+INPUTS = 'inputs.json'
+
+_cache = None
+
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')[:40]
+
+
+### Content hash of everything drawn on a figure, returns (hex digest, (xmin, xmax) or None)
+def figure_hash(fig):
+    h = hashlib.sha1()
+    h.update(np.asarray(fig.get_size_inches(), dtype=np.float64).tobytes())
+    h.update(str(fig.dpi).encode())
+    xmin, xmax = np.inf, -np.inf
+    for ax in fig.axes:
+        for text in (ax.get_title(), ax.get_xlabel(), ax.get_ylabel()):
+            h.update(text.encode() + b'\0')
+        legend = ax.get_legend()
+        if legend is not None:
+            for text in legend.get_texts():
+                h.update(text.get_text().encode() + b'\0')
+        for line in ax.get_lines():
+            xy = np.asarray(line.get_xydata(), dtype=np.float64)
+            h.update(xy.tobytes())
+            h.update(str((line.get_color(), line.get_linestyle(), line.get_marker(), line.get_linewidth())).encode())
+            if len(xy):
+                x = xy[:, 0][np.isfinite(xy[:, 0])]
+                if len(x):
+                    xmin, xmax = min(xmin, x.min()), max(xmax, x.max())
+        for coll in ax.collections:
+            h.update(np.asarray(coll.get_offsets(), dtype=np.float64).tobytes())
+            for path in coll.get_paths():
+                h.update(np.asarray(path.vertices, dtype=np.float64).tobytes())
+        for patch in ax.patches:
+            h.update(np.asarray(patch.get_extents().bounds, dtype=np.float64).tobytes())
+        h.update(np.asarray(ax.get_xlim() + ax.get_ylim(), dtype=np.float64).tobytes())
+    rng = (float(xmin), float(xmax)) if xmin <= xmax else None
+    return h.hexdigest(), rng
+
+
+class ChartCache:
+    """Output directory of rendered charts, skips charts whose content hash is unchanged."""
+
+    def __init__(self, outdir, prefix, formats=('png',), dpi=100):
+        self.outdir = outdir
+        self.prefix = prefix
+        self.formats = list(formats)
+        self.dpi = dpi
+        self.count = 0
+        self.rendered = 0
+        self.skipped = 0
+        ### input version of this run (unchanged()), charts saved
+        self.version = None
+        self.names = []
+        self.failed = False
+        self.skipped_run = False
+        self.script = os.path.abspath(sys.argv[0] or prefix)
+        os.makedirs(outdir, exist_ok=True)
+        self.manifest = self._read(MANIFEST)
+        self.inputs = self._read(INPUTS)
+
+    def _read(self, filename):
+        try:
+            with open(os.path.join(self.outdir, filename)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write(self, filename, data):
+        tmp = os.path.join(self.outdir, filename + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, os.path.join(self.outdir, filename))
+
+    ### True if the last complete run of this script had the same input version & its charts are on disk
+    def unchanged(self, version):
+        self.version = version
+        last = self.inputs.get(self.script)
+        if last is None or last.get('version') != version:
+            return False
+        for name in last.get('charts', []):
+            entry = self.manifest.get(name)
+            if entry is None or not all(os.path.exists(os.path.join(self.outdir, f)) for f in entry['files'].values()):
+                return False
+        return True
+
+    def save(self, fig):
+        self.count += 1
+        title = next((ax.get_title() for ax in fig.axes if ax.get_title()), '')
+        name = "%s-%02d" % (self.prefix, self.count) + ('-' + _slug(title) if title else '')
+        digest, rng = figure_hash(fig)
+        self.names.append(name)
+
+        entry = self.manifest.get(name)
+        files = {fmt: "%s.%s.%s" % (name, digest[:16], fmt) for fmt in self.formats}
+        if entry is not None and entry.get('hash') == digest and \
+                all(os.path.exists(os.path.join(self.outdir, f)) for f in files.values()):
+            self.skipped += 1
+            return name
+
+        for fmt, filename in files.items():
+            tmp = os.path.join(self.outdir, filename + ".tmp")
+            fig.savefig(tmp, format=fmt, dpi=self.dpi)
+            os.replace(tmp, os.path.join(self.outdir, filename))
+        ### remove superseded renders of this chart
+        if entry is not None:
+            for filename in entry.get('files', {}).values():
+                if filename not in files.values():
+                    try:
+                        os.remove(os.path.join(self.outdir, filename))
+                    except OSError:
+                        pass
+        self.manifest[name] = {'hash': digest, 'range': rng, 'files': files}
+        self.rendered += 1
+        return name
+
+    def write_manifest(self):
+        self._write(MANIFEST, self.manifest)
+
+    ### Record the input version once the script has completed
+    def write_inputs(self):
+        if self.version is None or self.failed:
+            return
+        self.inputs[self.script] = {'version': self.version, 'charts': self.names}
+        self._write(INPUTS, self.inputs)
+
+
+### Version of a script run's inputs: the script & input files (path, mtime, size) & extra values
+def input_version(files=(), extra=()):
+    h = hashlib.sha1()
+    for f in [os.path.abspath(sys.argv[0])] + [os.path.abspath(f) for f in files]:
+        try:
+            st = os.stat(f)
+            h.update(("%s:%d:%d;" % (f, st.st_mtime_ns, st.st_size)).encode())
+        except OSError:
+            h.update(("%s:missing;" % f).encode())
+    for value in extra:
+        h.update((repr(value) + ';').encode())
+    return h.hexdigest()
+
+
+### Render mode: True if the inputs are unchanged since the last complete run (charts are current),
+### the script can exit before reading data or building figures. Always False in interactive mode.
+def unchanged(files=(), extra=()):
+    if _cache is None:
+        return False
+    if not _cache.unchanged(input_version(files, extra)):
+        return False
+    print("charts: inputs unchanged, %d charts current -> %s" % (len(_cache.inputs[_cache.script]['charts']), _cache.outdir),
+          file=sys.stderr)
+    _cache.skipped_run = True
+    return True
+
+
+### plt.show() replacement: save & close all open figures
+def _show(*args, **kwargs):
+    import matplotlib.pyplot as plt
+    for num in plt.get_fignums():
+        _cache.save(plt.figure(num))
+    plt.close('all')
+    _cache.write_manifest()
+
+
+def _finish():
+    if _cache.skipped_run:
+        return
+    _show()
+    _cache.write_inputs()
+    print("charts: %d rendered, %d unchanged -> %s" % (_cache.rendered, _cache.skipped, _cache.outdir), file=sys.stderr)
+
+
+### an uncaught exception leaves the charts incomplete, the next run must not be skipped
+def _excepthook(*args):
+    _cache.failed = True
+    _excepthook.previous(*args)
+
+
+### Enable render mode if WEATHER_RENDER (or outdir) is set, call before building figures
+### returns the ChartCache, or None (interactive mode)
+def setup(outdir=None, prefix=None, formats=None):
+    global _cache
+    outdir = outdir or os.environ.get(RENDER_ENV)
+    if not outdir:
+        return None
+    if _cache is not None:
+        return _cache
+    if formats is None:
+        formats = os.environ.get(FORMAT_ENV, 'png').split(',')
+    if prefix is None:
+        prefix = os.path.splitext(os.path.basename(sys.argv[0] or 'chart'))[0] or 'chart'
+
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    import matplotlib.pyplot as plt
+
+    _cache = ChartCache(outdir, prefix, formats)
+    plt.show = _show
+    _excepthook.previous = sys.excepthook
+    sys.excepthook = _excepthook
+    ### figures created after the last plt.show()
+    atexit.register(_finish)
+    return _cache
+
+
+def serve(outdir, host='127.0.0.1', port=8000):
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(SimpleHTTPRequestHandler):
+        def end_headers(self):
+            ### rendered files carry their content hash in the name, manifest changes each run
+            if self.path.rstrip('/').endswith(MANIFEST) or self.path.endswith('/'):
+                self.send_header('Cache-Control', 'no-cache')
+            else:
+                self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+            super().end_headers()
+
+    httpd = ThreadingHTTPServer((host, port), partial(Handler, directory=outdir))
+    print("serving charts from %s on http://%s:%d/" % (outdir, host, port))
+    httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve rendered weather charts")
+    parser.add_argument('--serve', required=True, help="chart directory (WEATHER_RENDER output)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    serve(args.serve, args.host, args.port)
@@ -0,0 +1,171 @@
+#
+# Weather Data Resampling - bucket partial aggregates
+#
+# Time series are reduced to per bucket partials (count, sum, sum of squares, min, max)
+# with a single sorted scan (numpy reduceat). Partials can be merged, so new samples fold
+# into existing buckets without revisiting old rows, and mean / std / min / max per bucket
+# are derived from the partials.
+#
+# resample() computes mean / min / max (/ std) for hourly, 3 hourly & daily windows in one pass:
+# raw rows are reduced to hourly partials once, 3 hour & daily values roll up from the hourly partials.
+#
+#    r = weather_resample.resample(df, ['p', 't', 'h', 'l'], ['1H', '3H', '1D'], ['mean', 'min', 'max'])
+#    df_hourly_mean = r['1H', 'mean']
+#
+
+import numpy as np
+import pandas as pd
+
+
+### bucket widths (seconds)
+WINDOWS = {'1H': 3600, '3H': 10800, '1D': 86400}
+
+PARTIALS = ['count', 'sum', 'sumsq', 'min', 'max']
+
+### non metric keys of a partials table
+META = ('bucket', 'width')
+
+
+def window_seconds(window):
+    return WINDOWS[window] if isinstance(window, str) else int(window)
+
+
+### Reduce (ts, {column: values}) to per bucket partials
+### returns {'bucket': int64 bucket start ts, 'width': seconds, column: {partial: array}}
+def partials(ts, values, window):
+    width = window_seconds(window)
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) and not np.all(ts[1:] >= ts[:-1]):
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+        values = {name: np.asarray(col)[order] for name, col in values.items()}
+
+    bucket = ts - ts % width
+    if len(bucket):
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    else:
+        starts = np.empty(0, dtype=np.intp)
+
+    out = {'bucket': bucket[starts], 'width': width}
+    for name, col in values.items():
+        col = np.asarray(col, dtype=np.float64)
+        valid = ~np.isnan(col)
+        filled = np.where(valid, col, 0.0)
+        if len(starts):
+            out[name] = {
+                'count': np.add.reduceat(valid.astype(np.int64), starts),
+                'sum': np.add.reduceat(filled, starts),
+                'sumsq': np.add.reduceat(filled * filled, starts),
+                'min': np.fmin.reduceat(col, starts),
+                'max': np.fmax.reduceat(col, starts),
+            }
+        else:
+            out[name] = empty_partial()
+    return out
+
+
+def empty_partial():
+    return {
+        'count': np.empty(0, dtype=np.int64),
+        'sum': np.empty(0),
+        'sumsq': np.empty(0),
+        'min': np.empty(0),
+        'max': np.empty(0),
+    }
+
+
+### Merge two partial tables of the same window, buckets present in both are combined
+def merge(a, b):
+    if a is None or not len(a['bucket']):
+        return b
+    if b is None or not len(b['bucket']):
+        return a
+    buckets = np.concatenate([a['bucket'], b['bucket']])
+    keys, inverse = np.unique(buckets, return_inverse=True)
+    out = {'bucket': keys, 'width': a['width']}
+    n = len(keys)
+    for name in a:
+        if name in META or name not in b:
+            continue
+        pa, pb = a[name], b[name]
+        m = {
+            'count': np.zeros(n, dtype=np.int64),
+            'sum': np.zeros(n),
+            'sumsq': np.zeros(n),
+            'min': np.full(n, np.nan),
+            'max': np.full(n, np.nan),
+        }
+        for k in ('count', 'sum', 'sumsq'):
+            np.add.at(m[k], inverse, np.concatenate([pa[k], pb[k]]))
+        np.fmin.at(m['min'], inverse, np.concatenate([pa['min'], pb['min']]))
+        np.fmax.at(m['max'], inverse, np.concatenate([pa['max'], pb['max']]))
+        out[name] = m
+    return out
+
+
+### Derive a statistic from partials: 'mean', 'std' (sample), 'min', 'max', 'count', 'sum'
+def finalize(p, column, stat):
+    c = p[column]
+    count = c['count'].astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if stat == 'mean':
+            return np.where(count > 0, c['sum'] / count, np.nan)
+        if stat == 'std':
+            var = (c['sumsq'] - c['sum'] * c['sum'] / count) / (count - 1)
+            return np.where(count > 1, np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return c[stat]
+
+
+def metric_columns(p):
+    return [k for k in p if k not in META]
+
+
+### Partials as a DataFrame indexed by bucket datetime, one column per metric
+### empty buckets are included as NaN rows (as DataFrame.resample())
+def to_frame(p, stat, columns=None):
+    if columns is None:
+        columns = metric_columns(p)
+    index = pd.to_datetime(p['bucket'], unit='s')
+    df = pd.DataFrame({c: finalize(p, c, stat) for c in columns}, index=index)
+    if len(df):
+        df = df.asfreq(pd.Timedelta(seconds=p['width']))
+    return df
+
+
+### Roll up partials to a coarser window (a multiple of the source width), ie hourly -> daily
+def rollup(p, window):
+    width = window_seconds(window)
+    if width % p['width']:
+        raise ValueError("window %ss is not a multiple of %ss" % (width, p['width']))
+    bucket = p['bucket'] - p['bucket'] % width
+    if len(bucket):
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    else:
+        starts = np.empty(0, dtype=np.intp)
+    out = {'bucket': bucket[starts], 'width': width}
+    for name in metric_columns(p):
+        c = p[name]
+        if not len(starts):
+            out[name] = empty_partial()
+            continue
+        out[name] = {
+            'count': np.add.reduceat(c['count'], starts),
+            'sum': np.add.reduceat(c['sum'], starts),
+            'sumsq': np.add.reduceat(c['sumsq'], starts),
+            'min': np.fmin.reduceat(c['min'], starts),
+            'max': np.fmax.reduceat(c['max'], starts),
+        }
+    return out
+
+
+### Compute every requested statistic for every requested window in one scan of the data
+### raw samples are reduced once at the finest window, coarser windows roll up from those partials
+### returns {(window, stat): DataFrame}, ie out['1H', 'mean'], as df[columns].resample('H').mean()
+def resample(df, columns, windows=('1H', '3H', '1D'), stats=('mean', 'min', 'max')):
+    windows = sorted(windows, key=window_seconds)
+    ts = df['ts'].to_numpy()
+    p = partials(ts, {c: df[c].to_numpy() for c in columns}, windows[0])
+    tables = {windows[0]: p}
+    for w in windows[1:]:
+        tables[w] = rollup(p, w)
+    return {(w, stat): to_frame(tables[w], stat, columns) for w in windows for stat in stats}
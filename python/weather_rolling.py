@@ -0,0 +1,201 @@
+#
+# Weather Data Rolling Window Statistics
+#
+# Streaming counterpart of the offline resampling in python/weather.py: each sample updates rolling
+# aggregates over time windows (default 1 minute, 1 hour, 3 hours) in O(1) amortized time per sample,
+# no history is re-scanned:
+#
+#    mean / std   running count, mean & sum of squared deviations (Welford), samples leaving the window
+#                 are removed with the inverse update
+#    min / max    monotonic deques, the front is the window min (max), each sample is pushed & popped once
+#    pct          change from the oldest sample in the window to the latest, signed as weather.py
+#                 pct_change() * sign(previous)
+#
+# Windows expire on sample time (record ts, or arrival time for records without one). A sample more than
+# max_ahead seconds ahead of the last accepted one (ie a corrupt ts) is rejected & counted, so one bad
+# record can't move the clock forward & expire every window; resync consecutive samples that agree on
+# the new time (the station was off for a while) are accepted & the clock follows them.
+#
+# Usage:
+#    stats = weather_rolling.RollingStats()
+#    stats.add_line('{"ts":1598918400,"tempC":19.5,"h":66,"LDR":549,"p":101325}')
+#    stats.snapshot()   # {'type': 'stats', 'ts': ..., 'windows': {'1m': {'t': {'n':, 'mean':, 'std':, ...}}}}
+#
+
+import math
+import time
+import logging
+from collections import deque
+
+import weather_log
+import weather_schema
+
+
+### name -> seconds
+DEFAULT_WINDOWS = {'1m': 60, '1h': 3600, '3h': 10800}
+
+
+### Parse a window list, ie "1m,1h,3h" -> {'1m': 60, '1h': 3600, '3h': 10800}
+def parse_windows(text):
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    windows = {}
+    for name in text.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name[-1] not in units or not name[:-1].isdigit():
+            raise ValueError("window: <n>s|m|h|d, got " + name)
+        windows[name] = int(name[:-1]) * units[name[-1]]
+    return windows
+
+
+class RollingWindow:
+    """Rolling count, mean, std, min, max & % change of one metric over the last seconds of samples."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()
+        self.mins = deque()
+        self.maxs = deque()
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.last = None
+
+    def add(self, ts, value):
+        self.expire(ts)
+        if value is None or math.isnan(value):
+            return
+        self.samples.append((ts, value))
+        self.last = value
+
+        ### Welford
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        self.mins.append((ts, value))
+        while self.maxs and self.maxs[-1][1] <= value:
+            self.maxs.pop()
+        self.maxs.append((ts, value))
+
+    ### Drop samples older than seconds before now
+    def expire(self, now):
+        cutoff = now - self.seconds
+        samples = self.samples
+        while samples and samples[0][0] <= cutoff:
+            _, value = samples.popleft()
+            self.n -= 1
+            if self.n == 0:
+                self.mean = self.m2 = 0.0
+                self.last = None
+                continue
+            ### inverse Welford update
+            delta = value - self.mean
+            self.mean -= delta / self.n
+            self.m2 = max(self.m2 - delta * (value - self.mean), 0.0)
+        while self.mins and self.mins[0][0] <= cutoff:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= cutoff:
+            self.maxs.popleft()
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else None
+
+    def pct(self):
+        if self.n < 2:
+            return None
+        first = self.samples[0][1]
+        return (self.last - first) / abs(first) if first else None
+
+    def stats(self):
+        if not self.n:
+            return {'n': 0, 'mean': None, 'std': None, 'min': None, 'max': None, 'pct': None}
+        return {
+            'n': self.n,
+            'mean': self.mean,
+            'std': self.std(),
+            'min': self.mins[0][1],
+            'max': self.maxs[0][1],
+            'pct': self.pct(),
+        }
+
+
+class RollingStats:
+    """Rolling windows for each metric of a sample stream, records in any weather_schema format."""
+
+    def __init__(self, windows=None, columns=('t', 'h', 'l', 'p'), max_ahead=3600, resync=3):
+        self.max_ahead = max_ahead
+        self.resync = resync
+        self.windows = dict(DEFAULT_WINDOWS if windows is None else windows)
+        self.columns = list(columns)
+        self.metrics = {c: {name: RollingWindow(s) for name, s in self.windows.items()} for c in self.columns}
+        ### rename map per record field set, resolved once
+        self._renames = {}
+        self.ts = None
+        self.count = 0
+        ### samples rejected as too far ahead of the clock
+        self.rejected = 0
+        ### run of samples ahead of the clock: last ts, length
+        self._ahead = None
+        self._ahead_n = 0
+
+    def _rename(self, keys):
+        keys = frozenset(keys)
+        rename = self._renames.get(keys)
+        if rename is None:
+            rename = self._renames[keys] = weather_schema.rename_map('auto', keys)
+        return rename
+
+    ### Add one record (dict), returns True if it held any tracked metric & was not rejected
+    def add(self, rec, now=None):
+        rename = self._rename(rec.keys())
+        values = {}
+        for k, v in rec.items():
+            name = rename.get(k, k)
+            if name in self.metrics and isinstance(v, (int, float)) and not isinstance(v, bool):
+                values[name] = float(v)
+        if not values:
+            return False
+        ts = rec.get('ts')
+        if not isinstance(ts, (int, float)) or isinstance(ts, bool):
+            ts = time.time() if now is None else now
+        if self.ts is not None and ts > self.ts + self.max_ahead:
+            if self._ahead is not None and 0 <= ts - self._ahead <= self.max_ahead:
+                self._ahead_n += 1
+            else:
+                self._ahead_n = 1
+            self._ahead = ts
+            if self._ahead_n < self.resync:
+                self.rejected += 1
+                logging.warning("rolling stats: ts %s is %ds ahead of %s, rejected (%d)",
+                                ts, ts - self.ts, self.ts, self.rejected)
+                return False
+        self._ahead = None
+        self._ahead_n = 0
+        ### clock never moves backwards, an out of order sample joins the latest time
+        if self.ts is not None and ts < self.ts:
+            ts = self.ts
+        self.ts = ts
+        for name, windows in self.metrics.items():
+            for w in windows.values():
+                w.add(ts, values.get(name))
+        self.count += 1
+        return True
+
+    ### Add the records of a log / serial line, returns True if any were added
+    def add_line(self, line, now=None):
+        added = False
+        for rec in weather_log.parse_line(line):
+            added = self.add(rec, now) or added
+        return added
+
+    def snapshot(self):
+        return {
+            'type': 'stats',
+            'ts': self.ts,
+            'windows': {name: {c: self.metrics[c][name].stats() for c in self.columns} for name in self.windows},
+        }
@@ -0,0 +1,60 @@
+#
+# Weather Sensor Record Schema Registry
+#
+# Station generations log the same metrics under different field names:
+#
+#    sd_v1        SD card logs & MQTT        {"ts","tempC","tempF","h","LDR","p","w"}
+#    station_v2   newer outdoor station      {"ts","t","h","l","p","t2","a","w","el","az","lat","lon","sr","ss","mn"}
+#    meteo_json   sensor.meteo.json          {"ts","temp","humidity","LDR"}
+#    sensor_csv   data/SENSOR.TXT (header)   ts,tempC,tempH,humidity,LDR
+#
+# A format is detected once per file from the field names of the first record (or the CSV header),
+# its rename map is resolved to canonical column names once per field, not per row (weather_log.ColumnBuffer).
+#
+# Canonical columns (newer station names):
+#    ts  unix timestamp     t   temperature (C)    tf  temperature (F)
+#    h   humidity (%)       l   light level (LDR)  p   pressure (pascals)
+# Other fields keep their source name.
+#
+#    rename = weather_schema.rename_map('auto', rec.keys())
+#
+
+### Registry: name -> (identifying fields, {source field: canonical column})
+### detection order matters, first schema whose identifying fields are all present wins
+SCHEMAS = {
+    'sd_v1': (('tempC', 'tempF'), {'tempC': 't', 'tempF': 'tf', 'LDR': 'l'}),
+    'sensor_csv': (('tempC', 'tempH', 'humidity'), {'tempC': 't', 'tempH': 'tf', 'humidity': 'h', 'LDR': 'l'}),
+    'meteo_json': (('temp', 'humidity'), {'temp': 't', 'humidity': 'h', 'LDR': 'l'}),
+    'station_v2': (('t',), {}),
+}
+
+CANONICAL = ['ts', 't', 'tf', 'h', 'l', 'p']
+
+
+### Add (or replace) a schema, checked before those already registered
+def register(name, keys, rename):
+    SCHEMAS.pop(name, None)
+    items = list(SCHEMAS.items())
+    SCHEMAS.clear()
+    SCHEMAS[name] = (tuple(keys), dict(rename))
+    SCHEMAS.update(items)
+
+
+### Name of the schema matching a record's field names, None if unknown
+def detect(keys):
+    keys = set(keys)
+    for name, (required, _) in SCHEMAS.items():
+        if keys.issuperset(required):
+            return name
+    return None
+
+
+### {source field: canonical column} for a schema name, 'auto' (detect from keys) or None (no renaming)
+def rename_map(schema='auto', keys=()):
+    if schema is None:
+        return {}
+    if schema == 'auto':
+        schema = detect(keys)
+        if schema is None:
+            return {}
+    return dict(SCHEMAS[schema][1])
@@ -0,0 +1,205 @@
+#
+# Weather Data Solar Position
+#
+# Solar elevation & azimuth for whole arrays of unix timestamps, sunrise & sunset per UTC day,
+# for a station lat / lon (NOAA solar calculator equations, vectorized with numpy).
+#
+# The newer station logs "el", "az", "sr", "ss" in every record (SolarPosition / sunMoon on the
+# microcontroller), these are derived from ts & the station location so can be dropped from the logs
+# & joined back during analysis:
+#
+#    solar = weather_solar.table(50.7192, -1.8808)       # Bournemouth 50.7192 N, 1.8808 W
+#    df['el'], df['az'] = solar.position(df['ts'])
+#    days = solar.sun_times(df['ts'])                     # DataFrame by date: sr, ss (UTC datetime)
+#    df['l_el'] = weather_solar.normalize_light(df['l'], df['el'])
+#
+# table() keeps one lookup table per location: elevation & azimuth every step seconds (interpolated)
+# & sunrise / sunset per day, extended as queries reach outside the days it covers (only the new days
+# are computed, from the query to the table's first / last day), optionally
+# saved to cache_dir (solar_<lat>_<lon>_<step>.npz) so later runs only compute new days.
+#
+# Angles are degrees: elevation above the horizon (geometric, no refraction), azimuth clockwise from north.
+# Sunrise / sunset are when the sun's upper limb crosses the horizon (zenith 90.833),
+# NaN for days without (polar day / night).
+#
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+SUNRISE_ZENITH = 90.833
+
+
+### Julian century, declination (deg) & equation of time (minutes) at unix ts
+def _sun(ts):
+    jc = (np.asarray(ts, dtype=np.float64) / 86400.0 + 2440587.5 - 2451545.0) / 36525.0
+    mean_long = np.radians((280.46646 + jc * (36000.76983 + jc * 0.0003032)) % 360)
+    mean_anom = np.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    ecc = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    center = (np.sin(mean_anom) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+              + np.sin(2 * mean_anom) * (0.019993 - 0.000101 * jc)
+              + np.sin(3 * mean_anom) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * jc)
+    app_long = np.radians(np.degrees(mean_long) + center - 0.00569 - 0.00478 * np.sin(omega))
+    obliq = np.radians(23 + (26 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60) / 60
+                       + 0.00256 * np.cos(omega))
+    decl = np.arcsin(np.sin(obliq) * np.sin(app_long))
+    y = np.tan(obliq / 2) ** 2
+    eot = 4 * np.degrees(y * np.sin(2 * mean_long) - 2 * ecc * np.sin(mean_anom)
+                         + 4 * ecc * y * np.sin(mean_anom) * np.cos(2 * mean_long)
+                         - 0.5 * y * y * np.sin(4 * mean_long) - 1.25 * ecc * ecc * np.sin(2 * mean_anom))
+    return decl, eot
+
+
+### Solar (elevation, azimuth) in degrees for an array of unix timestamps
+def position(ts, lat, lon):
+    ts = np.asarray(ts, dtype=np.float64)
+    decl, eot = _sun(ts)
+    ### true solar time (minutes) -> hour angle
+    tst = (ts % 86400) / 60.0 + eot + 4 * lon
+    ha = np.radians(tst / 4.0 - 180.0)
+    phi = np.radians(lat)
+    cos_zen = np.sin(phi) * np.sin(decl) + np.cos(phi) * np.cos(decl) * np.cos(ha)
+    elevation = 90.0 - np.degrees(np.arccos(np.clip(cos_zen, -1.0, 1.0)))
+    azimuth = (np.degrees(np.arctan2(np.sin(ha), np.cos(ha) * np.sin(phi) - np.tan(decl) * np.cos(phi))) + 180.0) % 360
+    return elevation, azimuth
+
+
+### Sunrise & sunset (unix ts, float) for each UTC day number (ts // 86400), NaN if the sun does not rise / set
+def sun_times(days, lat, lon):
+    days = np.asarray(days, dtype=np.float64)
+    phi = np.radians(lat)
+    noon = days * 86400 + (720 - 4 * lon) * 60
+    ### two passes: declination & equation of time at the estimated solar noon
+    for _ in range(2):
+        decl, eot = _sun(noon)
+        noon = days * 86400 + (720 - 4 * lon - eot) * 60
+    with np.errstate(invalid='ignore'):
+        ha = np.degrees(np.arccos(np.cos(np.radians(SUNRISE_ZENITH)) / (np.cos(phi) * np.cos(decl))
+                                  - np.tan(phi) * np.tan(decl)))
+    return noon - ha * 4 * 60, noon + ha * 4 * 60
+
+
+### Light level relative to a horizontal surface under the sun: l / sin(elevation), NaN below min_elevation
+def normalize_light(light, elevation, min_elevation=5.0):
+    light = np.asarray(light, dtype=np.float64)
+    elevation = np.asarray(elevation, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return np.where(elevation >= min_elevation, light / np.sin(np.radians(elevation)), np.nan)
+
+
+class SolarTable:
+    """Lookup table of solar position (every step seconds) & sunrise / sunset (per UTC day) for one location."""
+
+    def __init__(self, lat, lon, step=300, cache_dir=None):
+        self.lat = lat
+        self.lon = lon
+        self.step = step
+        self.cache_dir = cache_dir
+        self.first_day = 0
+        self.ndays = 0
+        self.load()
+
+    def filename(self):
+        return os.path.join(self.cache_dir, "solar_%.4f_%.4f_%d.npz" % (self.lat, self.lon, self.step))
+
+    def load(self):
+        if self.cache_dir is None:
+            return
+        try:
+            with np.load(self.filename()) as f:
+                self.first_day, self.ndays = int(f['first_day']), int(f['ndays'])
+                self.el, self.az_sin, self.az_cos = f['el'], f['az_sin'], f['az_cos']
+                self.sr, self.ss = f['sr'], f['ss']
+        except (IOError, KeyError, ValueError):
+            self.ndays = 0
+
+    def save(self):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.filename() + ".tmp.npz"
+        np.savez(tmp, first_day=self.first_day, ndays=self.ndays, el=self.el,
+                 az_sin=self.az_sin, az_cos=self.az_cos, sr=self.sr, ss=self.ss)
+        os.replace(tmp, self.filename())
+
+    ### Solar position on step second grid points from start, as stored in the table
+    def _grid(self, start, n):
+        el, az = position(start + np.arange(n, dtype=np.int64) * self.step, self.lat, self.lon)
+        az = np.radians(az)
+        return el.astype(np.float32), np.sin(az).astype(np.float32), np.cos(az).astype(np.float32)
+
+    ### Extend the table to cover the UTC days of ts, only days not yet in the table are computed
+    ### (from the requested range to the table, so the table stays one contiguous run of days)
+    def cover(self, ts):
+        ts = np.asarray(ts, dtype=np.int64)
+        if not len(ts):
+            return
+        lo, hi = int(ts.min() // 86400), int(ts.max() // 86400)
+        first, end = self.first_day, self.first_day + self.ndays
+        if self.ndays and first <= lo and hi < end:
+            return
+        per_day = 86400 // self.step
+        if not self.ndays or 86400 % self.step:
+            ### grid includes the end of the last day, for interpolation
+            self.el, self.az_sin, self.az_cos = self._grid(lo * 86400, (hi - lo + 1) * 86400 // self.step + 1)
+            self.sr, self.ss = sun_times(np.arange(lo, hi + 1), self.lat, self.lon)
+            self.first_day, self.ndays = lo, hi - lo + 1
+            self.save()
+            return
+
+        parts = [(self.el, self.az_sin, self.az_cos, self.sr, self.ss)]
+        if lo < first:
+            ### days lo .. first - 1, up to the first point of the table
+            parts.insert(0, self._grid(lo * 86400, (first - lo) * per_day)
+                         + sun_times(np.arange(lo, first), self.lat, self.lon))
+        if hi >= end:
+            ### days end .. hi, after the end point of the table
+            parts.append(self._grid(end * 86400 + self.step, (hi - end + 1) * per_day)
+                         + sun_times(np.arange(end, hi + 1), self.lat, self.lon))
+        self.el, self.az_sin, self.az_cos, self.sr, self.ss = (np.concatenate(a) for a in zip(*parts))
+        self.first_day = min(lo, first)
+        self.ndays = max(hi + 1, end) - self.first_day
+        self.save()
+
+    def _index(self, ts):
+        return (np.asarray(ts, dtype=np.float64) - self.first_day * 86400) / self.step
+
+    ### (elevation, azimuth) in degrees at ts, interpolated from the table
+    def position(self, ts):
+        ts = np.asarray(ts, dtype=np.int64)
+        self.cover(ts)
+        x = self._index(ts)
+        grid = np.arange(len(self.el))
+        el = np.interp(x, grid, self.el)
+        ### azimuth interpolated as a unit vector, no jump at north
+        az = np.degrees(np.arctan2(np.interp(x, grid, self.az_sin), np.interp(x, grid, self.az_cos))) % 360
+        return el, az
+
+    def elevation(self, ts):
+        return self.position(ts)[0]
+
+    ### Sunrise & sunset for each UTC day of ts, DataFrame indexed by date: sr, ss (datetime, UTC)
+    def sun_times(self, ts):
+        ts = np.asarray(ts, dtype=np.int64)
+        self.cover(ts)
+        days = np.unique(ts // 86400)
+        i = days - self.first_day
+        return pd.DataFrame({
+            'sr': pd.to_datetime(self.sr[i], unit='s').round('s'),
+            'ss': pd.to_datetime(self.ss[i], unit='s').round('s'),
+        }, index=pd.to_datetime(days * 86400, unit='s'))
+
+
+_tables = {}
+
+
+### Lookup table for a location, one per (lat, lon, step) per process
+def table(lat, lon, step=300, cache_dir=None):
+    key = (lat, lon, step)
+    t = _tables.get(key)
+    if t is None:
+        t = _tables[key] = SolarTable(lat, lon, step, cache_dir)
+    return t
@@ -0,0 +1,62 @@
+#
+# Weather Daily Metric Stats
+#
+# Compute daily Average, STD Deviation, Min, Max, Close (last) for any list of metric columns
+# as a single grouped aggregation over the concatenated data frame.
+#
+# Close is the value of the day's last row, NaN if that sample is missing (as df.p.iloc[-1]),
+# not the last non missing value (groupby 'last').
+#
+# Output is a long format table, one row per (metric, day):
+#    data      date      mean   std   min   max   last
+#    pressure  20200401  ...
+#
+
+import numpy as np
+import pandas as pd
+
+
+STAT_COLUMNS = ['data', 'date', 'mean', 'std', 'min', 'max', 'last']
+AGGREGATES = ['mean', 'std', 'min', 'max', 'last']
+### grouped aggregations, 'last' is taken by row position
+GROUPED = ['mean', 'std', 'min', 'max']
+
+SECONDS_PER_DAY = 86400
+
+
+### columns: list of metric column names, or dict {column: label} ie {'p': 'pressure'}
+### day: optional per row grouping key (ie source file date), defaults to UTC day of 'ts'
+def daily_stats(df, columns, day=None):
+    if isinstance(columns, dict):
+        labels = list(columns.values())
+        columns = list(columns.keys())
+    else:
+        labels = list(columns)
+
+    if day is None:
+        ts = df['ts'].to_numpy()
+        if not np.all(ts[1:] >= ts[:-1]):
+            df = df.iloc[np.argsort(ts, kind='stable')]
+            ts = df['ts'].to_numpy()
+        day = ts // SECONDS_PER_DAY
+        to_date = lambda keys: pd.to_datetime(keys * SECONDS_PER_DAY, unit='s').strftime('%Y%m%d')
+    else:
+        to_date = lambda keys: keys
+
+    if len(df) == 0:
+        return pd.DataFrame(columns=STAT_COLUMNS)
+
+    day = np.asarray(day)
+    agg = df[columns].groupby(day, sort=True).agg(GROUPED)
+    last_row = pd.Series(np.arange(len(df))).groupby(day, sort=True).max().to_numpy()
+    last = df[columns].to_numpy(dtype=np.float64)[last_row]
+
+    ### agg columns are ordered (metric, stat), reshape to one row per (day, metric)
+    n_days, n_cols = len(agg), len(columns)
+    values = np.concatenate([agg.to_numpy(dtype=np.float64).reshape(n_days, n_cols, len(GROUPED)),
+                             last[:, :, None]], axis=2).reshape(n_days * n_cols, len(AGGREGATES))
+
+    df_stat = pd.DataFrame(values, columns=AGGREGATES)
+    df_stat.insert(0, 'data', np.tile(np.asarray(labels, dtype=object), n_days))
+    df_stat.insert(1, 'date', np.repeat(np.asarray(to_date(agg.index.to_numpy()), dtype=object), n_cols))
+    return df_stat
@@ -0,0 +1,100 @@
+#
+# Barometric Pressure Tendency
+#
+# Run length encoding of the direction of change of a (3 hour mean) series, in one vectorized pass:
+#
+#    diff     change from previous bucket
+#    pct      1st derivative, signed % change: pct_change() * sign(previous)
+#    pct_2d   2nd derivative, rate of change: pct.pct_change() * sign(previous)
+#    rise     length of the current run of consecutive increases (0 if not rising)
+#    fall     length of the current run of consecutive decreases (0 if not falling)
+#    run_sum  total change over the current run (magnitude of the rise / fall so far)
+#
+# Tendency keeps the state of the last bucket so new (closed) 3 hour buckets can be appended
+# without recomputing the history:
+#
+#    t = weather_tendency.Tendency()
+#    df = t.update(df_p_3h_mean)          # history
+#    row = t.update(new_3h_mean_buckets)  # later, only new buckets
+#
+
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = ['diff', 'pct', 'pct_2d', 'rise', 'fall', 'run_sum']
+
+
+class Tendency:
+
+    def __init__(self):
+        ### previous value, previous pct, direction (-1, 0, 1), run length & run sum of the last bucket
+        self.prev = np.nan
+        self.prev_pct = np.nan
+        self.sign = 0
+        self.run = 0
+        self.run_sum = 0.0
+
+    ### Compute tendency for new buckets (array or Series), continuing from the last bucket seen
+    ### returns a DataFrame (index from Series, if given)
+    def update(self, values):
+        index = values.index if isinstance(values, pd.Series) else None
+        x = np.asarray(values, dtype=np.float64)
+        n = len(x)
+        if n == 0:
+            return pd.DataFrame(columns=COLUMNS, index=index)
+
+        prev = np.empty(n)
+        prev[0] = self.prev
+        prev[1:] = x[:-1]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            diff = x - prev
+            pct = diff / prev * np.sign(prev)
+            prev_pct = np.empty(n)
+            prev_pct[0] = self.prev_pct
+            prev_pct[1:] = pct[:-1]
+            pct_2d = (pct - prev_pct) / prev_pct * np.sign(prev)
+
+        sign = np.sign(np.nan_to_num(diff)).astype(np.int8)
+
+        ### run boundaries where direction changes
+        change = np.empty(n, dtype=bool)
+        change[0] = True
+        change[1:] = sign[1:] != sign[:-1]
+        starts = np.flatnonzero(change)
+        run_id = np.cumsum(change) - 1
+        run_start = starts[run_id]
+        length = np.arange(n) - run_start + 1
+
+        csum = np.cumsum(np.where(sign != 0, diff, 0.0))
+        run_sum = csum - np.where(run_start > 0, csum[run_start - 1], 0.0)
+
+        ### first run continues the run carried from the previous update
+        if self.sign != 0 and sign[0] == self.sign:
+            first = run_id == 0
+            length = np.where(first, length + self.run, length)
+            run_sum = np.where(first, run_sum + self.run_sum, run_sum)
+
+        length = np.where(sign != 0, length, 0)
+        run_sum = np.where(sign != 0, run_sum, 0.0)
+
+        self.prev = x[-1]
+        self.prev_pct = pct[-1]
+        self.sign = int(sign[-1])
+        self.run = int(length[-1])
+        self.run_sum = float(run_sum[-1])
+
+        return pd.DataFrame({
+            'diff': diff,
+            'pct': pct,
+            'pct_2d': pct_2d,
+            'rise': np.where(sign > 0, length, 0),
+            'fall': np.where(sign < 0, length, 0),
+            'run_sum': run_sum,
+        }, index=index)
+
+
+### Tendency of a whole series
+def tendency(values):
+    return Tendency().update(values)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Websocket broadcast layer for the state sync servers (wsClientSync.py, wsESP8266RotaryEncoderServo.py)
+#
+# publish(key, render) marks a message as changed; once per tick (interval seconds) render() is called
+# once & its frames written to all clients with websockets.broadcast() (no per user send task).
+# Rapid changes (ie rotary encoder bursts) between ticks coalesce into the latest state.
+#
+# render() returns {client kind: frame}, '*' for any kind, so browsers (JSON) & arduino clients (binary)
+# each get one frame in their own encoding.
+#
+# A client whose transport write buffer is above high_water is skipped for that tick & sent the latest
+# state on a later tick, so a slow client never holds back the others or grows an unbounded backlog.
+# A client skipped on more than max_dropped consecutive ticks (10s at the default tick) is disconnected.
+#
+
+import asyncio
+import logging
+import websockets
+
+
+class Broadcaster:
+
+    def __init__(self, interval=0.02, high_water=65536, max_dropped=500):
+        self.interval = interval
+        self.high_water = high_water
+        self.max_dropped = max_dropped
+        self.clients = {}
+        ### websocket -> consecutive ticks skipped while congested
+        self.lagging = {}
+        ### key -> (render, clients to send to, None for all)
+        self.pending = {}
+        self._handle = None
+
+    def add(self, websocket, kind='browser'):
+        self.clients[websocket] = kind
+
+    def remove(self, websocket):
+        self.clients.pop(websocket, None)
+        self.lagging.pop(websocket, None)
+
+    def __len__(self):
+        return len(self.clients)
+
+    def publish(self, key, render):
+        self.pending[key] = (render, None)
+        self._schedule()
+
+    def _schedule(self):
+        if self._handle is None:
+            self._handle = asyncio.get_event_loop().call_later(self.interval, self._flush)
+
+    def _congested(self, websocket):
+        transport = getattr(websocket, 'transport', None)
+        return transport is not None and transport.get_write_buffer_size() > self.high_water
+
+    def _flush(self):
+        self._handle = None
+        pending, self.pending = self.pending, {}
+        congested = set()
+        sent = set()
+        for key, (render, targets) in pending.items():
+            frames = render()
+            groups = {}
+            skipped = set()
+            for websocket, kind in self.clients.items():
+                if targets is not None and websocket not in targets:
+                    continue
+                if kind not in frames and '*' not in frames:
+                    continue
+                if self._congested(websocket):
+                    skipped.add(websocket)
+                else:
+                    groups.setdefault(kind, []).append(websocket)
+            for kind, group in groups.items():
+                websockets.broadcast(group, frames.get(kind, frames.get('*')))
+                sent.update(group)
+            if skipped:
+                ### retry latest state for slow clients next tick
+                self.pending.setdefault(key, (render, skipped))
+                congested |= skipped
+        for websocket in sent:
+            self.lagging.pop(websocket, None)
+        for websocket in congested:
+            self.lagging[websocket] = self.lagging.get(websocket, 0) + 1
+            if self.lagging[websocket] > self.max_dropped:
+                self._evict(websocket)
+        if self.pending:
+            self._schedule()
+
+
+    ### Persistently slow client: stop retrying & disconnect
+    def _evict(self, websocket):
+        logging.warning("client %s: congested for %d ticks, disconnecting",
+                        getattr(websocket, 'remote_address', None), self.lagging[websocket])
+        self.remove(websocket)
+        for key, (render, targets) in list(self.pending.items()):
+            if targets is not None:
+                targets.discard(websocket)
+                if not targets:
+                    del self.pending[key]
+        asyncio.ensure_future(websocket.close())
+
+
+### Handshake request headers, across websockets versions
+def request_headers(websocket):
+    request = getattr(websocket, 'request', None)
+    return request.headers if request is not None else getattr(websocket, 'request_headers', {})
+
+
+### Client kind from handshake headers: 'arduino' (arduino-WebSocket-Client) or 'browser'
+def client_kind(websocket):
+    headers = request_headers(websocket)
+    if headers.get('Sec-WebSocket-Protocol') == 'arduino' or 'arduino' in headers.get('User-Agent', ''):
+        return 'arduino'
+    return 'browser'
@@ -1,17 +1,22 @@
 #!/usr/bin/env python
 
 # WS server example that synchronizes state across clients
+#
+# State changes are coalesced & broadcast once per tick (wsBroadcast.py): browsers get the JSON
+# state event, arduino clients (ESP8266WebsocketClient) the value as a single byte binary frame.
 
 import asyncio
 import json
 import logging
 import websockets
 
+from wsBroadcast import Broadcaster, client_kind
+
 logging.basicConfig()
 
 STATE = {"value": 0}
 
-USERS = set()
+USERS = Broadcaster()
 
 
 def state_event():
@@ -22,34 +27,38 @@ def users_event():
     return json.dumps({"type": "users", "count": len(USERS)})
 
 
-async def notify_state():
-    if USERS:  # asyncio.wait doesn't accept an empty list
-        message = state_event()
-        my_bytes = bytearray()
-        my_bytes.append(STATE['value'])
-        await asyncio.wait([user.send(message) for user in USERS])
-        await asyncio.wait([user.send(my_bytes) for user in USERS])
+def state_frames():
+    return {
+        'browser': state_event(),
+        'arduino': bytes([min(max(STATE['value'], 0), 255)]),
+    }
+
+
+def users_frames():
+    return {'browser': users_event()}
 
 
-async def notify_users():
-    if USERS:  # asyncio.wait doesn't accept an empty list
-        message = users_event()
-        await asyncio.wait([user.send(message) for user in USERS])
+def notify_state():
+    USERS.publish('state', state_frames)
 
 
-async def register(websocket):
-    USERS.add(websocket)
-    await notify_users()
+def notify_users():
+    USERS.publish('users', users_frames)
 
 
-async def unregister(websocket):
+def register(websocket):
+    USERS.add(websocket, client_kind(websocket))
+    notify_users()
+
+
+def unregister(websocket):
     USERS.remove(websocket)
-    await notify_users()
+    notify_users()
 
 
-async def counter(websocket, path):
+async def counter(websocket, path=None):
     # register(websocket) sends user_event() to websocket
-    await register(websocket)
+    register(websocket)
     try:
         await websocket.send(state_event())
         async for message in websocket:
@@ -57,22 +66,25 @@ async def counter(websocket, path):
                 data = json.loads(message)
                 if data["action"] == "minus":
                     STATE["value"] -= 1
-                    await notify_state()
+                    notify_state()
                 elif data["action"] == "plus":
                     STATE["value"] += 1
-                    await notify_state()
+                    notify_state()
                 elif data["action"] == "set":
                     STATE["value"] = int(data["value"])
-                    await notify_state()
+                    notify_state()
                 else:
                     logging.error("unsupported event: {}", data)
             except Exception as e:
                 print(e);
     finally:
-        await unregister(websocket)
+        unregister(websocket)
+
 
+async def main():
+    async with websockets.serve(counter, "192.168.1.127", 6789):
+        await asyncio.Future()
 
-start_server = websockets.serve(counter, "192.168.1.127", 6789)
 
-asyncio.get_event_loop().run_until_complete(start_server)
-asyncio.get_event_loop().run_forever()
+if __name__ == '__main__':
+    asyncio.run(main())
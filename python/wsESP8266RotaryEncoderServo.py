@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 
 # WS server example that synchronizes state across clients
+#
+# Encoder bursts are coalesced & broadcast once per tick (wsBroadcast.py), one packed binary frame for all clients.
 
 import asyncio
 import json
@@ -9,12 +11,14 @@ import websockets
 import struct
 from pprint import pprint
 
+from wsBroadcast import Broadcaster, request_headers
+
 
 logging.basicConfig()
 
 STATE = {"value": 0}
 
-USERS = set()
+USERS = Broadcaster()
 
 
 def state_event():
@@ -25,18 +29,21 @@ def users_event():
     return json.dumps({"type": "users", "count": len(USERS)})
 
 
-async def notify_state():
-    if USERS:  # asyncio.wait doesn't accept an empty list
-        binary_data = struct.pack("Ii", 12, STATE['value'])
-        await asyncio.wait([user.send(binary_data) for user in USERS])
-        ###message = state_event()
-        ###await asyncio.wait([user.send(message) for user in USERS])
+def state_frames():
+    return {'*': struct.pack("Ii", 12, STATE['value'])}
+    ###return {'*': state_event()}
+
+
+def users_frames():
+    return {'*': users_event()}
 
 
-async def notify_users():
-    if USERS:  # asyncio.wait doesn't accept an empty list
-        message = users_event()
-        await asyncio.wait([user.send(message) for user in USERS])
+def notify_state():
+    USERS.publish('state', state_frames)
+
+
+def notify_users():
+    USERS.publish('users', users_frames)
 
 
 """
@@ -52,25 +59,26 @@ How to Client ID from 'request_headers':
 ('Sec-WebSocket-Key', 'b9xcFehjFpQyrcbyWsGUQA==')
 ('Sec-WebSocket-Protocol', 'arduino')
 """
-async def register(websocket):
+def register(websocket):
     USERS.add(websocket)
-    await notify_users()
+    notify_users()
 
 
-async def unregister(websocket):
+def unregister(websocket):
     USERS.remove(websocket)
-    await notify_users()
+    notify_users()
 
 
-async def wsApi(websocket, path):
+async def wsApi(websocket, path=None):
     # register(websocket) sends user_event() to websocket
-    await register(websocket)
+    register(websocket)
     try:
         await websocket.send(state_event())
         async for message in websocket:
-            print('Sec-WebSocket-Key: '+websocket.request_headers['Sec-WebSocket-Key'])
-            print('MessageType: '+str(type(message)))
-            print(message);
+            ### per message logging at debug level, encoder bursts are hundreds of messages / second
+            logging.debug('Sec-WebSocket-Key: %s', request_headers(websocket)['Sec-WebSocket-Key'])
+            logging.debug('MessageType: %s', type(message))
+            logging.debug(message)
             if isinstance(message, (bytes, bytearray)):
                 ### Binary: byte array
                 ### https://docs.python.org/3.5/library/struct.html
@@ -78,32 +86,35 @@ async def wsApi(websocket, path):
                 ### b'\x0c\x00\x00\x00@\x00\x00\x00'
                 ### (12, 64)
                 tuple_of_data = struct.unpack("Ii", message)
-                print(tuple_of_data)
+                logging.debug(tuple_of_data)
                 cmd = tuple_of_data[0]
                 value = tuple_of_data[1]
                 STATE["value"] = value
-                await notify_state()
+                notify_state()
             elif isinstance(message, (str)):
                 try:
                     data = json.loads(message)
                     if data["action"] == "minus":
                         STATE["value"] -= 1
-                        await notify_state()
+                        notify_state()
                     elif data["action"] == "plus":
                         STATE["value"] += 1
-                        await notify_state()
+                        notify_state()
                     elif data["action"] == "set":
                         STATE["value"] = int(data["value"])
-                        await notify_state()
+                        notify_state()
                     else:
                         logging.error("unsupported event: {}", data)
                 except Exception as e:
                     print(e);
     finally:
-        await unregister(websocket)
+        unregister(websocket)
+
 
+async def main():
+    async with websockets.serve(wsApi, "192.168.1.127", 6789):
+        await asyncio.Future()
 
-start_server = websockets.serve(wsApi, "192.168.1.127", 6789)
 
-asyncio.get_event_loop().run_until_complete(start_server)
-asyncio.get_event_loop().run_forever()
+if __name__ == '__main__':
+    asyncio.run(main())
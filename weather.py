@@ -9,7 +9,7 @@
 
 
 import os
-import json
+import sys
 import numpy as np
 
 import matplotlib.pyplot as plt
@@ -22,56 +22,35 @@ from datetime import datetime, timedelta
 
 sns.set(rc={'figure.figsize':(11, 4)})
 
-"""
-Pre-process sensor SD Card data file;
-grep "^\[" ./data/20200403.TXT | sed 's/\[//g' | sed 's/\]/,/g' > ./data/20200403.json
+### Daily SD card log files are stream parsed by python/weather_log.py, cached as typed columns by python/weather_cache.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "python"))
+import weather_index
+import weather_resample
 
-"""
+### headless: WEATHER_RENDER=<dir> writes charts to files (python/weather_render.py) instead of plt.show() windows
+import weather_render
+weather_render.setup()
+### long series are decimated to the axes width before plotting (python/weather_decimate.py)
+import weather_decimate
+weather_decimate.install()
 
 ### DataFrame to store Daily Metrics - Average, Mix, Max, STD Deviation, Close
 path = "data/weather/"
 
-for (path, dirs, files) in os.walk(path):
-    files = [ fi for fi in files if fi.endswith(".json") ]
-
-
-df_stat = pd.DataFrame(columns = ['data', 'date', 'mean' , 'std', 'min' , 'max', 'last'])
-frames = []
-stats = []
-
+index = weather_index.DayIndex(path)
 
-def load_json_data(filepath, frames, df_stat):
-    with open(filepath) as f:
-        d = json.load(f)
-        df = pd.DataFrame(d)
-        filename = os.path.basename(filepath)
-        a = os.path.splitext(filename)
-        date = a[0]
-        ### Compute Daily Stats - Mean, Min, Max, STD Deviation (freq: all data points)
-        row1 = pd.DataFrame({'data': 'pressure','date': date,'mean': df.p.mean() ,'std': df.p.std(),'min': df.p.min(),'max': df.p.max(),'last': df.p.iloc[-1]},index=[0])
-        row2 = pd.DataFrame({'data': 'tempC','date': date,'mean': df.tempC.mean() ,'std': df.tempC.std(),'min': df.tempC.min(),'max': df.tempC.max(),'last': df.tempC.iloc[-1]},index=[0])
-        row3 = pd.DataFrame({'data': 'humidity','date': date,'mean': df.h.mean() ,'std': df.h.std(),'min': df.h.min(),'max': df.h.max(),'last': df.h.iloc[-1]},index=[0])
-        row4 = pd.DataFrame({'data': 'light','date': date,'mean': df.LDR.mean() ,'std': df.LDR.std(),'min': df.LDR.min(),'max': df.LDR.max(),'last': df.LDR.iloc[-1]},index=[0])
+### render mode: charts are current if no log file changed this hour (last 48 hours charts)
+if weather_render.unchanged(index.files, [datetime.now().strftime('%Y%m%d%H')]):
+    sys.exit(0)
 
-        df_stat = df_stat.append(row1,ignore_index=True,sort=True)
-        df_stat = df_stat.append(row2,ignore_index=True,sort=True)
-        df_stat = df_stat.append(row3,ignore_index=True,sort=True)
-        df_stat = df_stat.append(row4,ignore_index=True,sort=True)
-
-        frames.append(df)
-        return df_stat
-
-
-for f in files:
-    filename = path+f
-    print(filename)
-    df_stat = load_json_data(filename,frames,df_stat)
+for f in index.files:
+    print(f)
 
+### Load daily files across a process pool, compute Daily Stats - Mean, Min, Max, STD Deviation, Close
+df, df_stat = index.load(stat_columns={'p': 'pressure', 't': 'tempC', 'h': 'humidity', 'l': 'light'})
 
 print(df_stat)
 
-df = pd.concat(frames)
-
 
 df.sort_values(by='ts', ascending=True)
 
@@ -88,7 +67,7 @@ df.index
 df['Year'] = df.index.year
 df['Month'] = df.index.month
 df['Day'] = df.index.day
-df['Weekday Name'] = df.index.weekday_name
+df['Weekday Name'] = df.index.day_name()
 df['Hour'] = df.index.hour
 
 # display a random sample of 5 rows
@@ -105,8 +84,8 @@ df['Hour'] = df.index.hour
 fig, ax = plt.subplots(4)
 
 # to locate a specific range
-# df.loc['2020-04-02 05:00':'2020-04-03 17:00']['tempC']
-ax[0].plot(df['tempC'],linewidth=0.5, label='Temp (C)')
+# df.loc['2020-04-02 05:00':'2020-04-03 17:00']['t']
+ax[0].plot(df['t'],linewidth=0.5, label='Temp (C)')
 ax[0].set_title('Temp (C)')
 ax[0].set_ylabel('')
 ax[0].legend();
@@ -123,7 +102,7 @@ ax[2].axhline(y=102268.9, color='r', linestyle='-', label="High Pressure")
 ax[2].axhline(y=100914.4, color='b', linestyle='-', label="Low Pressure")
 ax[2].legend();
 
-ax[3].plot(df['LDR'],linewidth=0.5, label='Light Level (LDR)')
+ax[3].plot(df['l'],linewidth=0.5, label='Light Level (LDR)')
 ax[3].set_title('Light Level')
 ax[3].set_ylabel('')
 ax[3].legend();
@@ -133,18 +112,20 @@ ax[3].legend();
 
 
 
-data_columns = ['p', 'tempC', 'h', 'LDR']
+data_columns = ['p', 't', 'h', 'l']
+
+# Resample to hourly / 3 hourly / daily frequency, aggregating with mean, max, min (single pass)
 
-# Resample to hourly / daily frequency, aggregating with mean, max, min
+resampled = weather_resample.resample(df, data_columns, ['1H', '3H', '1D'], ['mean', 'max', 'min'])
 
-df_hourly_mean = df[data_columns].resample('H').mean()
-df_daily_mean = df[data_columns].resample('D').mean()
+df_hourly_mean = resampled['1H', 'mean']
+df_daily_mean = resampled['1D', 'mean']
 
-df_hourly_max = df[data_columns].resample('H').max()
-df_daily_max = df[data_columns].resample('D').max()
+df_hourly_max = resampled['1H', 'max']
+df_daily_max = resampled['1D', 'max']
 
-df_hourly_min = df[data_columns].resample('H').min()
-df_daily_min = df[data_columns].resample('D').min()
+df_hourly_min = resampled['1H', 'min']
+df_daily_min = resampled['1D', 'min']
 
 print(df_hourly_mean.head(15))
 
@@ -155,14 +136,14 @@ print(df_hourly_mean.head(15))
 # chart hourly/daily avg, min, max for temperature and pressure
 fig, ax = plt.subplots(3)
 
-ax[0].plot(df_hourly_mean['tempC'],marker='.', linestyle='-', linewidth=0.5, label='Avg Temp (C) (hourly)')
-ax[0].plot(df_daily_mean['tempC'],marker='.', linestyle='-', linewidth=0.5, label='Avg Temp (C) (daily)')
+ax[0].plot(df_hourly_mean['t'],marker='.', linestyle='-', linewidth=0.5, label='Avg Temp (C) (hourly)')
+ax[0].plot(df_daily_mean['t'],marker='.', linestyle='-', linewidth=0.5, label='Avg Temp (C) (daily)')
 
-ax[0].plot(df_hourly_min['tempC'],marker='.', linestyle='-', linewidth=0.5, label='Min Temp (C) (hourly)')
-ax[0].plot(df_daily_min['tempC'],marker='.', linestyle='-', linewidth=0.5, label='Min Temp (C) (daily)')
+ax[0].plot(df_hourly_min['t'],marker='.', linestyle='-', linewidth=0.5, label='Min Temp (C) (hourly)')
+ax[0].plot(df_daily_min['t'],marker='.', linestyle='-', linewidth=0.5, label='Min Temp (C) (daily)')
 
-ax[0].plot(df_hourly_max['tempC'],marker='.', linestyle='-', linewidth=0.5, label='Max Temp (C) (hourly)')
-ax[0].plot(df_daily_max['tempC'],marker='.', linestyle='-', linewidth=0.5, label='Max Temp (C) (daily)')
+ax[0].plot(df_hourly_max['t'],marker='.', linestyle='-', linewidth=0.5, label='Max Temp (C) (hourly)')
+ax[0].plot(df_daily_max['t'],marker='.', linestyle='-', linewidth=0.5, label='Max Temp (C) (daily)')
 
 ax[0].set_title('Temperature (Celcuis) Hourly / Daily ')
 ax[0].set_ylabel('')
@@ -218,16 +199,16 @@ start_dt = start_dt.strftime("%Y-%m-%d %H:%M:%S")
 end_dt = end_dt.strftime("%Y-%m-%d %H:%M:%S")
 
 
-df_temp_3h_mean = df.loc[start_dt:end_dt]['tempC'].resample('3H').mean()
-df_p_3h_mean = df.loc[start_dt:end_dt]['p'].resample('3H').mean()
+df_temp_3h_mean = resampled['3H', 'mean'].loc[start_dt:end_dt]['t']
+df_p_3h_mean = resampled['3H', 'mean'].loc[start_dt:end_dt]['p']
 
 df_temp_3h_mean_pct = df_temp_3h_mean.pct_change()*np.sign(df_temp_3h_mean.shift(periods=1))
 df_p_3h_mean_pct = df_p_3h_mean.pct_change()*np.sign(df_p_3h_mean.shift(periods=1))
 
 df_p_3h_mean_pct_2d = df_p_3h_mean_pct.pct_change()*np.sign(df_p_3h_mean_pct.shift(periods=1))
 
-print df_p_3h_mean_pct
-print df_p_3h_mean_pct_2d
+print(df_p_3h_mean_pct)
+print(df_p_3h_mean_pct_2d)
 
 
 fig, ax = plt.subplots(4)
@@ -278,7 +259,7 @@ ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %d %H:%M'));
 
 plt.show()
 
-ax.plot(df.loc['2020-04-03 12:00':'2020-04-04 12:00', 'tempC'], linewidth=0.5)
+ax.plot(df.loc['2020-04-03 12:00':'2020-04-04 12:00', 't'], linewidth=0.5)
 ax.set_ylabel('Temp (C)')
 ax.set_title('Temperature')
 ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %d %H:%M'));
@@ -289,7 +270,7 @@ plt.show()
 
 fig, axes = plt.subplots(3, 1, figsize=(11, 10), sharex=True)
 
-for name, ax in zip(['p', 'tempC', 'h'], axes):
+for name, ax in zip(['p', 't', 'h'], axes):
     sns.boxplot(data=df, x='Weekday Name', y=name, ax=ax)
     ax.set_ylabel('Value')
     ax.set_title(name)
@@ -324,13 +305,13 @@ ax[0].xaxis.set_major_formatter(mdates.DateFormatter('%b %d %H:%M'))
 ax[0].plot(df['datetime'], df['p'])
 ax[1].set_title('Temp (Celcius)')
 ax[1].xaxis.set_major_formatter(mdates.DateFormatter('%b %d %H:%M'))
-ax[1].plot(df['datetime'], df['tempC'])
+ax[1].plot(df['datetime'], df['t'])
 ax[2].set_title('Humidity')
 ax[2].xaxis.set_major_formatter(mdates.DateFormatter('%b %d %H:%M'))
 ax[2].plot(df['datetime'], df['h'])
 ax[3].set_title('Light (LDR)')
 ax[3].xaxis.set_major_formatter(mdates.DateFormatter('%b %d %H:%M'))
-ax[3].plot(df['datetime'], df['LDR'])
+ax[3].plot(df['datetime'], df['l'])
 
 plt.show()
 
@@ -3,11 +3,20 @@
 ###    [{"ts":1586815920,"tempC":22.3,"tempF":72.14,"h":41,"LDR":964,"p":102583,"w":0}]
 ###
 ### Writes receieved JSON data to a mongo DB collection
+### Every element of the payload array is kept, documents are buffered & written in bulk
+### by a background worker (python/weather_mongo_writer.py), off the MQTT network thread
+### Indexes (ts, station + ts, TTL) are created on start, see python/weather_mongo_schema.py
 ###
+import os
+import sys
 import paho.mqtt.client as mqtt
 import json
 import pymongo
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "python"))
+from weather_mongo_writer import BulkWriter
+import weather_mongo_schema
+
 mqtt_server = "192.168.1.127"
 mqtt_port = 1883
 mqtt_keepalive = 60
@@ -26,8 +35,12 @@ def on_connect(client,userdata,flags,rc):
 
 def on_message(client, userdata, msg):
     print(msg.payload)
-    parsed_json = (json.loads(msg.payload))
-    res = sensorData.insert_one(parsed_json[0])
+    try:
+        parsed_json = (json.loads(msg.payload))
+    except ValueError as e:
+        print("Invalid JSON: "+str(e))
+        return
+    writer.put(parsed_json)
     ##print(json.dumps(parsed_json, indent=4, sort_keys=True))
     ## print(parsed_json[0]) # read object
     ## print(parsed_json[0]["tempC"]) # read object property
@@ -36,6 +49,12 @@ def on_message(client, userdata, msg):
 mongoClient = pymongo.MongoClient(mongo_server)
 mydb = mongoClient[mongo_db]
 sensorData = mydb[mongo_collection]
+### indexes only, raw samples are kept: a TTL is opt in (weather_mongo_schema.py --downsample --expire-days)
+### dt is stamped on insert so one can be enabled without a backfill
+weather_mongo_schema.ensure_indexes(mydb, mongo_collection)
+
+writer = BulkWriter(sensorData, batch_size=500, flush_interval=2.0, max_queue=10000, prepare=weather_mongo_schema.prepare)
+writer.start()
 
 
 mqttClient = mqtt.Client()
@@ -44,4 +63,7 @@ mqttClient.connect(mqtt_server,mqtt_port,mqtt_keepalive);
 mqttClient.on_connect = on_connect
 mqttClient.on_message = on_message
 
-mqttClient.loop_forever()
+try:
+    mqttClient.loop_forever()
+finally:
+    writer.close()